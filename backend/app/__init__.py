@@ -1,19 +1,44 @@
 from flask import Flask
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import timedelta
 from .extensions import init_extensions, close_extensions
 import os
 from dotenv import load_dotenv
 from .config import Config
+from .auth.passwords import register_password_errors
+from .cli import register_cli
+from .jobs import register_jobs
+from .health import register_health
+from .instrumentation import register_instrumentation
+from .profiling import register_query_profiler
+from .ratelimit import register_rate_limiting
+from .logging_config import configure_logging, register_request_logging
+import logging
 
+logger = logging.getLogger(__name__)
 
-def create_app():
+
+def create_app(config_class=Config):
     """Application factory function - Simplified like your old project"""
     # Load environment variables
     load_dotenv()
 
+    # Structured JSON logs written by a background thread
+    configure_logging()
+
     # Create Flask app
     app = Flask(__name__)
+
+    # Client address from X-Forwarded-For, trusting PROXY_FIX_X_FOR load balancer hops
+    # (rate limits and logs key on request.remote_addr)
+    if config_class.PROXY_FIX_X_FOR:
+        app.wsgi_app = ProxyFix(
+            app.wsgi_app, x_for=config_class.PROXY_FIX_X_FOR, x_proto=config_class.PROXY_FIX_X_FOR
+        )
+
+    # Request id on every log record (registered first: runs before other hooks)
+    register_request_logging(app)
     
     # Configure CORS
     CORS(app, 
@@ -23,95 +48,94 @@ def create_app():
          allow_headers=["Content-Type", "Authorization"])
 
     
-    # Use centralized configuration from Config class
-    app.config['JWT_SECRET_KEY'] = Config.JWT_SECRET_KEY
-    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = Config.JWT_ACCESS_TOKEN_EXPIRES
-    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = Config.JWT_REFRESH_TOKEN_EXPIRES
-    app.config['MONGODB_URI'] = Config.MONGODB_URI
+    # Use centralized configuration from Config class (TestConfig in tests)
+    app.config.from_object(config_class)
+    app.config['JWT_SECRET_KEY'] = config_class.JWT_SECRET_KEY
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = config_class.JWT_ACCESS_TOKEN_EXPIRES
+    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = config_class.JWT_REFRESH_TOKEN_EXPIRES
+    app.config['MONGODB_URI'] = config_class.MONGODB_URI
+    app.config['MONGODB_POOL_OPTIONS'] = config_class.MONGODB_POOL_OPTIONS
     
     # Neo4j Configuration - Use Config class values
-    app.config['NEO4J_URI'] = Config.NEO4J_URI
-    app.config['NEO4J_USER'] = Config.NEO4J_USER
-    app.config['NEO4J_PASSWORD'] = Config.NEO4J_PASSWORD
-    app.config['NEO4J_OPTIONS'] = Config.NEO4J_OPTIONS
+    app.config['NEO4J_URI'] = config_class.NEO4J_URI
+    app.config['NEO4J_USER'] = config_class.NEO4J_USER
+    app.config['NEO4J_PASSWORD'] = config_class.NEO4J_PASSWORD
+    app.config['NEO4J_OPTIONS'] = config_class.NEO4J_OPTIONS
+    app.config['NEO4J_MIN_IDLE_CONNECTIONS'] = config_class.NEO4J_MIN_IDLE_CONNECTIONS
     
     # Security Configuration
-    app.config['SECRET_KEY'] = Config.SECRET_KEY
-    app.config['BCRYPT_LOG_ROUNDS'] = Config.BCRYPT_LOG_ROUNDS
+    app.config['SECRET_KEY'] = config_class.SECRET_KEY
+    app.config['BCRYPT_LOG_ROUNDS'] = config_class.BCRYPT_LOG_ROUNDS
     
     # Debug configuration
-    app.config['DEBUG'] = Config.DEBUG
+    app.config['DEBUG'] = config_class.DEBUG
     
     # Rate Limiting
-    app.config['RATELIMIT_DEFAULT'] = Config.RATELIMIT_DEFAULT
-    app.config['RATELIMIT_STORAGE_URL'] = Config.RATELIMIT_STORAGE_URL
+    app.config['RATELIMIT_DEFAULT'] = config_class.RATELIMIT_DEFAULT
+    app.config['RATELIMIT_STORAGE_URL'] = config_class.RATELIMIT_STORAGE_URL
     
 
-    # Debug: Print Neo4j configuration (remove password for security)
-    print(f"🔍 Neo4j URI: {app.config['NEO4J_URI']}")
-    print(f"🔍 Neo4j User: {app.config['NEO4J_USER']}")
-    print(f"🔍 Neo4j Password: {'*' * len(app.config['NEO4J_PASSWORD'])}")
+    # Debug: Neo4j configuration (never the password)
+    logger.debug("🔍 Neo4j URI: %s", app.config['NEO4J_URI'])
+    logger.debug("🔍 Neo4j User: %s", app.config['NEO4J_USER'])
 
     # Initialize extensions
     try:
         init_extensions(app)
-        print("✅ Extensions initialized successfully")
+        logger.info("✅ Extensions initialized successfully")
     except Exception as e:
-        print(f"❌ Failed to initialize extensions: {e}")
-        import traceback
-
-        traceback.print_exc()
+        logger.exception("❌ Failed to initialize extensions: %s", e)
         # Don't return None - create a minimal app for debugging
-        print("⚠️ Creating minimal app without database connections...")
+        logger.warning("⚠️ Creating minimal app without database connections...")
 
     # Register blueprints - like your old project structure
     try:
         from .auth.routes import auth_bp
 
         app.register_blueprint(auth_bp, url_prefix="/api/auth")
-        print("✅ Auth blueprint registered")
+        logger.debug("✅ Auth blueprint registered")
     except ImportError as e:
-        print(f"⚠️ auth blueprint not found - skipping: {e}")
+        logger.warning("⚠️ auth blueprint not found - skipping: %s", e)
 
     # Register additional auth routes (temporary fix)
     try:
         from .routes.auth import auth_bp as routes_auth_bp
 
         app.register_blueprint(routes_auth_bp, url_prefix="/api/auth", name="routes_auth")
-        print("✅ Routes Auth blueprint registered")
+        logger.debug("✅ Routes Auth blueprint registered")
     except ImportError as e:
-        print(f"⚠️ routes auth blueprint not found - skipping: {e}")
+        logger.warning("⚠️ routes auth blueprint not found - skipping: %s", e)
 
     try:
         from .doctor.routes import doctor_bp
 
         app.register_blueprint(doctor_bp, url_prefix="/api/doctors")
-        print("✅ Doctors blueprint registered")
+        logger.debug("✅ Doctors blueprint registered")
     except ImportError as e:
-        print(f"⚠️ doctors blueprint not found - skipping: {e}")
+        logger.warning("⚠️ doctors blueprint not found - skipping: %s", e)
 
     try:
         from .patient.routes import patient_bp
 
         app.register_blueprint(patient_bp, url_prefix="/api/patients")
-        print("✅ Patients blueprint registered")
+        logger.debug("✅ Patients blueprint registered")
     except ImportError as e:
-        print(f"⚠️ patients blueprint not found - skipping: {e}")
+        logger.warning("⚠️ patients blueprint not found - skipping: %s", e)
 
     try:
         from .consultation.routes import consultation_bp
 
         app.register_blueprint(consultation_bp, url_prefix="/api/consultations")
-        print("✅ Consultations blueprint registered")
+        logger.debug("✅ Consultations blueprint registered")
     except ImportError as e:
-        print(f"⚠️ consultations blueprint not found - skipping: {e}")
+        logger.warning("⚠️ consultations blueprint not found - skipping: %s", e)
     try:
         from .admin.routes import admin_bp
 
         app.register_blueprint(admin_bp, url_prefix="/api/admin")
-        print("✅ Admin blueprint registered")
+        logger.debug("✅ Admin blueprint registered")
     except ImportError as e:
-        print(f"⚠️ admin blueprint not found - skipping: {e}")
+        logger.warning("⚠️ admin blueprint not found - skipping: %s", e)
 
     # Basic routes for testing
     @app.route("/")
@@ -122,14 +146,28 @@ def create_app():
             "version": "1.0.0",
         }
 
-    @app.route("/api/health")
-    def health_check():
-        return {
-            "status": "healthy",
-            "databases": {"mongodb": "connected", "neo4j": "connected"},
-        }
+    # Liveness/readiness probes (/api/health/live, /api/health/ready)
+    register_health(app)
+
+    # Per-endpoint latency and database call metrics (/metrics, Server-Timing)
+    register_instrumentation(app)
+
+    # Slow-query log and N+1 detection on sampled requests
+    register_query_profiler(app)
+
+    # Token-bucket rate limits (RATELIMIT_DEFAULT, stricter on login)
+    register_rate_limiting(app)
+
+    # 503 + Retry-After when the password hashing pool is saturated
+    register_password_errors(app)
 
     # Register teardown function
     app.teardown_appcontext(close_extensions)
 
+    # Maintenance commands (flask migrate-graph-keys, ...)
+    register_cli(app)
+
+    # Background jobs, started lazily in each worker process
+    register_jobs(app)
+
     return app
@@ -1,32 +1,29 @@
 from flask import Blueprint, request, jsonify
 
-from flask_jwt_extended import get_jwt, jwt_required
+from flask_jwt_extended import jwt_required
 
-from pymongo import MongoClient
 from bson import ObjectId
+from ..extensions import mongo_db
+from ..auth.authorization import admin_required, invalidate_profile
+from ..data.consultation_stats import ensure_counters, get_count
+from ..data.search_index import remove_user as remove_from_search, search
+from ..data.listings import MAX_PER_PAGE
+from ..data.mail_queue import mail_metrics
+from ..data.sync_outbox import enqueue_doctor, enqueue_patient, outbox_metrics
 from ..config import Config
-from ..data.sync_service import SyncService
 from ..models.user import User
-from functools import wraps
-from werkzeug.security import generate_password_hash
+from ..utils.streaming import list_response
+from ..auth.passwords import PasswordServiceBusy, hash_password
 
 
 admin_bp = Blueprint("admin", __name__)
 
-mongo_client = MongoClient(Config.MONGODB_URI)
-db = mongo_client.cabinet_medical
-sync_service = SyncService()
+db = mongo_db
 
 
-def admin_required(fn):
-    @wraps(fn)
-    def wrapper(*args, **kwargs):
-        claims = get_jwt()
-        if claims.get("role") != "admin":
-            return jsonify({"error": "Accès réservé aux administrateurs"}), 403
-        return fn(*args, **kwargs)
-
-    return wrapper
+def _with_str_id(document):
+    document["_id"] = str(document["_id"])
+    return document
 
 
 # Routes pour la gestion des patients
@@ -34,10 +31,8 @@ def admin_required(fn):
 @jwt_required()
 @admin_required
 def get_patients():
-    patients = list(db.patients.find())
-    for patient in patients:
-        patient["_id"] = str(patient["_id"])
-    return jsonify(patients), 200
+    cursor = db.patients.find().batch_size(Config.STREAM_BATCH_SIZE)
+    return list_response(_with_str_id(patient) for patient in cursor)
 
 
 @admin_bp.route("/patients", methods=["POST"])
@@ -56,8 +51,8 @@ def create_patient():
     result = db.patients.insert_one(patient_data)
     patient_data["_id"] = str(result.inserted_id)
 
-    # Synchroniser avec Neo4j
-    sync_service.sync_patient(patient_data)
+    # Synchroniser avec Neo4j (en arrière-plan)
+    enqueue_patient(patient_data)
 
     return jsonify(patient_data), 201
 
@@ -76,9 +71,10 @@ def update_patient(patient_id):
     }
 
     db.patients.update_one({"_id": ObjectId(patient_id)}, {"$set": patient_data})
+    invalidate_profile(profile_id=patient_id)
 
     patient_data["_id"] = patient_id
-    sync_service.sync_patient(patient_data)
+    enqueue_patient(patient_data)
 
     return jsonify(patient_data), 200
 
@@ -88,10 +84,8 @@ def update_patient(patient_id):
 @jwt_required()
 @admin_required
 def get_doctors():
-    doctors = list(db.doctors.find())
-    for doctor in doctors:
-        doctor["_id"] = str(doctor["_id"])
-    return jsonify(doctors), 200
+    cursor = db.doctors.find().batch_size(Config.STREAM_BATCH_SIZE)
+    return list_response(_with_str_id(doctor) for doctor in cursor)
 
 
 @admin_bp.route("/doctors", methods=["POST"])
@@ -110,8 +104,8 @@ def create_doctor():
     result = db.doctors.insert_one(doctor_data)
     doctor_data["_id"] = str(result.inserted_id)
 
-    # Synchroniser avec Neo4j
-    sync_service.sync_doctor(doctor_data)
+    # Synchroniser avec Neo4j (en arrière-plan)
+    enqueue_doctor(doctor_data)
 
     return jsonify(doctor_data), 201
 
@@ -130,9 +124,10 @@ def update_doctor(doctor_id):
     }
 
     db.doctors.update_one({"_id": ObjectId(doctor_id)}, {"$set": doctor_data})
+    invalidate_profile(profile_id=doctor_id)
 
     doctor_data["_id"] = doctor_id
-    sync_service.sync_doctor(doctor_data)
+    enqueue_doctor(doctor_data)
 
     return jsonify(doctor_data), 200
 
@@ -142,14 +137,44 @@ def update_doctor(doctor_id):
 @jwt_required()
 @admin_required
 def get_stats():
+    # Compteurs de collection (métadonnées) et compteur de consultations
+    # maintenu : aucun parcours de collection ni du graphe
+    ensure_counters()
     stats = {
-        "total_patients": db.patients.count_documents({}),
-        "total_doctors": db.doctors.count_documents({}),
-        "total_consultations": db.consultations.count_documents({}),
+        "total_patients": db.patients.estimated_document_count(),
+        "total_doctors": db.doctors.estimated_document_count(),
+        "total_consultations": get_count("all") or 0,
     }
     return jsonify(stats), 200
 
 
+@admin_bp.route("/search", methods=["GET"])
+@jwt_required()
+@admin_required
+def search_people():
+    """Rechercher utilisateurs, patients et docteurs (q, entity, page, per_page)"""
+    entities = request.args.getlist("entity") or None
+    page = max(int(request.args.get("page", 1)), 1)
+    per_page = min(max(int(request.args.get("per_page", 20)), 1), MAX_PER_PAGE)
+    return jsonify(search(request.args.get("q", ""), entities, page, per_page)), 200
+
+
+@admin_bp.route("/sync/outbox", methods=["GET"])
+@jwt_required()
+@admin_required
+def get_sync_outbox_metrics():
+    """Retard de la synchronisation MongoDB -> Neo4j"""
+    return jsonify(outbox_metrics()), 200
+
+
+@admin_bp.route("/mail/queue", methods=["GET"])
+@jwt_required()
+@admin_required
+def get_mail_queue_metrics():
+    """Volume, retard et échecs de la file d'envoi des emails"""
+    return jsonify(mail_metrics()), 200
+
+
 @admin_bp.route("/users", methods=["POST"])
 @jwt_required()
 @admin_required
@@ -188,8 +213,8 @@ def create_user():
             result = db.doctors.insert_one(doctor_data)
             doctor_data["_id"] = str(result.inserted_id)
 
-            # Synchroniser avec Neo4j
-            sync_service.sync_doctor(doctor_data)
+            # Synchroniser avec Neo4j (en arrière-plan)
+            enqueue_doctor(doctor_data)
 
         elif data["role"] == "patient":
             # Créer aussi un document dans la collection patients
@@ -205,8 +230,8 @@ def create_user():
             result = db.patients.insert_one(patient_data)
             patient_data["_id"] = str(result.inserted_id)
 
-            # Synchroniser avec Neo4j
-            sync_service.sync_patient(patient_data)
+            # Synchroniser avec Neo4j (en arrière-plan)
+            enqueue_patient(patient_data)
 
         return jsonify(
             {
@@ -217,6 +242,8 @@ def create_user():
 
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
+    except PasswordServiceBusy:
+        raise
     except Exception as e:
         return jsonify(
             {"error": "Une erreur est survenue lors de la création de l'utilisateur"}
@@ -288,7 +315,7 @@ def update_user(user_id):
 
         # Mettre à jour le mot de passe si fourni
         if "password" in data:
-            user.password_hash = generate_password_hash(data["password"])
+            user.password_hash = hash_password(data["password"])
             del data["password"]
 
         # Mettre à jour les autres champs
@@ -296,10 +323,13 @@ def update_user(user_id):
             setattr(user, key, value)
 
         user.save()
+        invalidate_profile(user_id)
         return jsonify(
             {"message": "Utilisateur mis à jour avec succès", "user": user.to_json()}
         ), 200
 
+    except PasswordServiceBusy:
+        raise
     except Exception:
         return jsonify(
             {"error": "Une erreur est survenue lors de la mise à jour de l'utilisateur"}
@@ -322,6 +352,8 @@ def delete_user(user_id):
             return jsonify({"error": "Impossible de supprimer un administrateur"}), 403
 
         User.get_db()[User.collection_name].delete_one({"_id": user._id})
+        invalidate_profile(user_id)
+        remove_from_search(user_id)
         return jsonify({"message": "Utilisateur supprimé avec succès"}), 200
 
     except Exception:
@@ -0,0 +1,100 @@
+"""
+Couche d'autorisation partagée par les blueprints.
+
+Les décorateurs de rôle font confiance au claim `role` du JWT (signé par le
+serveur à la connexion) : aucune requête MongoDB n'est nécessaire pour
+autoriser une requête. Les profils utilisateur/docteur/patient résolus sont
+gardés dans un cache TTL borné, par processus ; les routes qui modifient ou
+suppriment un profil doivent appeler `invalidate_profile`. Les autres
+workers voient la modification au plus tard après `AUTH_PROFILE_CACHE_TTL`.
+"""
+import copy
+from functools import wraps
+
+from bson import ObjectId
+from flask import jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity
+
+from ..config import Config
+from ..extensions import mongo_db
+from ..utils.cache import TTLCache
+
+_profile_cache = TTLCache(
+    maxsize=Config.AUTH_PROFILE_CACHE_SIZE, ttl=Config.AUTH_PROFILE_CACHE_TTL
+)
+
+
+def role_required(*roles, message="Accès non autorisé"):
+    """Autoriser la requête si le claim `role` du JWT fait partie de `roles`"""
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if get_jwt().get("role") not in roles:
+                return jsonify({"error": message}), 403
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
+
+
+admin_required = role_required("admin", message="Accès réservé aux administrateurs")
+doctor_required = role_required("doctor", message="Doctor access required")
+patient_required = role_required("patient", message="Patient access required")
+
+
+def _cached_lookup(collection, query_field, user_id):
+    key = (collection, str(user_id))
+    document = _profile_cache.get(key)
+    if document is None:
+        value = user_id
+        if query_field == "_id" and ObjectId.is_valid(user_id):
+            value = ObjectId(user_id)
+        document = mongo_db[collection].find_one({query_field: value})
+        if document is None:
+            # Les absences ne sont pas mises en cache : un profil créé
+            # juste après doit être visible immédiatement
+            return None
+        _profile_cache.set(key, document)
+    # Les routes modifient souvent le document retourné (_id -> str, listes,
+    # sous-documents comme `schedule`) : copie profonde, le cache reste intact
+    return copy.deepcopy(document)
+
+
+def get_cached_user(user_id):
+    """Document `users` de l'utilisateur (ou None)"""
+    return _cached_lookup("users", "_id", user_id)
+
+
+def get_cached_doctor(user_id):
+    """Document `doctors` lié à l'utilisateur (ou None)"""
+    return _cached_lookup("doctors", "user_id", user_id)
+
+
+def get_cached_patient(user_id):
+    """Document `patients` lié à l'utilisateur (ou None)"""
+    return _cached_lookup("patients", "user_id", user_id)
+
+
+def get_current_doctor():
+    """Profil docteur de l'utilisateur connecté"""
+    return get_cached_doctor(get_jwt_identity())
+
+
+def get_current_patient():
+    """Profil patient de l'utilisateur connecté"""
+    return get_cached_patient(get_jwt_identity())
+
+
+def invalidate_profile(user_id=None, profile_id=None):
+    """Oublier les profils d'un utilisateur après une mise à jour ou une suppression.
+
+    `profile_id` (l'_id d'un document doctors/patients) sert aux routes qui ne
+    connaissent pas l'utilisateur lié.
+    """
+    if user_id is not None:
+        for collection in ("users", "doctors", "patients"):
+            _profile_cache.pop((collection, str(user_id)))
+    if profile_id is not None:
+        _profile_cache.discard_where(lambda doc: str(doc.get("_id")) == str(profile_id))
@@ -3,10 +3,8 @@ from datetime import datetime
 from .config import AuthConfig
 from ..models.user import User
 from flask_jwt_extended import create_access_token, create_refresh_token
+from ..data.mail_queue import enqueue_mail
 import secrets
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 
 class AuthManager:
     def __init__(self):
@@ -54,11 +52,6 @@ class AuthManager:
         user['reset_token_expires'] = (datetime.now() + AuthConfig.TOKEN_EXPIRY).isoformat()
         user.save()
 
-        msg = MIMEMultipart()
-        msg['From'] = AuthConfig.MAIL_FROM
-        msg['To'] = user_email
-        msg['Subject'] = "Réinitialisation de votre mot de passe"
-
         body = f"""
         Bonjour,
         
@@ -75,14 +68,8 @@ class AuthManager:
         L'équipe du Cabinet Médical
         """
         
-        msg.attach(MIMEText(body, 'plain'))
-
         try:
-            server = smtplib.SMTP(AuthConfig.SMTP_SERVER, AuthConfig.SMTP_PORT)
-            server.starttls()
-            server.login(AuthConfig.SMTP_USERNAME, AuthConfig.SMTP_PASSWORD)
-            server.send_message(msg)
-            server.quit()
+            enqueue_mail(user_email, "Réinitialisation de votre mot de passe", body, kind="password_reset")
             return True, "Email de réinitialisation envoyé"
         except Exception as e:
             return False, f"Erreur lors de l'envoi de l'email: {str(e)}"
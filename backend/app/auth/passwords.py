@@ -0,0 +1,219 @@
+"""
+Service de hachage des mots de passe.
+
+- algorithme et coût configurables : PBKDF2-SHA256 au format Werkzeug
+  (`pbkdf2:sha256:<itérations>$<sel>$<hex>`, toujours lisible par
+  `check_password_hash`) ou bcrypt (`BCRYPT_LOG_ROUNDS`) ;
+- comparaison en temps constant ;
+- `verify_and_update` indique quand un hash doit être recalculé (algorithme
+  ou coût modifiés, format Werkzeug hérité) : la connexion le remplace sans
+  intervention de l'utilisateur ;
+- les calculs tournent dans un pool de threads borné. hashlib et bcrypt
+  relâchent le GIL : au plus PASSWORD_HASH_WORKERS hachages simultanés, et
+  au-delà de PASSWORD_HASH_MAX_PENDING demandes en attente
+  `PasswordServiceBusy` est levée plutôt que d'empiler les requêtes. Le
+  thread de la requête attend toujours le résultat (`future.result()`) :
+  le pool borne la concurrence, il ne libère pas le thread ;
+- `register_password_errors` transforme `PasswordServiceBusy` en 503 avec
+  Retry-After, quelle que soit la route qui hache ou vérifie.
+"""
+import hashlib
+import hmac
+import math
+import os
+import secrets
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import jsonify
+from werkzeug.security import check_password_hash
+
+from ..config import Config
+
+SALT_CHARS = string.ascii_letters + string.digits
+SALT_LENGTH = 16
+
+_pool_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+_pending = None
+
+
+class PasswordServiceBusy(Exception):
+    """Trop de calculs de hash en attente"""
+
+
+def _algorithm():
+    algorithm = Config.PASSWORD_HASH_ALGORITHM
+    if algorithm not in ("pbkdf2", "bcrypt"):
+        raise ValueError(f"PASSWORD_HASH_ALGORITHM inconnu: {algorithm}")
+    return algorithm
+
+
+# --- Calculs (exécutés dans le pool) ---------------------------------------
+
+def _hash_pbkdf2(password, iterations):
+    salt = "".join(secrets.choice(SALT_CHARS) for _ in range(SALT_LENGTH))
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("utf-8"), iterations)
+    return f"pbkdf2:sha256:{iterations}${salt}${digest.hex()}"
+
+
+def _verify_pbkdf2(password, stored_hash):
+    method, salt, expected = stored_hash.split("$", 2)
+    _, hash_name, iterations = method.split(":")
+    digest = hashlib.pbkdf2_hmac(
+        hash_name, password.encode("utf-8"), salt.encode("utf-8"), int(iterations)
+    )
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+def _hash_bcrypt(password, rounds):
+    import bcrypt
+
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("ascii")
+
+
+def _verify_bcrypt(password, stored_hash):
+    import bcrypt
+
+    # checkpw compare les empreintes en temps constant
+    return bcrypt.checkpw(password.encode("utf-8"), stored_hash.encode("ascii"))
+
+
+def _compute_hash(password):
+    if _algorithm() == "bcrypt":
+        return _hash_bcrypt(password, Config.BCRYPT_LOG_ROUNDS)
+    return _hash_pbkdf2(password, Config.PASSWORD_PBKDF2_ITERATIONS)
+
+
+def _compute_verify(password, stored_hash):
+    try:
+        if stored_hash.startswith("$2"):
+            return _verify_bcrypt(password, stored_hash)
+        if stored_hash.startswith("pbkdf2:sha256:"):
+            return _verify_pbkdf2(password, stored_hash)
+        # Autres formats Werkzeug (scrypt, pbkdf2 sans itérations explicites)
+        return check_password_hash(stored_hash, password)
+    except (ValueError, TypeError):
+        return False
+
+
+# --- Pool borné --------------------------------------------------------------
+
+def _executor():
+    global _pool, _pool_pid, _pending
+    if _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool_pid != os.getpid():
+                # Les threads du pool ne survivent pas à un fork
+                _pool = ThreadPoolExecutor(
+                    max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+                )
+                _pending = threading.BoundedSemaphore(Config.PASSWORD_HASH_MAX_PENDING)
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def _run(function, *args):
+    pool = _executor()
+    if not _pending.acquire(timeout=Config.PASSWORD_HASH_QUEUE_TIMEOUT):
+        raise PasswordServiceBusy("Service de mots de passe saturé")
+    try:
+        future = pool.submit(function, *args)
+    except Exception:
+        _pending.release()
+        raise
+    future.add_done_callback(lambda _: _pending.release())
+    return future.result()
+
+
+# --- API ---------------------------------------------------------------------
+
+def register_password_errors(app):
+    """Répondre 503 + Retry-After quand le pool de hachage est saturé"""
+
+    @app.errorhandler(PasswordServiceBusy)
+    def password_service_busy(error):
+        response = jsonify({"error": "Service momentanément surchargé, réessayez"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(max(1, math.ceil(Config.PASSWORD_HASH_QUEUE_TIMEOUT)))
+        return response
+
+
+def hash_password(password):
+    """Hacher un mot de passe avec l'algorithme et le coût configurés"""
+    return _run(_compute_hash, password)
+
+
+def verify_password(password, stored_hash):
+    """Vérifier un mot de passe contre son hash (tout format pris en charge)"""
+    if not password or not stored_hash:
+        return False
+    return _run(_compute_verify, password, stored_hash)
+
+
+def needs_rehash(stored_hash):
+    """Le hash a-t-il été calculé avec d'autres paramètres que ceux configurés ?"""
+    try:
+        if _algorithm() == "bcrypt":
+            return not stored_hash.startswith("$2") or int(stored_hash.split("$")[2]) != Config.BCRYPT_LOG_ROUNDS
+        if not stored_hash.startswith("pbkdf2:sha256:"):
+            return True
+        iterations = int(stored_hash.split("$", 1)[0].split(":")[2])
+        return iterations != Config.PASSWORD_PBKDF2_ITERATIONS
+    except (ValueError, IndexError):
+        return True
+
+
+def verify_and_update(password, stored_hash):
+    """Retourne (valide, nouveau hash ou None si aucun recalcul n'est nécessaire)"""
+    if not verify_password(password, stored_hash):
+        return False, None
+    if needs_rehash(stored_hash):
+        return True, hash_password(password)
+    return True, None
+
+
+def benchmark(duration=5.0, workers=None):
+    """Vérifications par seconde avec les paramètres configurés.
+
+    Mesure d'abord un seul thread (connexions/s par cœur), puis `workers`
+    threads en parallèle à travers le pool (PASSWORD_HASH_WORKERS par défaut).
+    """
+    password = "benchmark-password"
+    stored_hash = _compute_hash(password)
+
+    started = time.perf_counter()
+    single = 0
+    while time.perf_counter() - started < duration:
+        _compute_verify(password, stored_hash)
+        single += 1
+    per_core = single / (time.perf_counter() - started)
+
+    workers = workers or Config.PASSWORD_HASH_WORKERS
+    deadline = time.perf_counter() + duration
+    counts = [0] * workers
+
+    def client(index):
+        while time.perf_counter() < deadline:
+            verify_password(password, stored_hash)
+            counts[index] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "algorithm": _algorithm(),
+        "cost": Config.BCRYPT_LOG_ROUNDS if _algorithm() == "bcrypt" else Config.PASSWORD_PBKDF2_ITERATIONS,
+        "per_core": round(per_core, 1),
+        "pooled": round(sum(counts) / elapsed, 1),
+        "workers": workers,
+        "cpu_count": os.cpu_count(),
+    }
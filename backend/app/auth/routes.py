@@ -1,3 +1,4 @@
+import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import (
     create_access_token,
@@ -8,42 +9,11 @@ from flask_jwt_extended import (
 )
 from ..models.user import User
 from ..extensions import jwt
-import hashlib
-import os
-import base64
+from .passwords import PasswordServiceBusy, verify_and_update
+from ..ratelimit import limit
 
 auth_bp = Blueprint("auth", __name__)
-
-
-def verify_pbkdf2_password(password, hashed_password):
-    """Vérifier un mot de passe avec PBKDF2"""
-    try:
-        # Format: pbkdf2:sha256:iterations$salt$hash
-        parts = hashed_password.split('$')
-        if len(parts) != 3:
-            return False
-        
-        # Extraire les informations du hash
-        algorithm_info = parts[0].split(':')  # pbkdf2:sha256:260000
-        iterations = int(algorithm_info[2])
-        salt = parts[1]
-        stored_hash = parts[2]
-        
-        # Calculer le hash avec le sel et les itérations
-        computed_hash = hashlib.pbkdf2_hmac(
-            'sha256', 
-            password.encode('utf-8'), 
-            salt.encode('utf-8'), 
-            iterations
-        )
-        
-        # Convertir en hexadécimal pour comparaison
-        computed_hash_hex = computed_hash.hex()
-        
-        return computed_hash_hex == stored_hash
-    except Exception as e:
-        print(f"Erreur lors de la vérification PBKDF2: {e}")
-        return False
+logger = logging.getLogger(__name__)
 
 
 @auth_bp.route("/register/admin", methods=["POST"])
@@ -71,6 +41,8 @@ def register_admin():
 
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
+    except PasswordServiceBusy:
+        raise
     except Exception:
         return jsonify(
             {"error": "Une erreur est survenue lors de la création du compte"}
@@ -78,8 +50,9 @@ def register_admin():
 
 
 @auth_bp.route("/login", methods=["POST"])
+@limit("RATELIMIT_LOGIN", scope="login")
 def login():
-    """Route pour la connexion des utilisateurs avec vérification PBKDF2"""
+    """Route pour la connexion des utilisateurs"""
     data = request.get_json()
 
     if not data or not data.get("email") or not data.get("password"):
@@ -92,12 +65,14 @@ def login():
         if not user:
             return jsonify({"error": "Email ou mot de passe incorrect"}), 401
 
-        # Vérifier le mot de passe avec PBKDF2
-        if not verify_pbkdf2_password(data["password"], user.get("password_hash", "")):
+        # Vérifier le mot de passe (pool de hachage, hors du thread de requête)
+        valid, new_hash = verify_and_update(data["password"], user.get("password_hash", ""))
+        if not valid:
             return jsonify({"error": "Email ou mot de passe incorrect"}), 401
 
-        # Mettre à jour la date de dernière connexion
-        User.update_last_login_cabinet_medical(user["_id"])
+        # Mettre à jour la date de dernière connexion (et le hash si les
+        # paramètres de hachage ont changé)
+        User.update_last_login_cabinet_medical(user["_id"], password_hash=new_hash)
 
         # Créer les tokens
         access_token = create_access_token(
@@ -140,8 +115,10 @@ def login():
             }
         ), 200
 
+    except PasswordServiceBusy:
+        raise
     except Exception as e:
-        print(f"Erreur lors de la connexion: {e}")
+        logger.exception("Erreur lors de la connexion: %s", e)
         return jsonify({"error": "Une erreur est survenue lors de la connexion"}), 500
 
 
@@ -188,7 +165,7 @@ def get_profile():
 
         return jsonify(user_data), 200
     except Exception as e:
-        print(f"Erreur lors de la récupération du profil: {e}")
+        logger.exception("Erreur lors de la récupération du profil: %s", e)
         return jsonify(
             {"error": "Une erreur est survenue lors de la récupération du profil"}
         ), 500
@@ -229,7 +206,7 @@ def validate_token():
 
         return jsonify({"valid": True, "user": user_data}), 200
     except Exception as e:
-        print(f"Erreur lors de la validation du token: {e}")
+        logger.warning("Erreur lors de la validation du token: %s", e)
         return jsonify({"valid": False, "error": "Token invalide"}), 401
 
 
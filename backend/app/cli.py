@@ -0,0 +1,120 @@
+"""
+Commandes CLI de maintenance (`flask <commande>`).
+"""
+import click
+
+
+def register_cli(app):
+    """Enregistrer les commandes de maintenance sur l'application"""
+
+    @app.cli.command("migrate-graph-keys")
+    @click.option("--batch-size", default=1000, show_default=True, help="Nœuds traités par transaction")
+    def migrate_graph_keys(batch_size):
+        """Consolider les nœuds Patient/Doctor sur `mongo_id` et créer les index."""
+        from .data.migrations import migrate_node_keys
+
+        report = migrate_node_keys(batch_size=batch_size)
+        if report["dropped_constraints"]:
+            click.echo("Contraintes sur `id` supprimées: " + ", ".join(report["dropped_constraints"]))
+        for label in ("Patient", "Doctor"):
+            click.echo(
+                f"{label}: {report[label]['backfilled']} mongo_id renseigné(s), "
+                f"{report[label]['merged']} doublon(s) fusionné(s)"
+            )
+        click.echo("Contraintes: " + ("OK" if report["constraints"] else "ÉCHEC"))
+
+    @app.cli.command("rebuild-consultation-stats")
+    def rebuild_consultation_stats():
+        """Recalculer les compteurs de consultations depuis le graphe."""
+        from .data.consultation_stats import rebuild_counters
+
+        click.echo(f"{rebuild_counters()} compteur(s) recalculé(s)")
+
+    @app.cli.command("sync-graph")
+    @click.option("--batch-size", default=None, type=int, help="Lignes par transaction (SYNC_BATCH_SIZE)")
+    def sync_graph(batch_size):
+        """Pousser tous les profils patients/docteurs MongoDB vers Neo4j par lots."""
+        from .data.change_stream_sync import full_resync
+        from .data.sync_service import SyncService
+
+        report = full_resync(SyncService(batch_size=batch_size))
+        for label, stats in report.items():
+            click.echo(
+                f"{label}: {stats['rows']} nœud(s) en {stats['batches']} lot(s), "
+                f"{stats['rows_per_second']} lignes/s, {stats['retries']} nouvel(s) essai(s)"
+            )
+
+    @app.cli.command("sync-daemon")
+    @click.option("--batch-size", default=None, type=int, help="Changements appliqués par transaction")
+    @click.option("--max-wait", default=None, type=float, help="Secondes avant d'appliquer un lot partiel")
+    def sync_daemon(batch_size, max_wait):
+        """Suivre les change streams users/patients/doctors et mettre le graphe à jour."""
+        from .data.change_stream_sync import run_sync_daemon
+
+        try:
+            run_sync_daemon(batch_size=batch_size, max_wait=max_wait)
+        except KeyboardInterrupt:
+            click.echo("Arrêt du démon de synchronisation")
+
+    @app.cli.command("reconcile-graph")
+    @click.option("--fix", is_flag=True, help="Corriger les écarts (sinon rapport seul)")
+    @click.option("--batch-size", default=1000, show_default=True, help="Clés lues et corrigées par lot")
+    @click.option("--verbose", is_flag=True, help="Afficher chaque écart détecté")
+    def reconcile_graph_command(fix, batch_size, verbose):
+        """Comparer les profils MongoDB et les nœuds Patient/Doctor du graphe."""
+        from .data.reconciliation import reconcile_graph
+
+        on_discrepancy = (lambda kind, key: click.echo(f"{kind}\t{key}")) if verbose else None
+        report = reconcile_graph(fix=fix, batch_size=batch_size, on_discrepancy=on_discrepancy)
+        for label, counts in report.items():
+            click.echo(f"{label}: " + ", ".join(f"{kind}={count}" for kind, count in counts.items()))
+
+    @app.cli.command("rebuild-search-index")
+    @click.option("--batch-size", default=1000, show_default=True, help="Documents indexés par écriture")
+    def rebuild_search_index_command(batch_size):
+        """Réindexer utilisateurs, patients et docteurs pour la recherche."""
+        from .data.search_index import rebuild_search_index
+
+        for entity, count in rebuild_search_index(batch_size=batch_size).items():
+            click.echo(f"{entity}: {count} document(s) indexé(s)")
+
+    @app.cli.command("mongo-indexes")
+    @click.option("--check", is_flag=True, help="Signaler les index manquants sans les créer")
+    @click.option("--explain", "explain", is_flag=True, help="Contrôler le plan des requêtes fréquentes")
+    def mongo_indexes(check, explain):
+        """Créer (ou vérifier) les index MongoDB déclarés dans models/indexes.py."""
+        from .data.indexes import ensure_indexes, explain_query_shapes, missing_indexes
+
+        if not check:
+            for collection, errors in ensure_indexes().items():
+                for error in errors:
+                    click.echo(f"ÉCHEC {collection}: {error}")
+        missing = missing_indexes()
+        for collection, name in missing:
+            click.echo(f"MANQUANT {collection}.{name}")
+        click.echo(f"{len(missing)} index manquant(s)")
+
+        if explain:
+            for shape in explain_query_shapes():
+                flags = [flag for flag in ("collscan", "in_memory_sort") if shape[flag]]
+                click.echo(
+                    f"{'LENT' if flags else 'OK'}\t{shape['name']} ({shape['collection']}): "
+                    f"{' > '.join(shape['stages'])}, {shape['docs_examined']} doc(s) / "
+                    f"{shape['keys_examined']} clé(s) examinés, {shape['millis']} ms"
+                    + (f" [{', '.join(flags)}]" if flags else "")
+                )
+
+    @app.cli.command("password-benchmark")
+    @click.option("--seconds", default=5.0, show_default=True, help="Durée de chaque mesure")
+    @click.option("--workers", default=None, type=int, help="Clients parallèles (PASSWORD_HASH_WORKERS)")
+    def password_benchmark(seconds, workers):
+        """Mesurer les connexions/s (vérifications de mot de passe) par cœur et via le pool."""
+        from .auth.passwords import benchmark
+
+        result = benchmark(duration=seconds, workers=workers)
+        click.echo(f"{result['algorithm']} (coût {result['cost']})")
+        click.echo(f"1 thread: {result['per_core']} connexion(s)/s par cœur")
+        click.echo(
+            f"pool ({result['workers']} workers, {result['cpu_count']} cœur(s)): "
+            f"{result['pooled']} connexion(s)/s"
+        )
@@ -1,31 +1,50 @@
 from flask import Blueprint, request, jsonify
-from bson import ObjectId
-from datetime import datetime
-import uuid  # Import uuid to generate consultation IDs
-
-# Import what's needed for a local database connection (for patients/doctors)
-from pymongo import MongoClient
-from ..config import Config
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
+import base64
+import json
 
 # Import JWT utilities
 from flask_jwt_extended import jwt_required, get_jwt
+from neo4j.exceptions import Neo4jError
 
-# Import decorators and the working Neo4j driver
-from ..admin.routes import admin_required
-from ..extensions import neo4j_driver
+# Import decorators and the request-scoped Neo4j session
+from ..auth.authorization import admin_required
+from ..config import Config
+from ..extensions import mongo_db, neo4j_driver, get_neo4j_session
+from ..data.cypher import MATCH_CONSULTATION_BY_ID
+from ..data.enrichment import DOCTOR_SUMMARY_FIELDS, enrich_records, fetch_by_ids
+from ..data.consultation_stats import (
+    ensure_counters,
+    get_count,
+    get_counters,
+    record_deleted,
+    record_status_changed,
+)
+from ..data.consultation_store import (
+    consultation_row,
+    create_consultations,
+    export_consultations,
+)
 from ..models.consultation import Consultation
+from ..utils.streaming import iter_ndjson, ndjson_response
 
 from flask_cors import CORS
 
 
-# Create a local database connection for PATIENT and DOCTOR data ONLY
-mongo_client = MongoClient(Config.MONGODB_URI)
-db = mongo_client.get_database("cabinet_medical")
+# Shared database handle for PATIENT and DOCTOR data ONLY
+db = mongo_db
 
 consultation_bp = Blueprint("consultation", __name__, url_prefix="/api/consultations")
 
 CORS(consultation_bp, resources={r"/*": {"origins": "http://localhost:4200"}})
 
+# Erreurs détaillées renvoyées par l'import NDJSON (le total reste exact)
+MAX_REPORTED_ERRORS = 100
+
+# Profondeur maximale de la série quotidienne des statistiques
+MAX_STATS_DAYS = 366
+
 
 @consultation_bp.route("/", methods=["POST"])
 @jwt_required()
@@ -49,46 +68,11 @@ def create_consultation():
     except (KeyError, TypeError) as e:
         return jsonify({"message": f"Données manquantes ou invalides: {e}"}), 400
 
-    # Generate a unique ID for the consultation
-    consultation_id = str(uuid.uuid4())
-
-    # Prepare all properties for the Neo4j relationship
-    consultation_props = {
-        "consultation_id": consultation_id,
-        "date": consultation_obj.date.isoformat(),
-        "motif": consultation_obj.motif,
-        "diagnostic": consultation_obj.diagnostic,
-        "traitement": consultation_obj.traitement,
-        "notes": consultation_obj.notes,
-        "status": consultation_obj.status,
-        "created_at": datetime.utcnow().isoformat(),
-        "created_by": current_user["_id"],
-    }
-
-    # NO MORE MONGODB INSERT FOR CONSULTATIONS
-    # db.consultations.insert_one(...) is removed.
-
-    with neo4j_driver.session() as session:
-        # Ensure patient and doctor nodes exist
-        session.run(
-            "MERGE (p:Patient {mongo_id: $patient_id})",
-            patient_id=str(consultation_obj.patient_id),
-        )
-        session.run(
-            "MERGE (d:Doctor {mongo_id: $doctor_id})",
-            doctor_id=str(consultation_obj.doctor_id),
-        )
-        # Create the relationship with all properties
-        session.run(
-            """
-            MATCH (p:Patient {mongo_id: $patient_id})
-            MATCH (d:Doctor {mongo_id: $doctor_id})
-            CREATE (p)-[r:CONSULTED_BY $props]->(d)
-            """,
-            patient_id=str(consultation_obj.patient_id),
-            doctor_id=str(consultation_obj.doctor_id),
-            props=consultation_props,
-        )
+    # Nodes and relationship in one managed write transaction
+    # (consultations live only in the graph, no MongoDB insert)
+    [consultation_id] = create_consultations(
+        get_neo4j_session(), [consultation_row(consultation_obj, current_user["_id"])]
+    )
 
     return jsonify(
         {
@@ -98,6 +82,133 @@ def create_consultation():
     ), 201
 
 
+@consultation_bp.route("/bulk", methods=["POST"])
+@jwt_required()
+def create_consultations_bulk():
+    """Créer plusieurs consultations (ex. le planning d'une journée) en une transaction.
+
+    Corps : une liste de consultations, ou {"consultations": [...]}. Le lot
+    est atomique : une seule consultation invalide et rien n'est créé.
+    """
+    claims = get_jwt()
+    current_user = {"_id": claims["sub"], "role": claims["role"]}
+
+    if not (current_user["role"] == "admin" or current_user["role"] == "doctor"):
+        return jsonify({"message": "Non autorisé"}), 403
+
+    data = request.get_json()
+    if isinstance(data, dict):
+        data = data.get("consultations")
+    if not data or not isinstance(data, list):
+        return jsonify({"message": "Aucune consultation fournie"}), 400
+    if len(data) > Config.CONSULTATION_BULK_MAX:
+        return jsonify(
+            {"message": f"Trop de consultations (maximum {Config.CONSULTATION_BULK_MAX})"}
+        ), 400
+
+    rows, errors = [], []
+    for index, item in enumerate(data):
+        try:
+            consultation_obj = Consultation(**item)
+            is_valid, error_message = consultation_obj.validate()
+        except (KeyError, TypeError, ValueError, InvalidId) as e:
+            is_valid, error_message = False, f"Données manquantes ou invalides: {e}"
+        if not is_valid:
+            errors.append({"index": index, "message": error_message})
+            continue
+        rows.append(consultation_row(consultation_obj, current_user["_id"]))
+
+    if errors:
+        return jsonify({"message": "Consultations invalides", "errors": errors}), 400
+
+    consultation_ids = create_consultations(get_neo4j_session(), rows)
+
+    return jsonify(
+        {
+            "message": f"{len(consultation_ids)} consultation(s) créée(s) dans le graphe",
+            "consultation_ids": consultation_ids,
+        }
+    ), 201
+
+
+@consultation_bp.route("/import", methods=["POST"])
+@jwt_required()
+@admin_required
+def import_consultations():
+    """Importer des consultations NDJSON (une par ligne), lues en flux.
+
+    Chaque ligne est validée par le modèle `Consultation` ; les lignes
+    valides sont écrites par lots de CONSULTATION_IMPORT_BATCH_SIZE, une
+    transaction par lot. Un `consultation_id` fourni est conservé (reprise
+    d'un export) ; un lot qui échoue est rejeté en entier, les autres sont
+    conservés.
+    """
+    claims = get_jwt()
+    batch_size = Config.CONSULTATION_IMPORT_BATCH_SIZE
+    session = get_neo4j_session()
+    report = {"imported": 0, "rejected": 0, "batches": 0, "errors": []}
+
+    def add_error(line, message):
+        report["rejected"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line, "message": message})
+
+    def flush(batch):
+        try:
+            create_consultations(session, [row for _, row in batch])
+            report["imported"] += len(batch)
+        except Neo4jError as e:
+            for line, _ in batch:
+                add_error(line, f"Lot rejeté: {e.message}")
+        report["batches"] += 1
+
+    batch = []
+    for line, item in iter_ndjson(request.stream):
+        if isinstance(item, Exception):
+            add_error(line, f"JSON invalide: {item}")
+            continue
+        try:
+            consultation_id = item.pop("consultation_id", None) if isinstance(item, dict) else None
+            consultation_obj = Consultation(**item)
+            is_valid, error_message = consultation_obj.validate()
+        except (KeyError, TypeError, ValueError, InvalidId) as e:
+            is_valid, error_message = False, f"Données manquantes ou invalides: {e}"
+        if not is_valid:
+            add_error(line, error_message)
+            continue
+        batch.append((line, consultation_row(consultation_obj, claims["sub"], consultation_id)))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    status = 201 if report["imported"] else 400
+    return jsonify(report), status
+
+
+@consultation_bp.route("/export", methods=["GET"])
+@jwt_required()
+@admin_required
+def export_consultations_ndjson():
+    """Exporter les consultations en NDJSON, diffusé directement depuis Neo4j.
+
+    Filtres optionnels : patient_id, doctor_id, since (date ISO).
+    """
+    args = request.args
+
+    def rows():
+        with neo4j_driver.session() as session:
+            yield from export_consultations(
+                session,
+                patient_id=args.get("patient_id"),
+                doctor_id=args.get("doctor_id"),
+                since=args.get("since"),
+            )
+
+    return ndjson_response(rows(), filename="consultations.ndjson")
+
+
 @consultation_bp.route("/<consultation_id>", methods=["PUT"])
 @jwt_required()
 def update_consultation(consultation_id):
@@ -121,18 +232,28 @@ def update_consultation(consultation_id):
     update_props["updated_at"] = datetime.utcnow().isoformat()
     update_props["updated_by"] = current_user["_id"]
 
-    with neo4j_driver.session() as session:
-        result = session.run(
-            """
-            MATCH ()-[r:CONSULTED_BY {consultation_id: $consultation_id}]->()
-            SET r += $props
-            RETURN r
-            """,
-            consultation_id=consultation_id,
-            props=update_props,
-        )
-        if not result.single():
-            return jsonify({"message": "Consultation non trouvée"}), 404
+    session = get_neo4j_session()
+    result = session.run(
+        MATCH_CONSULTATION_BY_ID
+        + """
+        WITH p, r, d, r.status AS previous_status
+        SET r += $props
+        RETURN p.mongo_id AS patient_id, d.mongo_id AS doctor_id, r.date AS date,
+               previous_status, r.status AS status
+        """,
+        consultation_id=consultation_id,
+        props=update_props,
+    )
+    updated = result.single()
+    if not updated:
+        return jsonify({"message": "Consultation non trouvée"}), 404
+    record_status_changed(
+        updated["patient_id"],
+        updated["doctor_id"],
+        updated["previous_status"],
+        updated["status"],
+        updated["date"],
+    )
 
     return jsonify({"message": "Consultation mise à jour avec succès"}), 200
 
@@ -143,59 +264,79 @@ def get_consultation(consultation_id):
     claims = get_jwt()
     current_user = {"_id": claims["sub"], "role": claims["role"]}
 
-    with neo4j_driver.session() as session:
-        result = session.run(
-            """
-            MATCH (p:Patient)-[r:CONSULTED_BY {consultation_id: $consultation_id}]->(d:Doctor)
-            RETURN p.mongo_id AS patient_id, d.mongo_id AS doctor_id, r AS consultation
-            """,
-            consultation_id=consultation_id,
-        )
-        record = result.single()
-
-        if not record:
-            return jsonify({"message": "Consultation non trouvée"}), 404
-
-        # Extract data from the record
-        consultation_props = dict(record["consultation"])
-        patient_id = ObjectId(record["patient_id"])
-        doctor_id = ObjectId(record["doctor_id"])
-
-        # Authorization checks
-        if current_user["role"] == "patient" and str(patient_id) != current_user["_id"]:
-            return jsonify({"message": "Non autorisé"}), 403
-        if current_user["role"] == "doctor" and str(doctor_id) != current_user["_id"]:
-            return jsonify({"message": "Non autorisé"}), 403
-
-        # Enrich with data from MongoDB
-        patient = db.patients.find_one({"_id": patient_id})
-        doctor = db.doctors.find_one({"_id": doctor_id})
-
-        # Format the final response
-        consultation_data = {
-            "id": consultation_props.get("consultation_id"),
-            "patient": {"id": str(patient["_id"]), "name": patient["name"]}
-            if patient
-            else None,
-            "doctor": {"id": str(doctor["_id"]), "name": doctor["name"]}
-            if doctor
-            else None,
-            "date": consultation_props.get("date"),
-            "motif": consultation_props.get("motif"),
-            "diagnostic": consultation_props.get("diagnostic"),
-            "traitement": consultation_props.get("traitement"),
-            "notes": consultation_props.get("notes"),
-            "status": consultation_props.get("status"),
-            "created_at": consultation_props.get("created_at"),
-            "updated_at": consultation_props.get("updated_at"),
-        }
+    session = get_neo4j_session()
+    result = session.run(
+        MATCH_CONSULTATION_BY_ID
+        + """
+        RETURN p.mongo_id AS patient_id, d.mongo_id AS doctor_id, r AS consultation
+        """,
+        consultation_id=consultation_id,
+    )
+    record = result.single()
+
+    if not record:
+        return jsonify({"message": "Consultation non trouvée"}), 404
+
+    # Extract data from the record
+    consultation_props = dict(record["consultation"])
+    patient_id = record["patient_id"]
+    doctor_id = record["doctor_id"]
+
+    # Authorization checks
+    if current_user["role"] == "patient" and patient_id != current_user["_id"]:
+        return jsonify({"message": "Non autorisé"}), 403
+    if current_user["role"] == "doctor" and doctor_id != current_user["_id"]:
+        return jsonify({"message": "Non autorisé"}), 403
 
-        return jsonify(consultation_data), 200
+    # Enrich with data from MongoDB (nodes are keyed by the users _id)
+    patient = db.patients.find_one({"user_id": patient_id}, {"name": 1})
+    doctor = db.doctors.find_one({"user_id": doctor_id}, {"name": 1})
+
+    # Format the final response
+    consultation_data = {
+        "id": consultation_props.get("consultation_id"),
+        "patient": {"id": str(patient["_id"]), "name": patient["name"]}
+        if patient
+        else None,
+        "doctor": {"id": str(doctor["_id"]), "name": doctor["name"]}
+        if doctor
+        else None,
+        "date": consultation_props.get("date"),
+        "motif": consultation_props.get("motif"),
+        "diagnostic": consultation_props.get("diagnostic"),
+        "traitement": consultation_props.get("traitement"),
+        "notes": consultation_props.get("notes"),
+        "status": consultation_props.get("status"),
+        "created_at": consultation_props.get("created_at"),
+        "updated_at": consultation_props.get("updated_at"),
+    }
+
+    return jsonify(consultation_data), 200
+
+
+def _encode_cursor(date, consultation_id):
+    """Opaque continuation token for keyset pagination on (date, consultation_id)"""
+    raw = json.dumps([date, consultation_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token):
+    padded = token + "=" * (-len(token) % 4)
+    date, consultation_id = json.loads(base64.urlsafe_b64decode(padded))
+    return date, consultation_id
 
 
 @consultation_bp.route("/", methods=["GET"])
 @jwt_required()
 def list_consultations():
+    """List consultations, paginated by page number or by cursor.
+
+    Passing `cursor` (empty for the first page) switches to keyset
+    pagination ordered by (date, consultation_id): each page is a range
+    scan on the CONSULTED_BY(date) index created in `setup_neo4j_constraints`
+    and the response carries `next_cursor`. Totals are optional there
+    (`include_total=true`).
+    """
     claims = get_jwt()
     current_user = {"_id": claims["sub"], "role": claims["role"]}
 
@@ -203,60 +344,98 @@ def list_consultations():
     match_clause = "MATCH (p:Patient)-[r:CONSULTED_BY]->(d:Doctor)"
     where_clauses = []
     params = {}
+    counter_scope = ("all", "all")
 
     if current_user["role"] == "patient":
         where_clauses.append("p.mongo_id = $user_id")
         params["user_id"] = current_user["_id"]
+        counter_scope = ("patient", current_user["_id"])
     elif current_user["role"] == "doctor":
         where_clauses.append("d.mongo_id = $user_id")
         params["user_id"] = current_user["_id"]
+        counter_scope = ("doctor", current_user["_id"])
 
     if "status" in request.args and current_user["role"] != "patient":
         where_clauses.append("r.status = $status")
         params["status"] = request.args.get("status")
+        counter_scope = None
 
-    where_statement = ""
-    if where_clauses:
-        where_statement = "WHERE " + " AND ".join(where_clauses)
+    count_where = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
 
-    # Pagination
-    page = int(request.args.get("page", 1))
+    cursor_mode = "cursor" in request.args
     per_page = int(request.args.get("per_page", 10))
-    params["skip"] = (page - 1) * per_page
     params["limit"] = per_page
 
+    if cursor_mode:
+        include_total = request.args.get("include_total", "false").lower() == "true"
+        page = None
+        if request.args["cursor"]:
+            try:
+                params["cursor_date"], params["cursor_id"] = _decode_cursor(
+                    request.args["cursor"]
+                )
+            except (ValueError, TypeError):
+                return jsonify({"message": "Curseur invalide"}), 400
+            where_clauses.append(
+                "(r.date < $cursor_date OR "
+                "(r.date = $cursor_date AND r.consultation_id < $cursor_id))"
+            )
+        # One extra row tells whether another page exists
+        params["limit"] = per_page + 1
+        page_clause = "LIMIT $limit"
+    else:
+        include_total = True
+        page = int(request.args.get("page", 1))
+        params["skip"] = (page - 1) * per_page
+        page_clause = "SKIP $skip LIMIT $limit"
+
+    where_statement = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+
     # Query for the data
     query = f"""
     {match_clause}
     {where_statement}
     RETURN p.mongo_id AS patient_id, d.mongo_id AS doctor_id, r AS consultation
-    ORDER BY r.date DESC
-    SKIP $skip LIMIT $limit
+    ORDER BY r.date DESC, r.consultation_id DESC
+    {page_clause}
     """
 
     # Query for the total count
     count_query = f"""
     {match_clause}
-    {where_statement}
+    {count_where}
     RETURN count(r) AS total
     """
 
-    with neo4j_driver.session() as session:
-        # Get total count first
-        count_result = session.run(count_query, params)
-        total = count_result.single()["total"]
-
-        # Get the paginated data
-        results = session.run(query, params)
-        consultations = [dict(record) for record in results]
-
-    # Enrich with MongoDB data
-    patient_ids = [ObjectId(c["patient_id"]) for c in consultations]
-    doctor_ids = [ObjectId(c["doctor_id"]) for c in consultations]
-    patients = {
-        str(p["_id"]): p for p in db.patients.find({"_id": {"$in": patient_ids}})
-    }
-    doctors = {str(d["_id"]): d for d in db.doctors.find({"_id": {"$in": doctor_ids}})}
+    # Maintained counter first; otherwise count and page in one transaction
+    total = None
+    if include_total and counter_scope:
+        total = get_count(*counter_scope)
+
+    def read_page(tx, with_count):
+        page_total = tx.run(count_query, params).single()["total"] if with_count else None
+        return page_total, [dict(record) for record in tx.run(query, params)]
+
+    session = get_neo4j_session()
+    exact_total, consultations = session.read_transaction(
+        read_page, include_total and total is None
+    )
+    if total is None:
+        total = exact_total
+
+    next_cursor = None
+    if cursor_mode and len(consultations) > per_page:
+        consultations = consultations[:per_page]
+        last = dict(consultations[-1]["consultation"])
+        next_cursor = _encode_cursor(last.get("date"), last.get("consultation_id"))
+
+    # Enrich with MongoDB data (nodes are keyed by the users _id)
+    patients = fetch_by_ids(
+        "patients", (c["patient_id"] for c in consultations), fields=["user_id", "name"]
+    )
+    doctors = fetch_by_ids(
+        "doctors", (c["doctor_id"] for c in consultations), fields=["user_id", "name"]
+    )
 
     # Format the final response
     consultations_data = []
@@ -276,57 +455,63 @@ def list_consultations():
                 }
             )
 
-    return jsonify(
-        {
-            "consultations": consultations_data,
-            "total": total,
-            "page": page,
-            "per_page": per_page,
-            "total_pages": (total + per_page - 1) // per_page,
-        }
-    ), 200
+    response = {"consultations": consultations_data, "per_page": per_page}
+    if cursor_mode:
+        response["next_cursor"] = next_cursor
+    else:
+        response["page"] = page
+    if total is not None:
+        response["total"] = total
+        response["total_pages"] = (total + per_page - 1) // per_page
+
+    return jsonify(response), 200
 
 
 @consultation_bp.route("/stats", methods=["GET"])
 @jwt_required()
 @admin_required
 def get_consultation_stats():
-    with neo4j_driver.session() as session:
-        # Total consultations
-        total_result = session.run(
-            "MATCH ()-[:CONSULTED_BY]->() RETURN count(*) as total"
-        )
-        total_consultations = total_result.single()["total"]
-
-        # Consultations by doctor
-        by_doctor_result = session.run("""
-            MATCH ()-[:CONSULTED_BY]->(d:Doctor)
-            RETURN d.mongo_id as doctor_mongo_id, count(*) as count
-        """)
-
-        doctor_stats_raw = [dict(record) for record in by_doctor_result]
-
-    # Enrich with doctor names from MongoDB
-    doctor_ids = [ObjectId(stat["doctor_mongo_id"]) for stat in doctor_stats_raw]
-    doctors = {
-        str(d["_id"]): d["name"] for d in db.doctors.find({"_id": {"$in": doctor_ids}})
-    }
+    """Statistiques lues dans les compteurs précalculés (aucun parcours du graphe).
 
-    doctor_stats = []
-    for stat in doctor_stats_raw:
-        doctor_id_str = stat["doctor_mongo_id"]
-        doctor_stats.append(
-            {
-                "doctor_id": doctor_id_str,
-                "doctor_name": doctors.get(doctor_id_str, "Unknown"),
-                "consultation_count": stat["count"],
-            }
-        )
+    `days` (30 par défaut, entre 1 et MAX_STATS_DAYS) borne la série quotidienne.
+    """
+    try:
+        days = int(request.args.get("days", 30))
+    except ValueError:
+        return jsonify({"message": "Paramètre days invalide"}), 400
+    if not 1 <= days <= MAX_STATS_DAYS:
+        return jsonify({"message": f"days doit être compris entre 1 et {MAX_STATS_DAYS}"}), 400
+    ensure_counters()
+
+    totals = get_counters("all")
+    by_doctor = get_counters("doctor")
+    since = (datetime.utcnow() - timedelta(days=days)).date().isoformat()
+    by_day = get_counters("day", since=since)
+
+    # Docteurs résolus en une seule requête (les nœuds portent l'_id utilisateur)
+    doctors = fetch_by_ids(
+        "doctors", (stat["key"] for stat in by_doctor), fields=["user_id", "name"]
+    )
+
+    doctor_stats = [
+        {
+            "doctor_id": stat["key"],
+            "doctor_name": doctors.get(stat["key"], {}).get("name", "Unknown"),
+            "consultation_count": stat["count"],
+            "by_status": stat["statuses"],
+        }
+        for stat in by_doctor
+    ]
 
     return jsonify(
         {
-            "total_consultations": total_consultations,
+            "total_consultations": totals[0]["count"] if totals else 0,
+            "consultations_by_status": totals[0]["statuses"] if totals else {},
             "consultations_by_doctor": doctor_stats,
+            "consultations_by_day": [
+                {"date": stat["key"], "count": stat["count"], "by_status": stat["statuses"]}
+                for stat in by_day
+            ],
         }
     ), 200
 
@@ -335,18 +520,24 @@ def get_consultation_stats():
 @jwt_required()
 @admin_required
 def delete_consultation(consultation_id):
-    with neo4j_driver.session() as session:
-        result = session.run(
-            """
-            MATCH ()-[r:CONSULTED_BY {consultation_id: $consultation_id}]->()
-            DELETE r
-            RETURN r
-            """,
-            consultation_id=consultation_id,
-        )
-        # Check if a relationship was actually deleted
-        if not result.single():
-            return jsonify({"message": "Consultation non trouvée"}), 404
+    session = get_neo4j_session()
+    result = session.run(
+        MATCH_CONSULTATION_BY_ID
+        + """
+        WITH r, p.mongo_id AS patient_id, d.mongo_id AS doctor_id,
+             r.status AS status, r.date AS date
+        DELETE r
+        RETURN patient_id, doctor_id, status, date
+        """,
+        consultation_id=consultation_id,
+    )
+    # Check if a relationship was actually deleted
+    deleted = result.single()
+    if not deleted:
+        return jsonify({"message": "Consultation non trouvée"}), 404
+    record_deleted(
+        deleted["patient_id"], deleted["doctor_id"], deleted["status"], deleted["date"]
+    )
 
     # NO MONGODB DELETION NEEDED
     return jsonify({"message": "Consultation supprimée avec succès du graphe"}), 200
@@ -360,56 +551,51 @@ def get_consultation_history(patient_mongo_id):
     try:
 
         # Requête Neo4j pour récupérer toutes les relations CONSULTED_BY
-        with neo4j_driver.session() as session:
-            result = session.run("""
-                MATCH (p:Patient)-[r:CONSULTED_BY]->(d:Doctor)
-                WHERE p.mongo_id = $patient_mongo_id
-                RETURN d.mongo_id as doctor_mongo_id, 
-                       r.consultation_id as consultation_id,
-                       r.date as date,
-                       r.motif as motif,
-                       r.diagnostic as diagnostic,
-                       r.traitement as traitement,
-                       r.notes as notes,
-                       r.status as status,
-                       r.created_at as created_at
-                ORDER BY r.date DESC
-            """, patient_mongo_id=patient_mongo_id)
-
-            print(result)
-
-            consultations_history = []
-
-            for record in result:
-                # Récupérer les informations du patient depuis MongoDB
-                doctor = db.doctors.find_one({'user_id': record['doctor_mongo_id']})
-
-                print(doctor)
-
-                if doctor:
-                    consultation_data = {
-                        'consultation_id': record['consultation_id'],
-                        'date': record['date'],
-                        'motif': record['motif'],
-                        'diagnostic': record['diagnostic'],
-                        'traitement': record['traitement'],
-                        'notes': record['notes'] or '',
-                        'status': record['status'] or 'pending',
-                        'created_at': record['created_at'],
-                        'doctor': {
-                            'id_doctor': str(doctor['_id']),
-                            'name': doctor['name'],
-                            'email': doctor['email'],
-                            'phone': doctor['phone'],
-                            'speciality': doctor['speciality'],
-                        }
+        session = get_neo4j_session()
+        result = session.run("""
+            MATCH (p:Patient {mongo_id: $patient_mongo_id})-[r:CONSULTED_BY]->(d:Doctor)
+            RETURN d.mongo_id as doctor_mongo_id, 
+                   r.consultation_id as consultation_id,
+                   r.date as date,
+                   r.motif as motif,
+                   r.diagnostic as diagnostic,
+                   r.traitement as traitement,
+                   r.notes as notes,
+                   r.status as status,
+                   r.created_at as created_at
+            ORDER BY r.date DESC
+        """, patient_mongo_id=patient_mongo_id)
+
+        consultations_history = []
+
+        # Médecins résolus en une seule requête MongoDB
+        for record, doctor in enrich_records(
+            result, 'doctor_mongo_id', 'doctors', fields=DOCTOR_SUMMARY_FIELDS
+        ):
+            if doctor:
+                consultation_data = {
+                    'consultation_id': record['consultation_id'],
+                    'date': record['date'],
+                    'motif': record['motif'],
+                    'diagnostic': record['diagnostic'],
+                    'traitement': record['traitement'],
+                    'notes': record['notes'] or '',
+                    'status': record['status'] or 'pending',
+                    'created_at': record['created_at'],
+                    'doctor': {
+                        'id_doctor': str(doctor['_id']),
+                        'name': doctor['name'],
+                        'email': doctor['email'],
+                        'phone': doctor['phone'],
+                        'speciality': doctor['speciality'],
                     }
-                    consultations_history.append(consultation_data)
+                }
+                consultations_history.append(consultation_data)
 
-            return jsonify({
-                'consultations': consultations_history,
-                'total': len(consultations_history)
-            }), 200
+        return jsonify({
+            'consultations': consultations_history,
+            'total': len(consultations_history)
+        }), 200
 
     except Exception as e:
         return jsonify({'error': f'Erreur lors de la récupération de l\'historique: {str(e)}'}), 500
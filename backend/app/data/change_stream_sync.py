@@ -0,0 +1,171 @@
+"""
+Synchronisation incrémentale MongoDB -> Neo4j par change streams.
+
+Le démon suit `users`, `patients` et `doctors` sur un seul change stream
+de la base : toute écriture est propagée, y compris celles qui ne passent
+pas par les routes (scripts, console Atlas, routes qui oublient la
+synchronisation). L'index de recherche est mis à jour au passage. Les
+événements sont fusionnés par document puis appliqués
+par lots avec les API de `SyncService` ; le jeton de reprise est enregistré
+dans MongoDB après chaque lot appliqué, si bien qu'un redémarrage reprend
+là où le démon s'était arrêté (au moins une fois, écritures idempotentes).
+
+Un seul démon doit tourner pour toute l'application (`flask sync-daemon`).
+"""
+import logging
+import time
+from datetime import datetime
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from ..config import Config
+from ..extensions import get_mongo_database
+from .search_index import index_documents, remove_documents, remove_user
+from .sync_service import SyncService
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = ["users", "patients", "doctors"]
+RESUME_TOKENS_COLLECTION = "sync_resume_tokens"
+STREAM_ID = "graph-sync"
+
+# collection -> entité de l'index de recherche
+SEARCH_ENTITIES = {"users": "user", "patients": "patient", "doctors": "doctor"}
+
+# Jeton de reprise trop ancien (oplog tronqué) ou invalide
+_HISTORY_LOST_CODES = {260, 280, 286}
+
+
+def load_resume_token(stream_id=STREAM_ID):
+    doc = get_mongo_database()[RESUME_TOKENS_COLLECTION].find_one({"_id": stream_id})
+    return doc["token"] if doc else None
+
+
+def save_resume_token(token, stream_id=STREAM_ID, applied=0):
+    get_mongo_database()[RESUME_TOKENS_COLLECTION].update_one(
+        {"_id": stream_id},
+        {
+            "$set": {"token": token, "updated_at": datetime.utcnow()},
+            "$inc": {"applied": applied},
+        },
+        upsert=True,
+    )
+
+
+def full_resync(service):
+    """Pousser tous les profils vers le graphe (amorçage ou historique perdu)"""
+    db = get_mongo_database()
+    return {
+        "Patient": service.sync_patients(db.patients.find({}, batch_size=service.batch_size)),
+        "Doctor": service.sync_doctors(db.doctors.find({}, batch_size=service.batch_size)),
+    }
+
+
+class _PendingChanges:
+    """Dernier événement par document, en attente d'application"""
+
+    def __init__(self):
+        self.upserts = {name: {} for name in WATCHED_COLLECTIONS}
+        self.deletes = {name: set() for name in WATCHED_COLLECTIONS}
+        self.size = 0
+
+    def add(self, change):
+        collection = change["ns"]["coll"]
+        document_id = change["documentKey"]["_id"]
+        operation = change["operationType"]
+        if operation == "delete":
+            self.upserts[collection].pop(document_id, None)
+            self.deletes[collection].add(document_id)
+        elif change.get("fullDocument") is not None:
+            self.deletes[collection].discard(document_id)
+            self.upserts[collection][document_id] = change["fullDocument"]
+        self.size += 1
+
+    def apply(self, service):
+        db = get_mongo_database()
+
+        # Un changement d'utilisateur peut concerner les profils liés
+        user_ids = [str(user_id) for user_id in self.upserts["users"]]
+        if user_ids:
+            for collection in ("patients", "doctors"):
+                for profile in db[collection].find({"user_id": {"$in": user_ids}}):
+                    self.upserts[collection].setdefault(profile["_id"], profile)
+
+        for collection, entity in SEARCH_ENTITIES.items():
+            index_documents(entity, self.upserts[collection].values())
+            remove_documents(entity, self.deletes[collection])
+        for user_id in self.deletes["users"]:
+            remove_user(user_id)
+
+        if self.upserts["patients"]:
+            service.sync_patients(self.upserts["patients"].values())
+        if self.upserts["doctors"]:
+            service.sync_doctors(self.upserts["doctors"].values())
+        if self.deletes["patients"]:
+            service.delete_patients(self.deletes["patients"])
+        if self.deletes["doctors"]:
+            service.delete_doctors(self.deletes["doctors"])
+        if self.deletes["users"]:
+            service.delete_users(self.deletes["users"])
+
+
+def run_sync_daemon(batch_size=None, max_wait=None, stop=None):
+    """Suivre le change stream jusqu'à ce que `stop()` retourne vrai"""
+    service = SyncService(batch_size=batch_size)
+    max_wait = Config.SYNC_DAEMON_MAX_WAIT if max_wait is None else max_wait
+    stop = stop or (lambda: False)
+    db = get_mongo_database()
+    pipeline = [{"$match": {"ns.coll": {"$in": WATCHED_COLLECTIONS}}}]
+
+    while not stop():
+        token = load_resume_token()
+        if token is None:
+            # Premier démarrage : état complet, puis suivi depuis maintenant
+            with db.watch(pipeline) as stream:
+                start_token = stream.resume_token
+            logger.info("🔄 No resume token, running a full graph resync")
+            full_resync(service)
+            save_resume_token(start_token)
+            token = start_token
+
+        try:
+            with db.watch(
+                pipeline,
+                full_document="updateLookup",
+                resume_after=token,
+                max_await_time_ms=int(max_wait * 1000),
+            ) as stream:
+                logger.info("✅ Graph sync daemon following change stream")
+                _follow(stream, service, max_wait, stop)
+        except OperationFailure as ex:
+            if ex.code not in _HISTORY_LOST_CODES:
+                raise
+            logger.warning("⚠️ Resume token rejected (%s), resyncing the graph", ex)
+            get_mongo_database()[RESUME_TOKENS_COLLECTION].delete_one({"_id": STREAM_ID})
+        except PyMongoError as ex:
+            logger.error("❌ Change stream interrupted: %s", ex)
+            time.sleep(Config.SYNC_RETRY_BACKOFF)
+
+
+def _follow(stream, service, max_wait, stop):
+    pending = _PendingChanges()
+    saved_token = None
+    deadline = time.monotonic() + max_wait
+    while not stop():
+        change = stream.try_next()
+        if change is not None:
+            pending.add(change)
+        full = pending.size >= service.batch_size
+        idle = change is None or time.monotonic() >= deadline
+        if pending.size and (full or idle):
+            pending.apply(service)
+            saved_token = stream.resume_token
+            save_resume_token(saved_token, applied=pending.size)
+            logger.info("🔄 Applied %s change(s) to the graph", pending.size)
+            pending = _PendingChanges()
+            deadline = time.monotonic() + max_wait
+        elif change is None and stream.resume_token != saved_token:
+            # Aucun changement suivi : le jeton avance quand même avec l'oplog
+            saved_token = stream.resume_token
+            save_resume_token(saved_token)
+            deadline = time.monotonic() + max_wait
@@ -0,0 +1,224 @@
+"""
+Compteurs de consultations maintenus de façon incrémentale.
+
+Les consultations ne vivent que dans Neo4j (relations CONSULTED_BY) ; compter
+un sous-ensemble impose de parcourir toutes les relations concernées. Les
+routes qui créent, modifient ou suppriment une consultation mettent donc à
+jour des compteurs MongoDB (`$inc` atomique, un document par portée) :
+
+    {"_id": "doctor:<user_id>", "scope": "doctor", "key": "<user_id>",
+     "count": 12, "statuses": {"pending": 3, "completed": 9}}
+
+Portées : `all`, `doctor`, `patient` et `day` (jour de la consultation,
+AAAA-MM-JJ). Les compteurs ne sont utilisés qu'une fois initialisés par
+`rebuild_counters` (document `meta`), sinon les appelants retombent sur un
+comptage exact. `reconcile_counters` les recalcule périodiquement pour
+absorber les écarts (suppressions en cascade d'un patient ou d'un docteur,
+écritures concurrentes d'une reconstruction).
+"""
+import logging
+import re
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from ..config import Config
+from ..extensions import get_neo4j_driver, mongo_db
+from ..utils.background import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_COLLECTION = "consultation_counters"
+META_ID = "meta"
+LEASE_ID = "reconcile_lease"
+
+# Les statuts deviennent des noms de champs : on écarte ce que MongoDB refuse
+_STATUS_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,40}$")
+
+
+def _status_field(status):
+    status = status or "pending"
+    return f"statuses.{status if _STATUS_PATTERN.match(status) else 'other'}"
+
+
+def _day(date):
+    if isinstance(date, datetime):
+        return date.date().isoformat()
+    return str(date)[:10] if date else None
+
+
+def _counter_keys(patient_id, doctor_id, date=None):
+    keys = [("all", "all"), ("doctor", str(doctor_id)), ("patient", str(patient_id))]
+    day = _day(date)
+    if day:
+        keys.append(("day", day))
+    return keys
+
+
+def _apply(keys, increments):
+    operations = [
+        UpdateOne(
+            {"_id": f"{scope}:{key}"},
+            {"$inc": increments, "$set": {"scope": scope, "key": key}},
+            upsert=True,
+        )
+        for scope, key in keys
+    ]
+    mongo_db[COUNTERS_COLLECTION].bulk_write(operations, ordered=False)
+
+
+def record_created(patient_id, doctor_id, status="pending", date=None):
+    """Comptabiliser une consultation créée"""
+    _apply(_counter_keys(patient_id, doctor_id, date), {"count": 1, _status_field(status): 1})
+
+
+def record_created_many(consultations):
+    """Comptabiliser un lot de (patient_id, doctor_id, statut, date) en une écriture"""
+    increments = {}
+    for patient_id, doctor_id, status, date in consultations:
+        field = _status_field(status)
+        for key in _counter_keys(patient_id, doctor_id, date):
+            counter = increments.setdefault(key, {"count": 0})
+            counter["count"] += 1
+            counter[field] = counter.get(field, 0) + 1
+    if not increments:
+        return
+    operations = [
+        UpdateOne(
+            {"_id": f"{scope}:{key}"},
+            {"$inc": counter, "$set": {"scope": scope, "key": key}},
+            upsert=True,
+        )
+        for (scope, key), counter in increments.items()
+    ]
+    mongo_db[COUNTERS_COLLECTION].bulk_write(operations, ordered=False)
+
+
+def record_deleted(patient_id, doctor_id, status="pending", date=None):
+    """Comptabiliser une consultation supprimée"""
+    _apply(_counter_keys(patient_id, doctor_id, date), {"count": -1, _status_field(status): -1})
+
+
+def record_status_changed(patient_id, doctor_id, old_status, new_status, date=None):
+    """Déplacer une consultation d'un statut à l'autre"""
+    old_field, new_field = _status_field(old_status), _status_field(new_status)
+    if old_field != new_field:
+        _apply(_counter_keys(patient_id, doctor_id, date), {old_field: -1, new_field: 1})
+
+
+def counters_ready():
+    return mongo_db[COUNTERS_COLLECTION].find_one({"_id": META_ID}, {"_id": 1}) is not None
+
+
+def ensure_counters():
+    """Amorcer les compteurs au premier usage"""
+    if not counters_ready():
+        rebuild_counters()
+
+
+def get_count(scope, key="all"):
+    """Valeur d'un compteur, ou None s'il n'est pas encore fiable"""
+    documents = {
+        doc["_id"]: doc
+        for doc in mongo_db[COUNTERS_COLLECTION].find(
+            {"_id": {"$in": [META_ID, f"{scope}:{key}"]}}
+        )
+    }
+    if META_ID not in documents:
+        return None
+    counter = documents.get(f"{scope}:{key}")
+    return max(counter["count"], 0) if counter else 0
+
+
+def get_counters(scope, since=None):
+    """Compteurs non nuls d'une portée : [{key, count, statuses}, ...]"""
+    query = {"scope": scope, "count": {"$gt": 0}}
+    if since is not None:
+        query["key"] = {"$gte": since}
+    return [
+        {
+            "key": doc["key"],
+            "count": doc["count"],
+            "statuses": {k: v for k, v in doc.get("statuses", {}).items() if v > 0},
+        }
+        for doc in mongo_db[COUNTERS_COLLECTION].find(query).sort("key", 1)
+    ]
+
+
+def rebuild_counters():
+    """Recalculer tous les compteurs depuis le graphe (amorçage ou réparation)"""
+    with get_neo4j_driver().session() as session:
+        rows = session.run(
+            """
+            MATCH (p:Patient)-[r:CONSULTED_BY]->(d:Doctor)
+            RETURN p.mongo_id AS patient_id, d.mongo_id AS doctor_id,
+                   substring(toString(r.date), 0, 10) AS day,
+                   r.status AS status, count(r) AS count
+            """
+        )
+        totals = {}
+        for row in rows:
+            field = _status_field(row["status"]).split(".", 1)[1]
+            for key in _counter_keys(row["patient_id"], row["doctor_id"], row["day"]):
+                counter = totals.setdefault(key, {"count": 0, "statuses": {}})
+                counter["count"] += row["count"]
+                counter["statuses"][field] = counter["statuses"].get(field, 0) + row["count"]
+
+    collection = mongo_db[COUNTERS_COLLECTION]
+    rebuilt_at = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"_id": f"{scope}:{key}"},
+            {
+                "$set": {
+                    "scope": scope,
+                    "key": key,
+                    "count": counter["count"],
+                    "statuses": counter["statuses"],
+                    "rebuilt_at": rebuilt_at,
+                }
+            },
+            upsert=True,
+        )
+        for (scope, key), counter in totals.items()
+    ]
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    # Portées qui n'ont plus aucune consultation
+    collection.update_many(
+        {"_id": {"$nin": [META_ID, LEASE_ID]}, "rebuilt_at": {"$ne": rebuilt_at}},
+        {"$set": {"count": 0, "statuses": {}, "rebuilt_at": rebuilt_at}},
+    )
+    collection.update_one(
+        {"_id": META_ID}, {"$set": {"rebuilt_at": rebuilt_at}}, upsert=True
+    )
+    return len(totals)
+
+
+def reconcile_counters(interval):
+    """Reconstruction périodique, exécutée par un seul worker à la fois.
+
+    Un bail MongoDB (`until`) désigne le worker qui reconstruit ; les autres
+    passent leur tour jusqu'à son expiration.
+    """
+    now = datetime.utcnow()
+    try:
+        mongo_db[COUNTERS_COLLECTION].find_one_and_update(
+            {"_id": LEASE_ID, "until": {"$lte": now}},
+            {"$set": {"until": now + timedelta(seconds=interval)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # Bail détenu par un autre worker
+        return None
+    count = rebuild_counters()
+    logger.info("✅ Consultation counters reconciled (%s scopes)", count)
+    return count
+
+
+reconciler = PeriodicWorker(
+    "consultation-stats-reconciler",
+    lambda: reconcile_counters(Config.CONSULTATION_STATS_RECONCILE_INTERVAL),
+    Config.CONSULTATION_STATS_RECONCILE_INTERVAL,
+)
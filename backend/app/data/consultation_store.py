@@ -0,0 +1,87 @@
+"""
+Écriture des consultations dans le graphe.
+
+Une consultation est une relation CONSULTED_BY entre les nœuds Patient et
+Doctor (clés `mongo_id`). Les nœuds et les relations d'un appel sont écrits
+dans une seule transaction gérée (`write_transaction`) : une requête
+`UNWIND`, un seul commit, et un rejeu automatique par le driver en cas
+d'erreur transitoire. Un lot est atomique : tout est créé ou rien.
+"""
+import uuid
+from datetime import datetime
+
+from .consultation_stats import record_created_many
+
+CREATE_CONSULTATIONS = """
+UNWIND $rows AS row
+MERGE (p:Patient {mongo_id: row.patient_id})
+MERGE (d:Doctor {mongo_id: row.doctor_id})
+CREATE (p)-[r:CONSULTED_BY]->(d)
+SET r = row.props
+RETURN count(r) AS created
+"""
+
+
+def consultation_row(consultation_obj, created_by, consultation_id=None):
+    """Ligne d'écriture pour un modèle `Consultation` validé"""
+    return {
+        "patient_id": str(consultation_obj.patient_id),
+        "doctor_id": str(consultation_obj.doctor_id),
+        "props": {
+            "consultation_id": consultation_id or str(uuid.uuid4()),
+            "date": consultation_obj.date.isoformat(),
+            "motif": consultation_obj.motif,
+            "diagnostic": consultation_obj.diagnostic,
+            "traitement": consultation_obj.traitement,
+            "notes": consultation_obj.notes,
+            "status": consultation_obj.status,
+            "created_at": datetime.utcnow().isoformat(),
+            "created_by": created_by,
+        },
+    }
+
+
+def _create(tx, rows):
+    return tx.run(CREATE_CONSULTATIONS, rows=rows).single()["created"]
+
+
+def create_consultations(session, rows):
+    """Créer les consultations de `rows` en une transaction ; retourne leurs ids"""
+    session.write_transaction(_create, rows)
+    record_created_many(
+        (row["patient_id"], row["doctor_id"], row["props"]["status"], row["props"]["date"])
+        for row in rows
+    )
+    return [row["props"]["consultation_id"] for row in rows]
+
+
+def export_consultations(session, patient_id=None, doctor_id=None, since=None):
+    """Itérer toutes les consultations depuis le curseur de résultat Neo4j.
+
+    Pas d'ORDER BY : les enregistrements sont récupérés par paquets
+    (`fetch_size` du driver) au fur et à mesure de la consommation.
+    """
+    where_clauses = []
+    if patient_id:
+        where_clauses.append("p.mongo_id = $patient_id")
+    if doctor_id:
+        where_clauses.append("d.mongo_id = $doctor_id")
+    if since:
+        where_clauses.append("r.date >= $since")
+    where_statement = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+
+    result = session.run(
+        f"""
+        MATCH (p:Patient)-[r:CONSULTED_BY]->(d:Doctor)
+        {where_statement}
+        RETURN p.mongo_id AS patient_id, d.mongo_id AS doctor_id, properties(r) AS props
+        """,
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+        since=since,
+    )
+    for record in result:
+        row = dict(record["props"])
+        row["patient_id"] = record["patient_id"]
+        row["doctor_id"] = record["doctor_id"]
+        yield row
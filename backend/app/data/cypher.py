@@ -0,0 +1,12 @@
+"""
+Fragments Cypher partagés entre les blueprints.
+"""
+
+# Lookup of a single consultation by its id. The equality predicate on the
+# relationship property is served by the CONSULTED_BY(consultation_id) index
+# created in `setup_neo4j_constraints`, so the cost does not depend on the
+# number of consultations in the graph. Binds `p`, `r` and `d`.
+MATCH_CONSULTATION_BY_ID = """
+MATCH (p:Patient)-[r:CONSULTED_BY]->(d:Doctor)
+WHERE r.consultation_id = $consultation_id
+"""
@@ -0,0 +1,43 @@
+"""
+Enrichissement des résultats Cypher avec les profils MongoDB.
+
+Au lieu d'un `find_one` par enregistrement Neo4j, les identifiants étrangers
+sont collectés sur tout le flux de résultats puis résolus en une seule
+requête `$in` projetée.
+"""
+from bson import ObjectId
+
+from ..extensions import mongo_db
+
+# Projections des profils embarqués dans les réponses de consultations
+DOCTOR_SUMMARY_FIELDS = ["user_id", "name", "email", "phone", "speciality"]
+PATIENT_SUMMARY_FIELDS = ["user_id", "name", "email", "phone", "birth_date", "address"]
+
+
+def fetch_by_ids(collection, ids, field="user_id", fields=None):
+    """Charger en une requête les documents dont `field` est dans `ids`"""
+    ids = {str(i) for i in ids if i}
+    if not ids:
+        return {}
+    values = list(ids)
+    if field == "_id":
+        values = [ObjectId(i) for i in values if ObjectId.is_valid(i)]
+    projection = {name: 1 for name in fields} if fields else None
+    return {
+        str(doc[field]): doc
+        for doc in mongo_db[collection].find({field: {"$in": values}}, projection)
+    }
+
+
+def enrich_records(records, id_key, collection, field="user_id", fields=None):
+    """Associer chaque enregistrement à son document MongoDB.
+
+    `records` est un itérable d'enregistrements (résultat Cypher ou dicts) ;
+    il est consommé entièrement. Retourne une liste de (dict, document ou None)
+    dans l'ordre d'origine.
+    """
+    rows = [dict(record) for record in records]
+    documents = fetch_by_ids(
+        collection, (row.get(id_key) for row in rows), field=field, fields=fields
+    )
+    return [(row, documents.get(str(row.get(id_key)))) for row in rows]
@@ -0,0 +1,92 @@
+"""
+Gestion des index MongoDB déclarés dans `models/indexes.py`.
+
+`ensure_indexes` est idempotent : `createIndexes` ne fait rien pour un index
+déjà présent avec la même définition. Une création qui échoue (doublons
+existants pour un index unique, définition divergente) est signalée sans
+bloquer les autres.
+"""
+import logging
+
+from pymongo.errors import OperationFailure
+
+from ..extensions import get_mongo_database
+from ..models.indexes import MONGO_INDEXES, QUERY_SHAPES
+
+logger = logging.getLogger(__name__)
+
+_ensured = set()
+
+
+def ensure_indexes(collections=None):
+    """Créer les index déclarés ; retourne {collection: [erreurs]}"""
+    db = get_mongo_database()
+    errors = {}
+    for collection in collections or MONGO_INDEXES:
+        for index in MONGO_INDEXES[collection]:
+            try:
+                db[collection].create_indexes([index])
+            except OperationFailure as ex:
+                name = index.document["name"]
+                errors.setdefault(collection, []).append(f"{name}: {ex}")
+                logger.warning("⚠️ Index %s.%s not created: %s", collection, name, ex)
+        _ensured.add(collection)
+    return errors
+
+
+def ensure_collection_indexes(collection):
+    """Créer une fois par processus les index d'une collection (usage paresseux)"""
+    if collection not in _ensured:
+        ensure_indexes([collection])
+
+
+def missing_indexes():
+    """Index déclarés absents de la base : [(collection, nom), ...]"""
+    db = get_mongo_database()
+    missing = []
+    for collection, indexes in MONGO_INDEXES.items():
+        existing = db[collection].index_information()
+        existing_keys = {tuple(info["key"]) for info in existing.values()}
+        for index in indexes:
+            document = index.document
+            keys = tuple(document["key"].items())
+            if document["name"] not in existing and keys not in existing_keys:
+                missing.append((collection, document["name"]))
+    return missing
+
+
+def plan_stages(plan):
+    stages = [plan.get("stage")]
+    for child in ("inputStage", "queryPlan"):
+        if child in plan:
+            stages += plan_stages(plan[child])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return [stage for stage in stages if stage]
+
+
+def explain_query_shapes(shapes=None):
+    """Plan gagnant de chaque forme de requête ; `collscan` signale un parcours complet"""
+    db = get_mongo_database()
+    report = []
+    for name, collection, query, sort in shapes or QUERY_SHAPES:
+        command = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = dict(sort)
+        explain = db.command("explain", command, verbosity="executionStats")
+        stages = plan_stages(explain["queryPlanner"]["winningPlan"])
+        stats = explain.get("executionStats", {})
+        report.append(
+            {
+                "name": name,
+                "collection": collection,
+                "stages": stages,
+                "collscan": "COLLSCAN" in stages,
+                "in_memory_sort": "SORT" in stages,
+                "docs_examined": stats.get("totalDocsExamined"),
+                "keys_examined": stats.get("totalKeysExamined"),
+                "returned": stats.get("nReturned"),
+                "millis": stats.get("executionTimeMillis"),
+            }
+        )
+    return report
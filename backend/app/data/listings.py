@@ -0,0 +1,139 @@
+"""
+Listes administrateur des utilisateurs d'un rôle avec leur profil.
+
+Une page (`page`/`per_page`) coûte deux allers-retours MongoDB quelle que
+soit sa taille : une agrégation `$facet` sur `users` (total + page triée et
+projetée, au plus MAX_PER_PAGE documents), puis une seule requête `$in` sur
+la collection de profils, fusionnée en mémoire.
+
+Sans pagination, la liste complète ne passe pas par `$facet` (un seul
+document de résultat, limité à 16 Mo) : `iter_users_with_profiles` parcourt
+un curseur projeté, trié par l'index `users_role_created_at_id`, et résout
+les profils par tranches de `STREAM_BATCH_SIZE`. C'est aussi le chemin du
+mode diffusion : la mémoire reste bornée par la tranche et non par la
+taille de la collection.
+"""
+from itertools import islice
+
+from ..config import Config
+from ..extensions import mongo_db
+
+USER_FIELDS = ["email", "first_name", "last_name", "created_at", "last_login"]
+
+# Champs triables côté serveur (whitelist : le paramètre vient de la requête)
+SORTABLE_FIELDS = {"email", "first_name", "last_name", "created_at", "last_login"}
+
+MAX_PER_PAGE = 200
+
+
+def parse_listing_args(args, default_sort="created_at"):
+    """Lire page/per_page/sort/order depuis les paramètres de requête.
+
+    Sans `page` ni `per_page`, toute la liste est renvoyée (comportement historique).
+    """
+    paginate = "page" in args or "per_page" in args
+    page = max(int(args.get("page", 1)), 1)
+    per_page = min(max(int(args.get("per_page", 20)), 1), MAX_PER_PAGE)
+    sort = args.get("sort", default_sort)
+    if sort not in SORTABLE_FIELDS:
+        raise ValueError(f"Tri invalide. Champs autorisés: {sorted(SORTABLE_FIELDS)}")
+    order = -1 if args.get("order", "desc").lower() == "desc" else 1
+    return {
+        "page": page if paginate else None,
+        "per_page": per_page if paginate else None,
+        "sort": sort,
+        "order": order,
+    }
+
+
+def list_users_with_profiles(role, profile_collection, profile_fields, page=None,
+                             per_page=None, sort="created_at", order=-1):
+    """Retourner (total, [(user, profil ou None), ...]) pour un rôle donné"""
+    if not per_page:
+        rows = list(
+            iter_users_with_profiles(role, profile_collection, profile_fields, sort=sort, order=order)
+        )
+        return len(rows), rows
+
+    items_stages = [
+        {"$sort": {sort: order, "_id": order}},
+        {"$skip": (page - 1) * per_page},
+        {"$limit": per_page},
+        {"$project": {field: 1 for field in USER_FIELDS}},
+    ]
+
+    facet = next(
+        mongo_db.users.aggregate(
+            [
+                {"$match": {"role": role}},
+                {"$facet": {"total": [{"$count": "n"}], "items": items_stages}},
+            ]
+        )
+    )
+    total = facet["total"][0]["n"] if facet["total"] else 0
+    users = facet["items"]
+
+    projection = {field: 1 for field in profile_fields}
+    projection["user_id"] = 1
+    profiles = {
+        profile["user_id"]: profile
+        for profile in mongo_db[profile_collection].find(
+            {"user_id": {"$in": [str(user["_id"]) for user in users]}}, projection
+        )
+    }
+    return total, [(user, profiles.get(str(user["_id"]))) for user in users]
+
+
+def iter_users_with_profiles(role, profile_collection, profile_fields, page=None,
+                             per_page=None, sort="created_at", order=-1, batch_size=None):
+    """Itérer (user, profil ou None) sans matérialiser la liste"""
+    batch_size = batch_size or Config.STREAM_BATCH_SIZE
+    cursor = (
+        mongo_db.users.find({"role": role}, {field: 1 for field in USER_FIELDS})
+        .sort([(sort, order), ("_id", order)])
+        .batch_size(batch_size)
+        # Tri sur un champ non indexé : sur disque plutôt qu'un échec à 100 Mo
+        .allow_disk_use(True)
+    )
+    if per_page:
+        cursor = cursor.skip((page - 1) * per_page).limit(per_page)
+
+    projection = {field: 1 for field in profile_fields}
+    projection["user_id"] = 1
+    while True:
+        users = list(islice(cursor, batch_size))
+        if not users:
+            return
+        profiles = {
+            profile["user_id"]: profile
+            for profile in mongo_db[profile_collection].find(
+                {"user_id": {"$in": [str(user["_id"]) for user in users]}}, projection
+            )
+        }
+        for user in users:
+            yield user, profiles.get(str(user["_id"]))
+
+
+def count_users(role):
+    return mongo_db.users.count_documents({"role": role})
+
+
+def streamed_totals(role, listing):
+    """Champs `total`/pagination d'une liste diffusée, calculés après la liste"""
+
+    def extra(count):
+        total = count_users(role) if listing["per_page"] else count
+        return {"total": total, **pagination_info(total, listing["page"], listing["per_page"])}
+
+    return extra
+
+
+def pagination_info(total, page, per_page):
+    """Champs de pagination ajoutés à la réponse quand la liste est paginée"""
+    if not per_page:
+        return {}
+    return {
+        "page": page,
+        "per_page": per_page,
+        "total_pages": (total + per_page - 1) // per_page,
+    }
@@ -0,0 +1,262 @@
+"""
+File d'envoi des emails (codes d'authentification, réinitialisations).
+
+Les routes enregistrent le message dans `mail_queue` et répondent tout de
+suite ; le dispatcher de fond réserve les messages dus par lots et les
+envoie sur des connexions SMTP persistantes (`SMTPPool`) au lieu d'ouvrir
+une session STARTTLS + login par email.
+
+- message envoyé : supprimé de la file ;
+- échec temporaire (réseau, code 4xx) : nouvelle tentative après
+  MAIL_RETRY_BACKOFF * 2^tentatives secondes ;
+- échec de connexion ou d'authentification (aucun message envoyé) :
+  `SMTPConnectionFailure`, toujours retenté sans consommer de tentative,
+  après MAIL_RETRY_BACKOFF * 2^reports secondes (au plus 32 fois
+  MAIL_RETRY_BACKOFF) ;
+- échec définitif (code 5xx renvoyé pour ce message, destinataire refusé)
+  ou MAIL_MAX_ATTEMPTS atteint : `status = "failed"`. Le corps (codes, liens de
+  réinitialisation) est supprimé ; l'en-tête et l'erreur restent pour
+  diagnostic pendant MAIL_FAILED_RETENTION secondes (index TTL sur
+  `expires_at`).
+
+Une erreur SMTP pendant un envoi laisse la session dans un état incertain :
+la connexion est fermée au lieu d'être rendue au pool, et les messages
+restants du sous-lot sont reportés.
+
+Une réservation expirée (worker arrêté en plein envoi) est reprise par un
+autre worker : livraison au moins une fois.
+"""
+import logging
+import smtplib
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from pymongo import DeleteOne, UpdateOne
+
+from ..config import Config
+from ..extensions import mongo_db
+from ..utils.background import PeriodicWorker
+from ..utils.smtp_pool import SMTPPool
+from .indexes import ensure_collection_indexes
+
+logger = logging.getLogger(__name__)
+
+MAIL_COLLECTION = "mail_queue"
+
+smtp_pool = SMTPPool(
+    Config.SMTP_SERVER,
+    Config.SMTP_PORT,
+    username=Config.SMTP_USERNAME,
+    password=Config.SMTP_PASSWORD,
+    use_tls=Config.SMTP_USE_TLS,
+    size=Config.MAIL_POOL_SIZE,
+    timeout=Config.SMTP_TIMEOUT,
+    idle_timeout=Config.SMTP_IDLE_TIMEOUT,
+)
+_stats = {"sent": 0, "retried": 0, "deferred": 0, "failed": 0, "batches": 0, "last_sent": None}
+
+
+def enqueue_mail(to, subject, body, kind="generic"):
+    """Mettre un email en file ; retourne son identifiant"""
+    now = datetime.utcnow()
+    result = mongo_db[MAIL_COLLECTION].insert_one(
+        {
+            "to": to,
+            "from": Config.MAIL_FROM,
+            "subject": subject,
+            "body": body,
+            "kind": kind,
+            "status": "pending",
+            "attempts": 0,
+            "enqueued_at": now,
+            "available_at": now,
+        }
+    )
+    mail_dispatcher.ensure_started()
+    mail_dispatcher.wake()
+    return result.inserted_id
+
+
+def _message(entry):
+    message = EmailMessage()
+    message["From"] = entry["from"]
+    message["To"] = entry["to"]
+    message["Subject"] = entry["subject"]
+    message.set_content(entry["body"])
+    return message
+
+
+def _claim(limit):
+    """Réserver jusqu'à `limit` messages dus pour ce worker"""
+    collection = mongo_db[MAIL_COLLECTION]
+    now = datetime.utcnow()
+    due = {"status": "pending", "available_at": {"$lte": now}}
+    ids = [doc["_id"] for doc in collection.find(due, {"_id": 1}).sort("available_at", 1).limit(limit)]
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    collection.update_many(
+        {"_id": {"$in": ids}, **due},
+        {
+            "$set": {
+                "claimed_by": token,
+                "available_at": now + timedelta(seconds=Config.MAIL_CLAIM_TIMEOUT),
+            }
+        },
+    )
+    return list(collection.find({"claimed_by": token}))
+
+
+# Plafond du délai des reports : MAIL_RETRY_BACKOFF * 2^5
+_MAX_DEFERRAL_DOUBLINGS = 5
+
+
+class SMTPConnectionFailure(smtplib.SMTPException):
+    """Connexion, authentification ou session perdue : aucun message n'est en cause"""
+
+
+def _is_permanent(ex):
+    if isinstance(ex, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(ex, smtplib.SMTPResponseException) and ex.smtp_code >= 500
+
+
+def _send_chunk(entries):
+    """Envoyer des messages sur une seule connexion ; retourne [(entrée, erreur)]"""
+    outcomes = []
+    pending = deque(entries)
+    try:
+        with smtp_pool.connection() as server:
+            while pending:
+                entry = pending.popleft()
+                try:
+                    server.send_message(_message(entry))
+                    outcomes.append((entry, None))
+                except smtplib.SMTPRecipientsRefused as ex:
+                    # Refus avant DATA (smtplib envoie RSET) : la session reste utilisable
+                    outcomes.append((entry, ex))
+                except smtplib.SMTPResponseException as ex:
+                    # État de session incertain : l'exception traverse connection(),
+                    # qui ferme la connexion au lieu de la rendre au pool
+                    outcomes.append((entry, ex))
+                    raise
+    except (smtplib.SMTPException, OSError) as ex:
+        # Connexion refusée, authentification rejetée (535) ou session perdue :
+        # l'erreur ne concerne pas les messages restants, qui sont reportés
+        if pending:
+            logger.warning("⚠️ SMTP connection failed, %s message(s) deferred: %s", len(pending), ex)
+        failure = SMTPConnectionFailure(f"{type(ex).__name__}: {ex}")
+        outcomes.extend((entry, failure) for entry in pending)
+    return outcomes
+
+
+def _outcome_operation(entry, error):
+    selector = {"_id": entry["_id"], "claimed_by": entry["claimed_by"]}
+    if error is None:
+        _stats["sent"] += 1
+        return DeleteOne(selector)
+
+    if isinstance(error, SMTPConnectionFailure):
+        _stats["deferred"] += 1
+        deferrals = entry.get("deferrals", 0) + 1
+        delay = Config.MAIL_RETRY_BACKOFF * 2 ** min(deferrals - 1, _MAX_DEFERRAL_DOUBLINGS)
+        return UpdateOne(
+            selector,
+            {
+                "$set": {
+                    "available_at": datetime.utcnow() + timedelta(seconds=delay),
+                    "deferrals": deferrals,
+                    "last_error": str(error),
+                },
+                "$unset": {"claimed_by": ""},
+            },
+        )
+
+    attempts = entry.get("attempts", 0) + 1
+    if _is_permanent(error) or attempts >= Config.MAIL_MAX_ATTEMPTS:
+        _stats["failed"] += 1
+        logger.error("❌ Email %s failed permanently: %s", entry["_id"], error)
+        now = datetime.utcnow()
+        update = {
+            "status": "failed",
+            "failed_at": now,
+            "expires_at": now + timedelta(seconds=Config.MAIL_FAILED_RETENTION),
+        }
+        # Le corps contient des secrets (codes, jetons) : inutile au diagnostic
+        unset = {"claimed_by": "", "body": ""}
+    else:
+        _stats["retried"] += 1
+        delay = Config.MAIL_RETRY_BACKOFF * 2 ** (attempts - 1)
+        update = {"available_at": datetime.utcnow() + timedelta(seconds=delay)}
+        unset = {"claimed_by": ""}
+    return UpdateOne(
+        selector,
+        {
+            "$set": {**update, "attempts": attempts, "last_error": str(error)},
+            "$unset": unset,
+        },
+    )
+
+
+def dispatch_batch(limit=None):
+    """Envoyer un lot de messages ; retourne le nombre de messages traités"""
+    ensure_collection_indexes(MAIL_COLLECTION)
+    entries = _claim(limit or Config.MAIL_BATCH_SIZE)
+    if not entries:
+        return 0
+
+    # Un sous-lot par connexion du pool, envoyés en parallèle
+    connections = max(1, min(Config.MAIL_POOL_SIZE, len(entries)))
+    chunks = [entries[i::connections] for i in range(connections)]
+    if connections == 1:
+        outcomes = _send_chunk(chunks[0])
+    else:
+        with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="mail-send") as executor:
+            outcomes = [outcome for result in executor.map(_send_chunk, chunks) for outcome in result]
+
+    mongo_db[MAIL_COLLECTION].bulk_write(
+        [_outcome_operation(entry, error) for entry, error in outcomes], ordered=False
+    )
+    _stats["batches"] += 1
+    if any(error is None for _, error in outcomes):
+        _stats["last_sent"] = datetime.utcnow()
+    return len(entries)
+
+
+def drain():
+    """Vider la file des messages dus, lot par lot"""
+    while dispatch_batch():
+        pass
+
+
+def mail_metrics():
+    """Volume et retard de la file, compteurs du dispatcher local et du pool SMTP"""
+    collection = mongo_db[MAIL_COLLECTION]
+    oldest = next(
+        iter(
+            collection.find({"status": "pending"}, {"enqueued_at": 1})
+            .sort("enqueued_at", 1)
+            .limit(1)
+        ),
+        None,
+    )
+    now = datetime.utcnow()
+    return {
+        "pending": collection.count_documents({"status": "pending"}),
+        "retrying": collection.count_documents({"status": "pending", "attempts": {"$gt": 0}}),
+        "deferred": collection.count_documents({"status": "pending", "deferrals": {"$gt": 0}}),
+        "failed": collection.count_documents({"status": "failed"}),
+        "lag_seconds": (now - oldest["enqueued_at"]).total_seconds() if oldest else 0.0,
+        "dispatcher": {
+            **{key: value for key, value in _stats.items() if key != "last_sent"},
+            "last_sent": _stats["last_sent"].isoformat() if _stats["last_sent"] else None,
+        },
+        "smtp": smtp_pool.metrics,
+    }
+
+
+mail_dispatcher = PeriodicWorker("mail-dispatcher", drain, Config.MAIL_POLL_INTERVAL)
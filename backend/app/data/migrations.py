@@ -0,0 +1,176 @@
+"""
+Migrations du graphe Neo4j.
+
+Les nœuds Patient/Doctor ont été créés avec deux clés différentes :
+`SyncService` fusionnait sur `id` (l'_id du document patients/doctors) alors
+que `create_consultation` fusionne sur `mongo_id` (l'_id de l'utilisateur).
+La clé de référence est désormais `mongo_id`, protégée par une contrainte
+d'unicité ; `id` reste une simple propriété (index non unique).
+
+À exécuter avant la synchronisation par `mongo_id` : les anciennes
+contraintes d'unicité sur `id` rejetteraient le `SET n.id` du `SyncService`
+dès qu'un nœud historique en double existe. La migration les supprime en
+premier.
+"""
+import logging
+
+from bson import ObjectId
+
+from ..extensions import (
+    NEO4J_FALLBACK_INDEXES,
+    get_mongo_database,
+    get_neo4j_driver,
+    legacy_id_constraints,
+    setup_neo4j_constraints,
+)
+
+logger = logging.getLogger(__name__)
+
+# label Neo4j -> collection MongoDB du profil
+PROFILE_COLLECTIONS = {"Patient": "patients", "Doctor": "doctors"}
+
+# Types de relations à rattacher au nœud conservé lors d'une fusion
+RELATIONSHIP_TYPES = ["CONSULTED_BY", "CONSULTED_WITH"]
+
+
+def backfill_mongo_ids(label, batch_size=1000):
+    """Renseigner `mongo_id` sur les nœuds qui n'ont que `id`"""
+    collection = get_mongo_database()[PROFILE_COLLECTIONS[label]]
+    updated = 0
+    last_id = ""
+
+    with get_neo4j_driver().session() as session:
+        while True:
+            node_ids = [
+                record["id"]
+                for record in session.run(
+                    f"""
+                    MATCH (n:{label})
+                    WHERE n.mongo_id IS NULL AND n.id IS NOT NULL AND n.id > $last_id
+                    RETURN n.id AS id
+                    ORDER BY n.id
+                    LIMIT $limit
+                    """,
+                    last_id=last_id,
+                    limit=batch_size,
+                )
+            ]
+            if not node_ids:
+                break
+            last_id = node_ids[-1]
+
+            object_ids = [ObjectId(i) for i in node_ids if ObjectId.is_valid(i)]
+            user_ids = {
+                str(doc["_id"]): doc.get("user_id")
+                for doc in collection.find(
+                    {"_id": {"$in": object_ids}}, {"user_id": 1}
+                )
+            }
+            # Profils sans utilisateur (anciennes routes admin) : on garde `id`
+            rows = [
+                {"id": node_id, "mongo_id": str(user_ids.get(node_id) or node_id)}
+                for node_id in node_ids
+            ]
+            result = session.run(
+                f"""
+                UNWIND $rows AS row
+                MATCH (n:{label} {{id: row.id}})
+                WHERE n.mongo_id IS NULL
+                SET n.mongo_id = row.mongo_id
+                RETURN count(n) AS updated
+                """,
+                rows=rows,
+            )
+            updated += result.single()["updated"]
+
+    logger.info("%s: mongo_id renseigné sur %s nœud(s)", label, updated)
+    return updated
+
+
+def _merge_query(label):
+    """Requête fusionnant un lot de doublons `mongo_id` sur un seul nœud"""
+    moves = []
+    for rel_type in RELATIONSHIP_TYPES:
+        moves.append(
+            f"""
+            CALL {{
+                WITH keep, dup
+                MATCH (dup)-[r:{rel_type}]->(other)
+                CREATE (keep)-[nr:{rel_type}]->(other)
+                SET nr = properties(r)
+                DELETE r
+                RETURN count(r) AS moved_out_{rel_type.lower()}
+            }}
+            CALL {{
+                WITH keep, dup
+                MATCH (other)-[r:{rel_type}]->(dup)
+                CREATE (other)-[nr:{rel_type}]->(keep)
+                SET nr = properties(r)
+                DELETE r
+                RETURN count(r) AS moved_in_{rel_type.lower()}
+            }}"""
+        )
+
+    # On garde de préférence le nœud synchronisé (qui porte `id`)
+    return f"""
+    MATCH (n:{label})
+    WHERE n.mongo_id IS NOT NULL
+    WITH n ORDER BY n.id IS NULL, n.updated_at DESC
+    WITH n.mongo_id AS mongo_id, collect(n) AS nodes
+    WHERE size(nodes) > 1
+    WITH mongo_id, head(nodes) AS keep, tail(nodes) AS dups
+    LIMIT $limit
+    UNWIND dups AS dup
+    WITH keep, dup, properties(keep) AS keep_props, properties(dup) AS dup_props
+    {"".join(moves)}
+    DETACH DELETE dup
+    SET keep += dup_props
+    SET keep += keep_props
+    RETURN count(*) AS merged
+    """
+
+
+def dedup_nodes(label, batch_size=500):
+    """Fusionner les nœuds ayant le même `mongo_id` (créés par le MERGE des consultations)"""
+    query = _merge_query(label)
+    merged = 0
+
+    with get_neo4j_driver().session() as session:
+        while True:
+            batch = session.run(query, limit=batch_size).single()["merged"]
+            if not batch:
+                break
+            merged += batch
+
+    logger.info("%s: %s nœud(s) en double fusionné(s)", label, merged)
+    return merged
+
+
+def drop_legacy_id_constraints():
+    """Supprimer les contraintes d'unicité sur Doctor.id / Patient.id"""
+    with get_neo4j_driver().session() as session:
+        names = legacy_id_constraints(session)
+        for name in names:
+            session.run(f"DROP CONSTRAINT `{name}` IF EXISTS").consume()
+    if names:
+        logger.info("Contraintes sur `id` supprimées : %s", names)
+    return names
+
+
+def migrate_node_keys(batch_size=1000):
+    """Consolider les nœuds Patient/Doctor sur `mongo_id` puis créer les index"""
+    # `id` n'est plus une clé : le backfill et la fusion ne doivent pas s'y heurter
+    report = {"dropped_constraints": drop_legacy_id_constraints()}
+    for label in PROFILE_COLLECTIONS:
+        report[label] = {
+            "backfilled": backfill_mongo_ids(label, batch_size),
+            "merged": dedup_nodes(label, batch_size),
+        }
+
+    # Les contraintes d'unicité ne peuvent être créées qu'une fois les doublons
+    # fusionnés, et pas tant qu'un index de repli couvre la même propriété
+    with get_neo4j_driver().session() as session:
+        for index_name in NEO4J_FALLBACK_INDEXES:
+            session.run(f"DROP INDEX {index_name} IF EXISTS").consume()
+    report["constraints"] = setup_neo4j_constraints()
+    return report
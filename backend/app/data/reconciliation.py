@@ -0,0 +1,194 @@
+"""
+Contrôle de cohérence entre les profils MongoDB et les nœuds du graphe.
+
+Pour chaque label, les deux côtés sont lus en flux triés sur la clé du nœud
+(`mongo_id` = user_id du profil) puis comparés par fusion, comme une
+jointure triée : la mémoire reste bornée par la taille des lots, quel que
+soit le volume. Les écarts sont émis au fil de l'eau et, avec `fix=True`,
+corrigés par lots :
+
+- `missing_node` : profil sans nœud -> créé avec `SyncService` ;
+- `stale_node` : nom/email divergents -> mis à jour avec `SyncService` ;
+- `orphan_node` : nœud dont ni le profil ni l'utilisateur n'existe plus ->
+  supprimé avec ses relations ;
+- `profile_missing` : nœud d'un utilisateur existant sans profil -> signalé
+  seulement (ses consultations sont conservées) ;
+- `unkeyed_node` : nœud sans `mongo_id` -> `flask migrate-graph-keys`.
+
+Les clés sont des ObjectId hexadécimaux : l'ordre des chaînes est le même
+dans MongoDB et dans Neo4j.
+"""
+import logging
+
+from bson import ObjectId
+
+from ..extensions import get_mongo_database, get_neo4j_driver
+from .migrations import PROFILE_COLLECTIONS
+from .sync_service import SyncService
+
+logger = logging.getLogger(__name__)
+
+COMPARED_FIELDS = ["name", "email"]
+
+
+def _mongo_profiles(collection, batch_size):
+    """Profils triés par clé de nœud (user_id, ou _id pour les profils orphelins)"""
+    pipeline = [
+        {
+            "$project": {
+                "key": {"$ifNull": [{"$toString": "$user_id"}, {"$toString": "$_id"}]},
+                "user_id": 1,
+                "name": 1,
+                "email": 1,
+                "phone": 1,
+                "telephone": 1,
+                "speciality": 1,
+            }
+        },
+        {"$sort": {"key": 1}},
+    ]
+    return get_mongo_database()[collection].aggregate(
+        pipeline, allowDiskUse=True, batchSize=batch_size
+    )
+
+
+def _graph_nodes(label, batch_size):
+    """Nœuds triés par `mongo_id`, lus par pages (reprise sur la dernière clé)"""
+    after = ""
+    with get_neo4j_driver().session() as session:
+        while True:
+            rows = session.read_transaction(
+                lambda tx: [
+                    dict(record)
+                    for record in tx.run(
+                        f"""
+                        MATCH (n:{label})
+                        WHERE n.mongo_id > $after
+                        RETURN n.mongo_id AS key, n.name AS name, n.email AS email
+                        ORDER BY n.mongo_id
+                        LIMIT $limit
+                        """,
+                        after=after,
+                        limit=batch_size,
+                    )
+                ]
+            )
+            if not rows:
+                return
+            yield from rows
+            after = rows[-1]["key"]
+
+
+def _unkeyed_count(label):
+    with get_neo4j_driver().session() as session:
+        return session.run(
+            f"MATCH (n:{label}) WHERE n.mongo_id IS NULL RETURN count(n) AS count"
+        ).single()["count"]
+
+
+def diff_label(label, batch_size=1000):
+    """Émettre (type, clé, profil ou None, nœud ou None) pour chaque écart"""
+    profiles = _mongo_profiles(PROFILE_COLLECTIONS[label], batch_size)
+    nodes = _graph_nodes(label, batch_size)
+    profile = next(profiles, None)
+    node = next(nodes, None)
+
+    while profile is not None or node is not None:
+        if node is None or (profile is not None and profile["key"] < node["key"]):
+            yield "missing_node", profile["key"], profile, None
+            profile = next(profiles, None)
+        elif profile is None or node["key"] < profile["key"]:
+            yield "orphan_node", node["key"], None, node
+            node = next(nodes, None)
+        else:
+            if any(profile.get(field) != node.get(field) for field in COMPARED_FIELDS):
+                yield "stale_node", profile["key"], profile, node
+            profile = next(profiles, None)
+            node = next(nodes, None)
+
+
+class _Fixer:
+    """Accumule les corrections et les applique par lots"""
+
+    def __init__(self, label, batch_size, fix):
+        self.label = label
+        self.batch_size = batch_size
+        self.fix = fix
+        self.service = SyncService(batch_size=batch_size)
+        self.to_sync = []
+        self.orphan_candidates = []
+        self.report = {
+            "missing_node": 0,
+            "stale_node": 0,
+            "orphan_node": 0,
+            "profile_missing": 0,
+            "fixed": 0,
+        }
+
+    def add(self, kind, key, profile):
+        if kind == "orphan_node":
+            self.orphan_candidates.append(key)
+            if len(self.orphan_candidates) >= self.batch_size:
+                self.flush_orphans()
+            return
+        self.report[kind] += 1
+        if self.fix:
+            profile = dict(profile)
+            profile.pop("key", None)
+            self.to_sync.append(profile)
+            if len(self.to_sync) >= self.batch_size:
+                self.flush_sync()
+
+    def flush_sync(self):
+        if self.to_sync:
+            sync = (
+                self.service.sync_patients if self.label == "Patient" else self.service.sync_doctors
+            )
+            self.report["fixed"] += sync(self.to_sync)["rows"]
+            self.to_sync = []
+
+    def flush_orphans(self):
+        """Séparer les vrais orphelins (utilisateur supprimé) des profils manquants"""
+        if not self.orphan_candidates:
+            return []
+        object_ids = [ObjectId(k) for k in self.orphan_candidates if ObjectId.is_valid(k)]
+        live_users = {
+            str(user["_id"])
+            for user in get_mongo_database().users.find({"_id": {"$in": object_ids}}, {"_id": 1})
+        }
+        orphans = [k for k in self.orphan_candidates if k not in live_users]
+        self.report["orphan_node"] += len(orphans)
+        self.report["profile_missing"] += len(self.orphan_candidates) - len(orphans)
+        if self.fix and orphans:
+            self.report["fixed"] += self.service.delete_users(orphans)["rows"]
+        self.orphan_candidates = []
+        return orphans
+
+    def flush(self):
+        self.flush_sync()
+        self.flush_orphans()
+
+
+def reconcile_label(label, fix=False, batch_size=1000, on_discrepancy=None):
+    """Comparer un label et, avec `fix`, corriger les écarts ; retourne un rapport.
+
+    `on_discrepancy(type, clé)` est appelé pour chaque écart détecté (les
+    nœuds orphelins sont signalés avant la vérification des utilisateurs).
+    """
+    fixer = _Fixer(label, batch_size, fix)
+    for kind, key, profile, _node in diff_label(label, batch_size):
+        if on_discrepancy:
+            on_discrepancy(kind, key)
+        fixer.add(kind, key, profile)
+    fixer.flush()
+    fixer.report["unkeyed_node"] = _unkeyed_count(label)
+    logger.info("%s: %s", label, fixer.report)
+    return fixer.report
+
+
+def reconcile_graph(fix=False, batch_size=1000, on_discrepancy=None):
+    """Rapport de cohérence pour tous les labels Patient/Doctor"""
+    return {
+        label: reconcile_label(label, fix, batch_size, on_discrepancy)
+        for label in PROFILE_COLLECTIONS
+    }
@@ -0,0 +1,277 @@
+"""
+Index de recherche des utilisateurs, patients et docteurs.
+
+Une collection dédiée (`search_index`) contient un document par entité avec
+des champs normalisés (minuscules, accents retirés) :
+
+    {"_id": "patient:<id>", "entity": "patient", "entity_id": "<id>",
+     "terms": ["dupont", "marie", "marie.dupont@x.fr", "ab123456", "0612345678"],
+     "trigrams": [" du", "dup", ...], "display": {...}}
+
+- recherche par préfixe : `terms` commence par chaque mot de la requête
+  (regex ancrée, servie par l'index {entity, terms}) ;
+- recherche approchée : trigrammes communs (index {entity, trigrams}),
+  seulement si les préfixes ne remplissent pas la page demandée, et sur au
+  plus SEARCH_FUZZY_SCAN_LIMIT entrées ;
+- classement en mémoire sur un nombre borné de candidats : correspondances
+  par préfixe d'abord (terme exact, puis préfixe), puis similarité de
+  trigrammes.
+
+Si `SEARCH_ATLAS_INDEX` est configuré, la requête passe par Atlas Search
+(`$search` texte flou sur le champ `text`) au lieu du repli local.
+
+L'index est tenu à jour par l'outbox de synchronisation (profils), par la
+création et la mise à jour d'utilisateur (`User.save`), par le démon de
+change streams (toutes écritures) et reconstruit avec
+`flask rebuild-search-index`.
+"""
+import re
+import unicodedata
+from datetime import datetime
+
+from pymongo import DeleteMany, ReplaceOne
+
+from ..config import Config
+from ..extensions import mongo_db
+from .indexes import ensure_collection_indexes
+
+SEARCH_COLLECTION = "search_index"
+
+ENTITY_COLLECTIONS = {"user": "users", "patient": "patients", "doctor": "doctors"}
+
+# Champs affichés dans les résultats, par entité
+DISPLAY_FIELDS = {
+    "user": ["email", "role", "name", "first_name", "last_name"],
+    "patient": ["user_id", "name", "nom", "email", "cin", "telephone", "phone"],
+    "doctor": ["user_id", "name", "email", "speciality", "phone"],
+}
+
+_NAME_FIELDS = ["name", "nom", "first_name", "last_name"]
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+def normalize(text):
+    """Minuscules sans accents"""
+    text = unicodedata.normalize("NFKD", str(text))
+    return "".join(c for c in text if not unicodedata.combining(c)).lower().strip()
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_SPLIT.split(normalize(text)) if token]
+
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _terms(document):
+    terms = set()
+    for field in _NAME_FIELDS:
+        if document.get(field):
+            terms.update(tokenize(document[field]))
+    email = document.get("email")
+    if email:
+        terms.add(normalize(email))
+        terms.update(tokenize(email.split("@")[0]))
+    if document.get("cin"):
+        terms.add("".join(tokenize(document["cin"])))
+    for field in ("phone", "telephone"):
+        digits = re.sub(r"\D", "", str(document.get(field) or ""))
+        if digits:
+            terms.add(digits)
+    return sorted(terms)
+
+
+def _display(entity, document):
+    display = {field: document.get(field) for field in DISPLAY_FIELDS[entity] if field in document}
+    if entity == "user" and "name" not in display:
+        display["name"] = " ".join(
+            part for part in (document.get("first_name"), document.get("last_name")) if part
+        )
+    return display
+
+
+def index_entry(entity, document):
+    """Document d'index pour une entité MongoDB"""
+    terms = _terms(document)
+    entry_trigrams = set()
+    for term in terms:
+        if not term.isdigit():
+            entry_trigrams |= trigrams(term)
+    return {
+        "_id": f"{entity}:{document['_id']}",
+        "entity": entity,
+        "entity_id": str(document["_id"]),
+        "user_id": str(document["_id"] if entity == "user" else document.get("user_id") or ""),
+        "terms": terms,
+        "trigrams": sorted(entry_trigrams),
+        "text": " ".join(terms),
+        "display": _display(entity, document),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def ensure_search_indexes():
+    ensure_collection_indexes(SEARCH_COLLECTION)
+
+
+def index_documents(entity, documents):
+    """Indexer (ou réindexer) un lot de documents d'une entité"""
+    operations = [
+        ReplaceOne({"_id": entry["_id"]}, entry, upsert=True)
+        for entry in (index_entry(entity, document) for document in documents)
+    ]
+    if operations:
+        mongo_db[SEARCH_COLLECTION].bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def remove_documents(entity, ids):
+    ids = [f"{entity}:{i}" for i in ids]
+    if ids:
+        mongo_db[SEARCH_COLLECTION].bulk_write([DeleteMany({"_id": {"$in": ids}})])
+
+
+def remove_user(user_id):
+    """Retirer un utilisateur et ses profils de l'index"""
+    mongo_db[SEARCH_COLLECTION].delete_many({"user_id": str(user_id)})
+
+
+def rebuild_search_index(batch_size=1000):
+    """Réindexer toutes les entités ; retourne le nombre de documents par entité"""
+    ensure_search_indexes()
+    report = {}
+    for entity, collection in ENTITY_COLLECTIONS.items():
+        started = datetime.utcnow()
+        count, batch = 0, []
+        for document in mongo_db[collection].find({}, batch_size=batch_size):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                count += index_documents(entity, batch)
+                batch = []
+        count += index_documents(entity, batch)
+        # Entrées d'entités supprimées depuis
+        mongo_db[SEARCH_COLLECTION].delete_many(
+            {"entity": entity, "updated_at": {"$lt": started}}
+        )
+        report[entity] = count
+    return report
+
+
+def _score(query_tokens, terms):
+    """Score d'un candidat : 3 par mot exact, 2 par préfixe, sinon similarité"""
+    score = 0.0
+    for token in query_tokens:
+        if token in terms:
+            score += 3
+        elif any(term.startswith(token) for term in terms):
+            score += 2
+        else:
+            token_trigrams = trigrams(token)
+            score += max(
+                (
+                    len(token_trigrams & trigrams(term)) / len(token_trigrams | trigrams(term))
+                    for term in terms
+                ),
+                default=0.0,
+            )
+    return score / len(query_tokens)
+
+
+def _result(entry, score):
+    return {
+        "_id": entry["entity_id"],
+        "entity": entry["entity"],
+        **entry["display"],
+        "score": round(score, 3),
+    }
+
+
+def _search_atlas(text, entities, page, per_page):
+    pipeline = [
+        {
+            "$search": {
+                "index": Config.SEARCH_ATLAS_INDEX,
+                "text": {"query": text, "path": "text", "fuzzy": {"maxEdits": 1, "prefixLength": 1}},
+            }
+        },
+        {"$match": {"entity": {"$in": entities}}},
+        {"$skip": (page - 1) * per_page},
+        {"$limit": per_page},
+        {"$project": {"entity": 1, "entity_id": 1, "display": 1, "score": {"$meta": "searchScore"}}},
+    ]
+    results = [
+        _result(entry, entry["score"]) for entry in mongo_db[SEARCH_COLLECTION].aggregate(pipeline)
+    ]
+    return {"results": results, "total": None, "page": page, "per_page": per_page}
+
+
+def search(text, entities=None, page=1, per_page=20, fuzzy=True):
+    """Rechercher `text` ; résultats classés et paginés.
+
+    `total` compte les candidats retenus (au plus SEARCH_MAX_CANDIDATES). Si
+    les préfixes remplissent déjà la page, l'étape approchée n'est pas
+    exécutée et `total` ne compte que les correspondances par préfixe.
+    """
+    entities = entities or list(ENTITY_COLLECTIONS)
+    query_tokens = tokenize(text)
+    if not query_tokens:
+        return {"results": [], "total": 0, "page": page, "per_page": per_page}
+    if Config.SEARCH_ATLAS_INDEX:
+        return _search_atlas(" ".join(query_tokens), entities, page, per_page)
+
+    ensure_search_indexes()
+    collection = mongo_db[SEARCH_COLLECTION]
+    limit = Config.SEARCH_MAX_CANDIDATES
+    projection = {"entity": 1, "entity_id": 1, "terms": 1, "display": 1}
+    entity_filter = {"entity": {"$in": entities}}
+
+    # Préfixes : chaque mot de la requête doit préfixer un terme du document
+    prefix_filter = dict(entity_filter)
+    prefix_filter["$and"] = [
+        {"terms": {"$regex": f"^{re.escape(token)}"}} for token in query_tokens
+    ]
+    candidates = {entry["_id"]: entry for entry in collection.find(prefix_filter, projection).limit(limit)}
+    prefix_ids = set(candidates)
+
+    # Trigrammes (fautes de frappe, mots incomplets au milieu), seulement si
+    # les préfixes ne remplissent pas la page demandée
+    if fuzzy and len(candidates) < min(page * per_page, limit):
+        query_trigrams = sorted(set().union(*(trigrams(token) for token in query_tokens)))
+        min_overlap = max(1, int(len(query_trigrams) * Config.SEARCH_MIN_TRIGRAM_OVERLAP))
+        fuzzy_filter = {**entity_filter, "trigrams": {"$in": query_trigrams}}
+        if prefix_ids:
+            fuzzy_filter["_id"] = {"$nin": sorted(prefix_ids)}
+        pipeline = [
+            {"$match": fuzzy_filter},
+            # Borne le travail avant de calculer les intersections
+            {"$limit": Config.SEARCH_FUZZY_SCAN_LIMIT},
+            {
+                "$project": {
+                    **projection,
+                    "overlap": {"$size": {"$setIntersection": ["$trigrams", query_trigrams]}},
+                }
+            },
+            {"$match": {"overlap": {"$gte": min_overlap}}},
+            {"$sort": {"overlap": -1}},
+            {"$limit": limit - len(candidates)},
+        ]
+        for entry in collection.aggregate(pipeline):
+            candidates.setdefault(entry["_id"], entry)
+
+    # Les préfixes restent devant : l'ordre ne change pas d'une page à l'autre
+    ranked = sorted(
+        ((_score(query_tokens, set(entry["terms"])), entry) for entry in candidates.values()),
+        key=lambda item: (
+            item[1]["_id"] not in prefix_ids,
+            -item[0],
+            item[1]["display"].get("name") or "",
+        ),
+    )
+    start = (page - 1) * per_page
+    return {
+        "results": [_result(entry, score) for score, entry in ranked[start:start + per_page]],
+        "total": len(ranked),
+        "page": page,
+        "per_page": per_page,
+    }
@@ -0,0 +1,240 @@
+"""
+File d'attente (outbox) de synchronisation MongoDB -> Neo4j.
+
+Les routes enregistrent l'entité modifiée dans `sync_outbox` juste après
+leur écriture MongoDB et répondent sans attendre Neo4j. Un document par
+entité (`_id` = "<entité>:<id>") : les mises à jour successives d'un même
+profil sont fusionnées (dernier état gagnant, `version` incrémentée).
+
+Le worker de fond réserve des lots, relit l'état courant des profils (une
+requête `$in` par entité), met à jour l'index de recherche, les pousse avec les API par lot de `SyncService`,
+puis supprime chaque entrée seulement si sa `version` n'a pas changé
+entre-temps. Livraison au moins une fois : un lot peut être rejoué
+après une panne, les écritures Neo4j sont des MERGE idempotents.
+
+Un échec remet l'entrée en file après SYNC_RETRY_BACKOFF * 2^tentatives
+secondes. Après SYNC_MAX_ATTEMPTS échecs (entité inconnue, contrainte
+violée...), l'entrée est déplacée dans `sync_outbox_failed` et journalisée
+en erreur : elle ne gonfle plus `retrying` ni `lag_seconds`. Une nouvelle
+modification de l'entité crée une nouvelle entrée dans l'outbox.
+"""
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+
+from ..config import Config
+from ..extensions import mongo_db
+from ..utils.background import PeriodicWorker
+from .enrichment import fetch_by_ids
+from .indexes import ensure_collection_indexes
+from .search_index import index_documents
+from .sync_service import SyncService
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_COLLECTION = "sync_outbox"
+DEAD_LETTER_COLLECTION = "sync_outbox_failed"
+
+# Entités relues dans leur collection avant l'envoi (les routes de mise à
+# jour n'enregistrent parfois qu'une partie du document)
+PROFILE_COLLECTIONS = {"patient": "patients", "doctor": "doctors"}
+
+_sync_service = SyncService()
+_stats = {"delivered": 0, "failed_batches": 0, "dead_lettered": 0, "last_delivery": None}
+
+
+def _sync_functions():
+    return {
+        "patient": _sync_service.sync_patients,
+        "doctor": _sync_service.sync_doctors,
+        "consultation": _sync_service.sync_consultations,
+    }
+
+
+def enqueue(entity, document):
+    """Enregistrer le dernier état d'une entité à synchroniser"""
+    now = datetime.utcnow()
+    mongo_db[OUTBOX_COLLECTION].update_one(
+        {"_id": f"{entity}:{document['_id']}"},
+        {
+            "$set": {"entity": entity, "payload": document, "updated_at": now},
+            "$inc": {"version": 1},
+            "$setOnInsert": {"enqueued_at": now, "attempts": 0},
+        },
+        upsert=True,
+    )
+    outbox_worker.ensure_started()
+    outbox_worker.wake()
+
+
+def enqueue_patient(patient_data):
+    enqueue("patient", patient_data)
+
+
+def enqueue_doctor(doctor_data):
+    enqueue("doctor", doctor_data)
+
+
+def enqueue_consultation(consultation_data):
+    enqueue("consultation", consultation_data)
+
+
+def _claim(limit):
+    """Réserver jusqu'à `limit` entrées disponibles pour ce worker"""
+    collection = mongo_db[OUTBOX_COLLECTION]
+    now = datetime.utcnow()
+    available = {"$or": [{"available_at": {"$exists": False}}, {"available_at": {"$lte": now}}]}
+    ids = [
+        doc["_id"]
+        for doc in collection.find(available, {"_id": 1}).sort("enqueued_at", 1).limit(limit)
+    ]
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    collection.update_many(
+        {"_id": {"$in": ids}, **available},
+        {
+            "$set": {
+                "claimed_by": token,
+                "available_at": now + timedelta(seconds=Config.SYNC_OUTBOX_CLAIM_TIMEOUT),
+            }
+        },
+    )
+    return list(collection.find({"claimed_by": token}))
+
+
+def _current_documents(entity, group):
+    collection = PROFILE_COLLECTIONS.get(entity)
+    if collection is None:
+        return [entry["payload"] for entry in group]
+    # Un profil supprimé entre-temps n'est plus synchronisé
+    return list(
+        fetch_by_ids(collection, (entry["payload"]["_id"] for entry in group), field="_id").values()
+    )
+
+
+def process_batch(limit=None):
+    """Pousser un lot vers Neo4j ; retourne le nombre d'entrées traitées"""
+    ensure_collection_indexes(OUTBOX_COLLECTION)
+    entries = _claim(limit or Config.SYNC_BATCH_SIZE)
+    if not entries:
+        return 0
+
+    collection = mongo_db[OUTBOX_COLLECTION]
+    by_entity = {}
+    for entry in entries:
+        by_entity.setdefault(entry["entity"], []).append(entry)
+
+    for entity, group in by_entity.items():
+        sync = _sync_functions().get(entity)
+        try:
+            if sync is None:
+                raise ValueError(f"Entité inconnue: {entity}")
+            documents = _current_documents(entity, group)
+            if entity in PROFILE_COLLECTIONS:
+                index_documents(entity, documents)
+            sync(documents)
+        except Exception as ex:
+            _stats["failed_batches"] += 1
+            logger.error("❌ Outbox sync failed for %s %s(s): %s", len(group), entity, ex)
+            _record_failure(group, ex)
+            continue
+
+        # Supprimer ce qui a été livré ; une entrée modifiée pendant l'envoi
+        # (version différente) est libérée pour le prochain lot
+        operations = []
+        for entry in group:
+            operations.append(DeleteOne({"_id": entry["_id"], "version": entry["version"]}))
+            operations.append(
+                UpdateOne(
+                    {"_id": entry["_id"], "claimed_by": entry["claimed_by"]},
+                    {"$unset": {"claimed_by": "", "available_at": ""}},
+                )
+            )
+        collection.bulk_write(operations, ordered=True)
+        _stats["delivered"] += len(group)
+        _stats["last_delivery"] = datetime.utcnow()
+
+    return len(entries)
+
+
+def _record_failure(group, error):
+    """Reprogrammer les entrées d'un lot en échec, ou les écarter après SYNC_MAX_ATTEMPTS"""
+    collection = mongo_db[OUTBOX_COLLECTION]
+    now = datetime.utcnow()
+    retries, dead = [], []
+    for entry in group:
+        attempts = entry.get("attempts", 0) + 1
+        if attempts < Config.SYNC_MAX_ATTEMPTS:
+            delay = min(Config.SYNC_RETRY_BACKOFF * 2 ** (attempts - 1), Config.SYNC_OUTBOX_CLAIM_TIMEOUT)
+            retries.append(
+                UpdateOne(
+                    {"_id": entry["_id"], "claimed_by": entry["claimed_by"]},
+                    {
+                        "$set": {"available_at": now + timedelta(seconds=delay), "last_error": str(error)},
+                        "$inc": {"attempts": 1},
+                        "$unset": {"claimed_by": ""},
+                    },
+                )
+            )
+            continue
+
+        logger.error(
+            "❌ Outbox entry %s dead-lettered after %s attempts: %s", entry["_id"], attempts, error
+        )
+        failed = {key: value for key, value in entry.items() if key not in ("claimed_by", "available_at")}
+        dead.append(ReplaceOne(
+            {"_id": entry["_id"]},
+            {**failed, "attempts": attempts, "last_error": str(error), "failed_at": now},
+            upsert=True,
+        ))
+        # Retirée seulement si elle n'a pas changé ; sinon le nouvel état
+        # repart de zéro
+        retries.append(DeleteOne({"_id": entry["_id"], "version": entry["version"]}))
+        retries.append(
+            UpdateOne(
+                {"_id": entry["_id"], "claimed_by": entry["claimed_by"]},
+                {"$set": {"attempts": 0}, "$unset": {"claimed_by": "", "available_at": "", "last_error": ""}},
+            )
+        )
+
+    if dead:
+        mongo_db[DEAD_LETTER_COLLECTION].bulk_write(dead, ordered=False)
+        _stats["dead_lettered"] += len(dead)
+    collection.bulk_write(retries, ordered=True)
+
+
+def drain():
+    """Vider l'outbox lot par lot"""
+    while process_batch():
+        pass
+
+
+def outbox_metrics():
+    """Retard et volume de la file, plus les compteurs du worker local"""
+    collection = mongo_db[OUTBOX_COLLECTION]
+    oldest = next(
+        iter(collection.find({}, {"enqueued_at": 1}).sort("enqueued_at", 1).limit(1)), None
+    )
+    now = datetime.utcnow()
+    return {
+        "pending": collection.count_documents({}),
+        "retrying": collection.count_documents({"attempts": {"$gt": 0}}),
+        "dead_lettered": mongo_db[DEAD_LETTER_COLLECTION].count_documents({}),
+        "lag_seconds": (now - oldest["enqueued_at"]).total_seconds() if oldest else 0.0,
+        "worker": {
+            "delivered": _stats["delivered"],
+            "failed_batches": _stats["failed_batches"],
+            "dead_lettered": _stats["dead_lettered"],
+            "last_delivery": _stats["last_delivery"].isoformat()
+            if _stats["last_delivery"]
+            else None,
+        },
+        "neo4j": _sync_service.metrics,
+    }
+
+
+outbox_worker = PeriodicWorker("sync-outbox", drain, Config.SYNC_OUTBOX_POLL_INTERVAL)
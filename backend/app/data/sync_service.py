@@ -1,96 +1,259 @@
-from pymongo import MongoClient
-from neo4j import GraphDatabase
+import logging
+import threading
+import time
+from itertools import islice
+
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+
 from ..config import Config
+from ..extensions import get_mongo_client, get_neo4j_driver
+
+logger = logging.getLogger(__name__)
+
+# Erreurs après lesquelles un lot peut être rejoué tel quel
+RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
 
 
 class SyncService:
-    def __init__(self):
-        self.mongo_client = MongoClient(Config.MONGODB_URI)
-        self.neo4j_driver = GraphDatabase.driver(
-            Config.NEO4J_URI, auth=(Config.NEO4J_USER, Config.NEO4J_PASSWORD)
+    """Synchronisation MongoDB -> Neo4j via les pools partagés du registre.
+
+    Les API par lot (`sync_patients`, `sync_doctors`, `sync_consultations`)
+    écrivent `batch_size` lignes par transaction avec `UNWIND $rows` ; les
+    méthodes unitaires sont des lots d'une ligne. Un lot interrompu par une
+    erreur transitoire est rejoué (les requêtes sont des MERGE idempotents).
+
+    Une seule couche de reprise : chaque lot est une transaction explicite,
+    que le pilote ne rejoue pas (contrairement à `write_transaction`), et
+    `_write_batch` la rejoue au plus `max_retries` fois dans la limite de
+    `retry_max_time` secondes. Le lot reste ainsi dans le bail de l'outbox
+    (SYNC_OUTBOX_CLAIM_TIMEOUT) : aucun autre worker ne le réserve pendant
+    qu'il est encore en cours d'écriture.
+    """
+
+    def __init__(self, batch_size=None, max_retries=None, retry_backoff=None, retry_max_time=None):
+        self.batch_size = batch_size or Config.SYNC_BATCH_SIZE
+        self.max_retries = Config.SYNC_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_backoff = (
+            Config.SYNC_RETRY_BACKOFF if retry_backoff is None else retry_backoff
         )
+        self.retry_max_time = (
+            Config.SYNC_RETRY_MAX_TIME if retry_max_time is None else retry_max_time
+        )
+        self._metrics_lock = threading.Lock()
+        self._metrics = {"rows": 0, "batches": 0, "retries": 0, "failures": 0, "seconds": 0.0}
 
-    def sync_patient(self, patient_data):
-        """Synchronize patient data between MongoDB and Neo4j"""
+    @property
+    def mongo_client(self):
+        return get_mongo_client()
 
-        # Prepare data for Neo4j
-        neo4j_data = patient_data.copy()
-        neo4j_data["id"] = str(patient_data["_id"])  # Convert MongoDB _id to Neo4j id
+    @property
+    def neo4j_driver(self):
+        return get_neo4j_driver()
 
-        # Neo4j operation
+    @property
+    def metrics(self):
+        """Compteurs cumulés depuis la création du service"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics["rows_per_second"] = (
+            round(metrics["rows"] / metrics["seconds"], 1) if metrics["seconds"] else 0.0
+        )
+        return metrics
 
-        with self.neo4j_driver.session() as session:
-            session.write_transaction(self._create_or_update_patient_node, neo4j_data)
+    def sync_patient(self, patient_data):
+        """Synchronize patient data between MongoDB and Neo4j"""
+        self.sync_patients([patient_data])
 
     def sync_doctor(self, doctor_data):
         """Synchronize doctor data between MongoDB and Neo4j"""
+        self.sync_doctors([doctor_data])
 
-        # Prepare data for Neo4j
-        neo4j_data = doctor_data.copy()
-        neo4j_data["id"] = str(doctor_data["_id"])  # Convert MongoDB _id to Neo4j id
+    def sync_consultation(self, consultation_data):
+        """Synchronize consultation data and create relationships in Neo4j"""
+        self.sync_consultations([consultation_data])
 
-        # Neo4j operation
+    def sync_patients(self, patients):
+        """Synchroniser un itérable de profils patients, par lots"""
+        return self._write_batches(
+            self._upsert_patients, (self._patient_row(p) for p in patients)
+        )
 
-        with self.neo4j_driver.session() as session:
-            session.write_transaction(self._create_or_update_doctor_node, neo4j_data)
+    def sync_doctors(self, doctors):
+        """Synchroniser un itérable de profils docteurs, par lots"""
+        return self._write_batches(
+            self._upsert_doctors, (self._doctor_row(d) for d in doctors)
+        )
 
-    def sync_consultation(self, consultation_data):
-        """Synchronize consultation data and create relationships in Neo4j"""
-        # Prepare data for Neo4j
-        neo4j_data = consultation_data.copy()
-        neo4j_data["id"] = str(
-            consultation_data["_id"]
-        )  # Convert MongoDB _id to Neo4j id
-        if "patient_id" in consultation_data:
-            neo4j_data["patient_id"] = str(consultation_data["patient_id"])
-        if "doctor_id" in consultation_data:
-            neo4j_data["doctor_id"] = str(consultation_data["doctor_id"])
-
-        # Neo4j operation
+    def sync_consultations(self, consultations):
+        """Synchroniser un itérable de consultations, par lots"""
+        return self._write_batches(
+            self._merge_consultations, (self._consultation_row(c) for c in consultations)
+        )
+
+    def delete_patients(self, profile_ids):
+        """Retirer du graphe les patients dont le profil a été supprimé"""
+        return self._write_batches(self._delete_by_profile_id("Patient"), map(str, profile_ids))
+
+    def delete_doctors(self, profile_ids):
+        """Retirer du graphe les docteurs dont le profil a été supprimé"""
+        return self._write_batches(self._delete_by_profile_id("Doctor"), map(str, profile_ids))
+
+    def delete_users(self, user_ids):
+        """Retirer du graphe les nœuds des utilisateurs supprimés"""
+        return self._write_batches(self._delete_by_user_id, map(str, user_ids))
+
+    def _write_batches(self, work, rows):
+        """Écrire `rows` par tranches de `batch_size`, une transaction par tranche"""
+        report = {"rows": 0, "batches": 0, "retries": 0, "seconds": 0.0}
+        started = time.perf_counter()
         with self.neo4j_driver.session() as session:
-            session.write_transaction(
-                self._create_consultation_relationship, neo4j_data
-            )
+            for batch in _chunks(rows, self.batch_size):
+                report["retries"] += self._write_batch(session, work, batch)
+                report["rows"] += len(batch)
+                report["batches"] += 1
+        report["seconds"] = time.perf_counter() - started
+        report["rows_per_second"] = (
+            round(report["rows"] / report["seconds"], 1) if report["seconds"] else 0.0
+        )
+
+        with self._metrics_lock:
+            for key in ("rows", "batches", "retries", "seconds"):
+                self._metrics[key] += report[key]
+        return report
+
+    def _write_batch(self, session, work, batch):
+        retries = 0
+        deadline = time.monotonic() + self.retry_max_time
+        while True:
+            try:
+                with session.begin_transaction() as tx:
+                    work(tx, batch)
+                    tx.commit()
+                return retries
+            except RETRYABLE_ERRORS as ex:
+                delay = self.retry_backoff * 2 ** retries
+                if retries >= self.max_retries or time.monotonic() + delay > deadline:
+                    with self._metrics_lock:
+                        self._metrics["failures"] += 1
+                    raise
+                retries += 1
+                logger.warning(
+                    "⚠️ Neo4j sync batch failed (%s), retry %s/%s in %.1fs",
+                    ex.__class__.__name__,
+                    retries,
+                    self.max_retries,
+                    delay,
+                )
+                time.sleep(delay)
+
+    @classmethod
+    def _patient_row(cls, patient_data):
+        row = cls._node_params(patient_data)
+        row["phone"] = patient_data.get("phone", patient_data.get("telephone"))
+        return row
+
+    @classmethod
+    def _doctor_row(cls, doctor_data):
+        row = cls._node_params(doctor_data)
+        row["speciality"] = doctor_data.get("speciality")
+        return row
 
     @staticmethod
-    def _create_or_update_patient_node(tx, patient_data):
+    def _consultation_row(consultation_data):
+        row = consultation_data.copy()
+        row["id"] = str(consultation_data["_id"])  # Convert MongoDB _id to Neo4j id
+        for field in ("patient_id", "doctor_id"):
+            if field in consultation_data:
+                row[field] = str(consultation_data[field])
+        return row
+
+    @staticmethod
+    def _node_params(profile_data):
+        """Paramètres communs d'un nœud Patient/Doctor.
+
+        Les nœuds sont identifiés par `mongo_id` (l'_id de l'utilisateur, comme
+        dans les routes de consultation) ; `id` garde l'_id du document profil.
+        Les profils créés sans utilisateur retombent sur leur propre _id.
+        """
+        profile_id = str(profile_data["_id"])
+        return {
+            "id": profile_id,
+            "mongo_id": str(profile_data.get("user_id") or profile_id),
+            "name": profile_data.get("name"),
+            "email": profile_data.get("email"),
+        }
+
+    @staticmethod
+    def _upsert_patients(tx, rows):
         query = """
-        MERGE (p:Patient {id: $id})
-        SET p.name = $name,
-            p.email = $email,
-            p.phone = $phone,
+        UNWIND $rows AS row
+        MERGE (p:Patient {mongo_id: row.mongo_id})
+        SET p.id = row.id,
+            p.name = row.name,
+            p.email = row.email,
+            p.phone = row.phone,
             p.updated_at = datetime()
-        RETURN p
         """
-        return tx.run(query, **patient_data)
+        tx.run(query, rows=rows).consume()
 
     @staticmethod
-    def _create_or_update_doctor_node(tx, doctor_data):
+    def _upsert_doctors(tx, rows):
         query = """
-        MERGE (d:Doctor {id: $id})
-        SET d.name = $name,
-            d.email = $email,
-            d.speciality = $speciality,
+        UNWIND $rows AS row
+        MERGE (d:Doctor {mongo_id: row.mongo_id})
+        SET d.id = row.id,
+            d.name = row.name,
+            d.email = row.email,
+            d.speciality = row.speciality,
             d.updated_at = datetime()
-        RETURN d
         """
-        return tx.run(query, **doctor_data)
+        tx.run(query, rows=rows).consume()
 
     @staticmethod
-    def _create_consultation_relationship(tx, consultation_data):
+    def _merge_consultations(tx, rows):
         query = """
-        MATCH (p:Patient {id: $patient_id})
-        MATCH (d:Doctor {id: $doctor_id})
+        UNWIND $rows AS row
+        MATCH (p:Patient {id: row.patient_id})
+        MATCH (d:Doctor {id: row.doctor_id})
         MERGE (p)-[c:CONSULTED_WITH]->(d)
-        SET c.date = $date,
-            c.diagnosis = $diagnosis,
+        SET c.date = row.date,
+            c.diagnosis = row.diagnosis,
             c.updated_at = datetime()
-        RETURN c
         """
-        return tx.run(query, **consultation_data)
+        tx.run(query, rows=rows).consume()
 
-    def close(self):
-        """Close all database connections"""
-        self.mongo_client.close()
+    @staticmethod
+    def _delete_by_profile_id(label):
+        def work(tx, ids):
+            tx.run(
+                f"""
+                UNWIND $ids AS id
+                MATCH (n:{label} {{id: id}})
+                DETACH DELETE n
+                """,
+                ids=ids,
+            ).consume()
+
+        return work
 
-        self.neo4j_driver.close()
+    @staticmethod
+    def _delete_by_user_id(tx, user_ids):
+        query = """
+        UNWIND $ids AS mongo_id
+        OPTIONAL MATCH (p:Patient {mongo_id: mongo_id})
+        OPTIONAL MATCH (d:Doctor {mongo_id: mongo_id})
+        DETACH DELETE p, d
+        """
+        tx.run(query, ids=user_ids).consume()
+
+    def close(self):
+        """Connections belong to the shared registry; nothing to close here"""
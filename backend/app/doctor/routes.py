@@ -1,82 +1,92 @@
-from functools import wraps
+import logging
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from pymongo import MongoClient
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from datetime import datetime, date
-from neo4j import GraphDatabase
-from werkzeug.security import generate_password_hash
-from ..config import Config
-from ..data.sync_service import SyncService
+from ..auth.passwords import PasswordServiceBusy, hash_password
+from ..extensions import mongo_db, neo4j_driver
+from ..auth.authorization import (
+    admin_required,
+    doctor_required,
+    get_cached_user,
+    get_current_doctor,
+    invalidate_profile,
+)
+from ..data.consultation_stats import record_status_changed
+from ..data.cypher import MATCH_CONSULTATION_BY_ID
+from ..data.enrichment import PATIENT_SUMMARY_FIELDS, enrich_records
+from ..data.search_index import remove_user as remove_from_search
+from ..data.listings import (
+    iter_users_with_profiles,
+    list_users_with_profiles,
+    pagination_info,
+    parse_listing_args,
+    streamed_totals,
+)
+from ..data.sync_outbox import enqueue_doctor, enqueue_consultation
 from ..models.user import User
+from ..utils.streaming import list_response, streaming_format
 
 doctor_bp = Blueprint('doctor', __name__)
-mongo_client = MongoClient(Config.MONGODB_URI)
-db = mongo_client.cabinet_medical
-neo4j_driver = GraphDatabase.driver(
-    Config.NEO4J_URI, auth=(Config.NEO4J_USER, Config.NEO4J_PASSWORD)
-)
-sync_service = SyncService()
-
-def doctor_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        current_user_id = ObjectId(current_user_id)
-        user = db.users.find_one({'_id': current_user_id})
-        if not user or user['role'] != 'doctor':
-            return jsonify({'error': 'Doctor access required'}), 403
-        return f(*args, **kwargs)
-    return decorated_function
-
-def admin_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        claims = get_jwt()
-        if claims.get("role") != "admin":
-            return jsonify({"error": "Accès réservé aux administrateurs"}), 403
-        return f(*args, **kwargs)
-    return decorated_function
+logger = logging.getLogger(__name__)
+db = mongo_db
 
 # ======================== GESTION DES DOCTEURS (ADMIN SEULEMENT) ========================
 
+DOCTOR_LISTING_FIELDS = ['name', 'phone', 'speciality', 'schedule']
+
+
+def _doctor_info(user, doctor_data):
+    doctor_info = {
+        'user_id': str(user['_id']),
+        'email': user['email'],
+        'first_name': user['first_name'],
+        'last_name': user['last_name'],
+        'created_at': user['created_at'].isoformat() if user.get('created_at') else None,
+        'last_login': user['last_login'].isoformat() if user.get('last_login') else None
+    }
+
+    if doctor_data:
+        doctor_info.update({
+            'doctor_id': str(doctor_data['_id']),
+            'name': doctor_data['name'],
+            'phone': doctor_data['phone'],
+            'speciality': doctor_data['speciality'],
+            'schedule': doctor_data.get('schedule', {})
+        })
+    return doctor_info
+
+
 @doctor_bp.route('/doctors', methods=['GET'])
 @jwt_required()
 @admin_required
 def get_all_doctors():
     """Récupérer tous les docteurs (Admin seulement)"""
     try:
-        # Récupérer tous les utilisateurs avec le rôle doctor
-        users = list(db.users.find({'role': 'doctor'}))
-        doctors_list = []
-        
-        for user in users:
-            # Récupérer les données supplémentaires du docteur
-            doctor_data = db.doctors.find_one({'user_id': str(user['_id'])})
-            
-            doctor_info = {
-                'user_id': str(user['_id']),
-                'email': user['email'],
-                'first_name': user['first_name'],
-                'last_name': user['last_name'],
-                'created_at': user['created_at'].isoformat() if user['created_at'] else None,
-                'last_login': user['last_login'].isoformat() if user.get('last_login') else None
-            }
-            
-            if doctor_data:
-                doctor_info.update({
-                    'doctor_id': str(doctor_data['_id']),
-                    'name': doctor_data['name'],
-                    'phone': doctor_data['phone'],
-                    'speciality': doctor_data['speciality'],
-                    'schedule': doctor_data.get('schedule', {})
-                })
-            
-            doctors_list.append(doctor_info)
+        try:
+            listing = parse_listing_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if streaming_format():
+            # Diffusion au fil du curseur (?stream=1 ou Accept: application/x-ndjson)
+            rows = iter_users_with_profiles('doctor', 'doctors', DOCTOR_LISTING_FIELDS, **listing)
+            return list_response(
+                (_doctor_info(user, doctor_data) for user, doctor_data in rows),
+                key='doctors',
+                extra=streamed_totals('doctor', listing)
+            )
+
+        # Une page : deux allers-retours ; sans pagination : curseur + profils par tranches
+        total, rows = list_users_with_profiles(
+            'doctor', 'doctors', DOCTOR_LISTING_FIELDS, **listing
+        )
+        doctors_list = [_doctor_info(user, doctor_data) for user, doctor_data in rows]
         
         return jsonify({
             'doctors': doctors_list,
-            'total': len(doctors_list)
+            'total': total,
+            **pagination_info(total, listing['page'], listing['per_page'])
         }), 200
         
     except Exception as e:
@@ -117,8 +127,8 @@ def create_doctor():
         result = db.doctors.insert_one(doctor_data)
         doctor_data["_id"] = str(result.inserted_id)
         
-        # Synchroniser avec Neo4j
-        sync_service.sync_doctor(doctor_data)
+        # Synchroniser avec Neo4j (en arrière-plan)
+        enqueue_doctor(doctor_data)
         
         return jsonify({
             "message": "Docteur créé avec succès",
@@ -127,6 +137,8 @@ def create_doctor():
         
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
+    except PasswordServiceBusy:
+        raise
     except Exception as e:
         return jsonify({"error": "Une erreur est survenue lors de la création du docteur"}), 500
 
@@ -181,13 +193,14 @@ def update_doctor(user_id):
         if 'email' in data:
             user_updates['email'] = data['email'].lower()
         if 'password' in data:
-            user.password_hash = generate_password_hash(data['password'])
+            user.password_hash = hash_password(data['password'])
         
         # Appliquer les mises à jour de l'utilisateur
         for key, value in user_updates.items():
             setattr(user, key, value)
         
         user.save()
+        invalidate_profile(user_id)
         
         # Mettre à jour les données du docteur
         doctor_updates = {}
@@ -210,18 +223,21 @@ def update_doctor(user_id):
                 {'user_id': user_id},
                 {'$set': doctor_updates}
             )
+            invalidate_profile(user_id)
             
             # Récupérer les données mises à jour pour la synchronisation
             updated_doctor = db.doctors.find_one({'user_id': user_id})
             if updated_doctor:
                 updated_doctor['_id'] = str(updated_doctor['_id'])
-                sync_service.sync_doctor(updated_doctor)
-        print(updated_doctor)
+                enqueue_doctor(updated_doctor)
+        logger.debug("Docteur mis à jour: %s", updated_doctor)
         return jsonify({
             "message": "Docteur mis à jour avec succès",
             "user": updated_doctor
         }), 200
         
+    except PasswordServiceBusy:
+        raise
     except Exception as e:
         return jsonify({"error": "Une erreur est survenue lors de la mise à jour du docteur"}), 500
 
@@ -241,99 +257,32 @@ def delete_doctor(user_id):
         if not doctor_data:
             return jsonify({"error": "Données du docteur non trouvées"}), 404
         
-        # Préparer les IDs pour Neo4j
-        doctor_neo4j_id = str(doctor_data['_id'])  # Pour les nœuds avec propriété "id"
-        doctor_mongo_id = user_id  # Pour les nœuds avec propriété "mongo_id"
-        
-        print(f"Suppression Neo4j - ID principal: {doctor_neo4j_id}, Mongo ID: {doctor_mongo_id}")
-        
+        # Les nœuds Doctor sont identifiés par mongo_id (contrainte d'unicité)
+        doctor_mongo_id = user_id
+
+        logger.debug("Suppression Neo4j - Mongo ID: %s", doctor_mongo_id)
+
         # Supprimer de Neo4j EN PREMIER
         try:
             with neo4j_driver.session() as session:
-                # Vérifier et supprimer les nœuds Doctor avec propriété "id"
-                check_result_id = session.run("""
-                    MATCH (d:Doctor {id: $doctor_id})
-                    RETURN d.id as found_id, d.name as name
-                """, doctor_id=doctor_neo4j_id)
-                
-                found_record_id = check_result_id.single()
-                if found_record_id:
-                    print(f"Nœud trouvé avec 'id': {found_record_id['found_id']} - {found_record_id['name']}")
-                
-                # Vérifier et supprimer les nœuds Doctor avec propriété "mongo_id"
-                check_result_mongo = session.run("""
-                    MATCH (d:Doctor {mongo_id: $mongo_id})
-                    RETURN d.mongo_id as found_mongo_id, count(d) as count
-                """, mongo_id=doctor_mongo_id)
-                
-                found_record_mongo = check_result_mongo.single()
-                if found_record_mongo and found_record_mongo['count'] > 0:
-                    print(f"Nœud(s) trouvé(s) avec 'mongo_id': {found_record_mongo['found_mongo_id']} (count: {found_record_mongo['count']})")
-                
-                # Supprimer TOUS les nœuds Doctor liés à ce docteur
-                # 1. Supprimer les nœuds avec propriété "id"
-                delete_result_id = session.run("""
-                    MATCH (d:Doctor {id: $doctor_id})
-                    DETACH DELETE d
-                    RETURN count(d) as deleted_count
-                """, doctor_id=doctor_neo4j_id)
-                
-                # 2. Supprimer les nœuds avec propriété "mongo_id"
-                delete_result_mongo = session.run("""
+                delete_result = session.run("""
                     MATCH (d:Doctor {mongo_id: $mongo_id})
                     DETACH DELETE d
                     RETURN count(d) as deleted_count
                 """, mongo_id=doctor_mongo_id)
-                
-                deleted_count_id = delete_result_id.single()['deleted_count'] if delete_result_id.single() else 0
-                deleted_count_mongo = delete_result_mongo.single()['deleted_count'] if delete_result_mongo.single() else 0
-                
-                total_deleted = deleted_count_id + deleted_count_mongo
-                
-                print(f"Nœuds Doctor supprimés - avec 'id': {deleted_count_id}, avec 'mongo_id': {deleted_count_mongo}")
-                print(f"Total supprimé: {total_deleted}")
-                
-                # Vérification finale - s'assurer qu'aucun nœud Doctor n'existe encore
-                final_check = session.run("""
-                    MATCH (d:Doctor)
-                    WHERE d.id = $doctor_id OR d.mongo_id = $mongo_id
-                    RETURN count(d) as remaining_count
-                """, doctor_id=doctor_neo4j_id, mongo_id=doctor_mongo_id)
-                
-                remaining_count = final_check.single()['remaining_count'] if final_check.single() else 0
-                
-                if remaining_count > 0:
-                    print(f"ATTENTION: Il reste {remaining_count} nœud(s) Doctor non supprimé(s)!")
-                    # Optionnel: lister les nœuds restants pour debug
-                    remaining_nodes = session.run("""
-                        MATCH (d:Doctor)
-                        WHERE d.id = $doctor_id OR d.mongo_id = $mongo_id
-                        RETURN d.id, d.mongo_id, d.name
-                    """, doctor_id=doctor_neo4j_id, mongo_id=doctor_mongo_id)
-                    
-                    for node in remaining_nodes:
-                        print(f"Nœud restant: {dict(node)}")
-                    
-                    return jsonify({"error": "Échec de la suppression complète dans Neo4j"}), 500
-                else:
-                    print("✅ Suppression Neo4j réussie - aucun nœud Doctor restant")
-                
+
+                deleted_count = delete_result.single()['deleted_count']
+                logger.debug("Nœuds Doctor supprimés: %s", deleted_count)
+
         except Exception as neo4j_error:
-            print(f"Erreur Neo4j lors de la suppression: {neo4j_error}")
+            logger.error("Erreur Neo4j lors de la suppression: %s", neo4j_error)
             return jsonify({"error": f"Erreur lors de la suppression dans Neo4j: {str(neo4j_error)}"}), 500
         
         # Supprimer de MongoDB seulement après Neo4j
         db.doctors.delete_one({'user_id': user_id})
         db.users.delete_one({'_id': user._id})
-        
-        return jsonify({"message": "Docteur supprimé avec succès"}), 200
-        
-    except Exception as e:
-        return jsonify({"error": f"Une erreur est survenue lors de la suppression du docteur: {str(e)}"}), 500
-        
-        # Supprimer de MongoDB seulement après Neo4j
-        db.doctors.delete_one({'user_id': user_id})
-        db.users.delete_one({'_id': user._id})
+        invalidate_profile(user_id)
+        remove_from_search(user_id)
         
         return jsonify({"message": "Docteur supprimé avec succès"}), 200
         
@@ -349,12 +298,12 @@ def get_doctor_profile():
     """Récupérer le profil du docteur connecté"""
     try:
         current_user_id = get_jwt_identity()
-        user = User.get_by_id(current_user_id)
-        doctor_data = db.doctors.find_one({'user_id': current_user_id})
+        user = get_cached_user(current_user_id)
+        doctor_data = get_current_doctor()
         
         response_data = {
-            'last_login': user.last_login,
-            'created_at': user.created_at
+            'last_login': user.get('last_login'),
+            'created_at': user.get('created_at')
         }
         
         if doctor_data:
@@ -389,13 +338,14 @@ def update_doctor_profile():
         
         # Mettre à jour le mot de passe si fourni
         if 'password' in data:
-            user.password_hash = generate_password_hash(data['password'])
+            user.password_hash = hash_password(data['password'])
         
         # Appliquer les mises à jour de l'utilisateur
         for key, value in user_updates.items():
             setattr(user, key, value)
         
         user.save()
+        invalidate_profile(current_user_id)
         
         # Mettre à jour les données du docteur
         doctor_updates = {}
@@ -417,18 +367,21 @@ def update_doctor_profile():
                 {'user_id': current_user_id},
                 {'$set': doctor_updates}
             )
+            invalidate_profile(current_user_id)
             
             # Récupérer les données mises à jour du docteur pour la synchronisation Neo4j
-            updated_doctor = db.doctors.find_one({'user_id': current_user_id})
+            updated_doctor = get_current_doctor()
             if updated_doctor:
                 updated_doctor['_id'] = str(updated_doctor['_id'])
-                sync_service.sync_doctor(updated_doctor)
+                enqueue_doctor(updated_doctor)
         
         return jsonify({
             "message": "Profil mis à jour avec succès",
             "user": user.to_json()
         }), 200
         
+    except PasswordServiceBusy:
+        raise
     except Exception as e:
         return jsonify({'error': f'Erreur lors de la mise à jour du profil: {str(e)}'}), 500
 
@@ -441,17 +394,16 @@ def get_consultation_history():
     """Récupérer l'historique de toutes les consultations du docteur via Neo4j"""
     try:
         current_user_id = get_jwt_identity()
-        doctor = db.doctors.find_one({'user_id': current_user_id})
+        doctor = get_current_doctor()
         if not doctor:
             return jsonify({'error': 'Docteur non trouvé'}), 404
         
         doctor_mongo_id = str(doctor['user_id'])
-        print(f"Recherche des consultations pour le docteur mongo_id: {doctor_mongo_id}")
+        logger.debug("Recherche des consultations pour le docteur mongo_id: %s", doctor_mongo_id)
         
         with neo4j_driver.session() as session:
             result = session.run("""
-                    MATCH (p:Patient)-[r:CONSULTED_BY]->(d:Doctor)
-                    WHERE d.mongo_id = $doctor_mongo_id
+                    MATCH (p:Patient)-[r:CONSULTED_BY]->(d:Doctor {mongo_id: $doctor_mongo_id})
                     RETURN p.mongo_id as patient_mongo_id,
                         r.consultation_id as consultation_id,
                         r.date as date,
@@ -466,19 +418,10 @@ def get_consultation_history():
             
             consultations_history = []
             
-            # Itérer sur les enregistrements du résultat
-            for record in result:
-                print(f"Traitement de l'enregistre±ment: {dict(record)}")
-                
-                # Récupérer les informations du patient depuis MongoDB
-                patient_mongo_id = record['patient_mongo_id']
-                try:
-                    patient = db.patients.find_one({'user_id': patient_mongo_id})
-                    print(f"Patient trouvé: {patient['name'] if patient else 'Non trouvé'}")
-                except Exception as patient_error:
-                    print(f"Erreur lors de la recherche du patient {patient_mongo_id}: {patient_error}")
-                    patient = None
-                
+            # Patients résolus en une seule requête MongoDB
+            for record, patient in enrich_records(
+                result, 'patient_mongo_id', 'patients', fields=PATIENT_SUMMARY_FIELDS
+            ):
                 if patient:
                     consultation_data = {
                         'consultation_id': record['consultation_id'],
@@ -500,9 +443,9 @@ def get_consultation_history():
                     }
                     consultations_history.append(consultation_data)
                 else:
-                    print(f"Patient avec ID {patient_mongo_id} non trouvé dans MongoDB")
+                    logger.warning("Patient avec ID %s non trouvé dans MongoDB", record['patient_mongo_id'])
             
-            print(f"Nombre total de consultations trouvées: {len(consultations_history)}")
+            logger.debug("Nombre total de consultations trouvées: %s", len(consultations_history))
             
             return jsonify({
                 'consultations': consultations_history,
@@ -510,7 +453,7 @@ def get_consultation_history():
             }), 200
             
     except Exception as e:
-        print(f"Erreur dans get_consultation_history: {str(e)}")
+        logger.exception("Erreur dans get_consultation_history: %s", e)
         return jsonify({'error': f'Erreur lors de la récupération de l\'historique: {str(e)}'}), 500
 
 @doctor_bp.route('/consultations/<consultation_id>/status', methods=['PUT'])
@@ -531,23 +474,22 @@ def update_consultation_status(consultation_id):
             return jsonify({'error': f'Statut invalide. Statuts valides: {valid_statuses}'}), 400
         
         current_user_id = get_jwt_identity()
-        doctor = db.doctors.find_one({'user_id': current_user_id})
+        doctor = get_current_doctor()
         
         if not doctor:
-            print("doctuer non trouvé : " , current_user_id)
+            logger.warning("Docteur non trouvé: %s", current_user_id)
             return jsonify({'error': 'Docteur non trouvé'}), 404
         
         # Utiliser l'_id du document doctor car le SyncService utilise "id" dans Neo4j
         doctor_neo4j_id = str(doctor['user_id'])
-        print("noe4j doctor id" , doctor_neo4j_id)
         # Mettre à jour le statut dans Neo4j
         with neo4j_driver.session() as session:
-            result = session.run("""
-                MATCH (p:Patient)-[r:CONSULTED_BY]->(d:Doctor)
-                WHERE r.consultation_id = $consultation_id 
+            result = session.run(MATCH_CONSULTATION_BY_ID + """
                 AND d.mongo_id = $doctor_id
+                WITH p, r, r.status as previous_status
                 SET r.status = $status, r.updated_at = datetime()
-                RETURN r.status as updated_status, r.consultation_id as consultation_id
+                RETURN r.status as updated_status, r.consultation_id as consultation_id,
+                       previous_status, p.mongo_id as patient_id, r.date as date
             """, 
             consultation_id=consultation_id,
             doctor_id=doctor_neo4j_id,
@@ -556,6 +498,10 @@ def update_consultation_status(consultation_id):
             record = result.single()
             if not record:
                 return jsonify({'error': 'Consultation non trouvée ou accès non autorisé'}), 404
+
+            record_status_changed(record['patient_id'], doctor_neo4j_id,
+                                  record['previous_status'], record['updated_status'],
+                                  record['date'])
             
             return jsonify({
                 'message': 'Statut de la consultation mis à jour avec succès',
@@ -573,7 +519,7 @@ def get_upcoming_consultations():
     """Récupérer les consultations à venir avec statut 'pending' uniquement"""
     try:
         current_user_id = get_jwt_identity()
-        doctor = db.doctors.find_one({'user_id': current_user_id})
+        doctor = get_current_doctor()
         
         if not doctor:
             return jsonify({'error': 'Docteur non trouvé'}), 404
@@ -585,9 +531,8 @@ def get_upcoming_consultations():
         # Requête Neo4j pour les consultations à venir avec statut 'pending' uniquement
         with neo4j_driver.session() as session:
             result = session.run("""
-                MATCH (p:Patient)-[r:CONSULTED_BY]->(d:Doctor)
-                WHERE d.mongo_id = $doctor_id
-                AND datetime(r.date) >= datetime($today)
+                MATCH (p:Patient)-[r:CONSULTED_BY]->(d:Doctor {mongo_id: $doctor_id})
+                WHERE datetime(r.date) >= datetime($today)
                 AND NOT r.status IN ['cancelled', 'completed']
                 RETURN p.mongo_id as patient_mongo_id, 
                        r.consultation_id as consultation_id,
@@ -605,10 +550,10 @@ def get_upcoming_consultations():
             
             upcoming_consultations = []
             
-            for record in result:
-                # Récupérer les informations du patient depuis MongoDB
-                patient = db.patients.find_one({'user_id': record['patient_mongo_id']})
-                
+            # Patients résolus en une seule requête MongoDB
+            for record, patient in enrich_records(
+                result, 'patient_mongo_id', 'patients', fields=PATIENT_SUMMARY_FIELDS
+            ):
                 if patient:
                     consultation_data = {
                         'consultation_id': record['consultation_id'],
@@ -643,7 +588,7 @@ def get_upcoming_consultations():
 def update_consultation(consultation_id):
     data = request.get_json()
     current_user_id = get_jwt_identity()
-    doctor = db.doctors.find_one({'user_id': current_user_id})
+    doctor = get_current_doctor()
     
     if not doctor:
         return jsonify({'error': 'Docteur non trouvé'}), 404
@@ -666,7 +611,7 @@ def update_consultation(consultation_id):
     
     consultation_data['_id'] = consultation_id
     consultation_data['doctor_id'] = str(doctor['_id'])
-    sync_service.sync_consultation(consultation_data)
+    enqueue_consultation(consultation_data)
     
     return jsonify(consultation_data), 200
 
@@ -675,42 +620,38 @@ def update_consultation(consultation_id):
 @doctor_required
 def get_patient_history(patient_id):
     try:
-        print("patient_id", patient_id)
         current_user_id = get_jwt_identity()
-        print("l id du docteur" , current_user_id)
+        logger.debug("Historique du patient %s pour le docteur %s", patient_id, current_user_id)
         # Convertir en ObjectId pour la recherche MongoDB
         try:
-            doctor = db.doctors.find_one({'user_id': current_user_id})
+            doctor = get_current_doctor()
         except Exception as e:
-            print(f"Erreur lors de la recherche du docteur: {e}")
+            logger.warning("Erreur lors de la recherche du docteur: %s", e)
             return jsonify({'error': 'Format d\'ID docteur invalide'}), 400
         
         # Chercher le patient par _id
         try:
             patient = db.patients.find_one({'_id': ObjectId(patient_id)})
         except Exception as e:
-            print(f"Erreur lors de la recherche du patient: {e}")
+            logger.warning("Erreur lors de la recherche du patient: %s", e)
             return jsonify({'error': 'Format d\'ID patient invalide'}), 400
         
         if not doctor:
-            print(f"Docteur non trouvé avec l'ID: {current_user_id}")
+            logger.warning("Docteur non trouvé avec l'ID: %s", current_user_id)
             return jsonify({'error': 'Docteur non trouvé'}), 404
         if not patient:
-            print(f"Patient non trouvé avec l'ID: {patient_id}")
+            logger.warning("Patient non trouvé avec l'ID: %s", patient_id)
             return jsonify({'error': 'Patient non trouvé'}), 404
         
         doctor_neo4j_id = str(doctor['user_id'])
         patient_user_id = str(patient['user_id'])  # Utiliser le user_id du patient
         
-        print("Doctor Neo4j ID:", doctor_neo4j_id)
-        print("Patient user_id for Neo4j:", patient_user_id)
+        logger.debug("Neo4j: docteur %s, patient %s", doctor_neo4j_id, patient_user_id)
         
         # Requête Neo4j pour l'historique d'un patient spécifique
         with neo4j_driver.session() as session:
             result = session.run("""
-                MATCH (p:Patient)-[r:CONSULTED_BY]->(d:Doctor)
-                WHERE d.mongo_id = $doctor_id
-                AND p.mongo_id = $patient_user_id
+                MATCH (p:Patient {mongo_id: $patient_user_id})-[r:CONSULTED_BY]->(d:Doctor {mongo_id: $doctor_id})
                 RETURN r.consultation_id as consultation_id,
                        r.date as date,
                        r.motif as motif,
@@ -3,112 +3,381 @@ from flask_jwt_extended import JWTManager
 from pymongo import MongoClient
 from neo4j import GraphDatabase
 from flask import current_app, g
+import atexit
 import logging
+import os
+import threading
 from pymongo.errors import ConnectionFailure
 from neo4j.exceptions import ServiceUnavailable
 from urllib.parse import quote_plus
+from .config import Config
+from .utils.db_instrumentation import instrument_driver, mongo_command_timer
+from .utils.pool_monitor import mongo_pool_monitor, neo4j_sessions
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Handlers and levels are installed by logging_config.configure_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize extensions
 cors = CORS()
 jwt = JWTManager()
-mongo_client = None
-neo4j_driver = None
+
+# Connection registry: exactly one Mongo pool and one Neo4j pool per process.
+# Handles are created lazily and re-created after a fork (gunicorn prefork).
+_registry_lock = threading.RLock()
+_registry_pid = None
+_mongo_client = None
+_neo4j_driver = None
+_registry_settings = {}
+# Number of pools created by this process; stays at 1 unless a pool is lost
+_pool_generations = {"mongodb": 0, "neo4j": 0}
+
+MONGODB_DATABASE = "cabinet_medical"
+
+
+def configure_connections(app):
+    """Record pool settings from the app config for the connection registry"""
+    with _registry_lock:
+        _registry_settings.update(
+            {
+                "MONGODB_URI": app.config["MONGODB_URI"],
+                "MONGODB_POOL_OPTIONS": app.config.get(
+                    "MONGODB_POOL_OPTIONS", Config.MONGODB_POOL_OPTIONS
+                ),
+                "NEO4J_URI": app.config["NEO4J_URI"],
+                "NEO4J_USER": app.config["NEO4J_USER"],
+                "NEO4J_PASSWORD": app.config["NEO4J_PASSWORD"],
+                "NEO4J_OPTIONS": app.config.get("NEO4J_OPTIONS", {}),
+                "NEO4J_MIN_IDLE_CONNECTIONS": app.config.get(
+                    "NEO4J_MIN_IDLE_CONNECTIONS", Config.NEO4J_MIN_IDLE_CONNECTIONS
+                ),
+            }
+        )
+
+
+def _setting(name):
+    return _registry_settings.get(name, getattr(Config, name))
+
+
+def _check_pid():
+    """Drop inherited handles when running in a forked child process"""
+    global _registry_pid, _mongo_client, _neo4j_driver
+    pid = os.getpid()
+    if _registry_pid != pid:
+        # Pools inherited from the parent share sockets and monitor threads
+        # that do not survive fork(): forget them, never close them here.
+        _mongo_client = None
+        _neo4j_driver = None
+        _registry_pid = pid
+        _pool_generations.update({"mongodb": 0, "neo4j": 0})
+        mongo_pool_monitor.reset()
+        neo4j_sessions.reset()
+
+
+def _reset_after_fork():
+    global _registry_lock
+    _registry_lock = threading.RLock()
+    _check_pid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_mongo_client():
+    """Get the process-wide MongoDB client (created on first use)"""
+    global _mongo_client
+    with _registry_lock:
+        _check_pid()
+        if _mongo_client is None:
+            _mongo_client = MongoClient(
+                _setting("MONGODB_URI"),
+                connect=False,
+                event_listeners=[mongo_pool_monitor, mongo_command_timer],
+                **_setting("MONGODB_POOL_OPTIONS"),
+            )
+            _pool_generations["mongodb"] += 1
+        return _mongo_client
+
+
+def get_mongo_database():
+    """Get the cabinet_medical database from the shared MongoDB client"""
+    return get_mongo_client()[MONGODB_DATABASE]
+
+
+def get_neo4j_driver():
+    """Get the process-wide Neo4j driver (created on first use)"""
+    global _neo4j_driver
+    with _registry_lock:
+        _check_pid()
+        if _neo4j_driver is None:
+            # Sessions and transactions time every Cypher query they run
+            _neo4j_driver = instrument_driver(
+                GraphDatabase.driver(
+                    _setting("NEO4J_URI"),
+                    auth=(_setting("NEO4J_USER"), _setting("NEO4J_PASSWORD")),
+                    **_setting("NEO4J_OPTIONS"),
+                )
+            )
+            _pool_generations["neo4j"] += 1
+        return _neo4j_driver
+
+
+def get_pool_generations():
+    """How many times each pool was created in this process"""
+    return dict(_pool_generations)
+
+
+def get_pool_limits():
+    """Configured maximum size of each pool"""
+    return {
+        "mongodb": _setting("MONGODB_POOL_OPTIONS").get("maxPoolSize", 100),
+        "neo4j": _setting("NEO4J_OPTIONS").get("max_connection_pool_size", 100),
+    }
+
+
+def get_neo4j_session():
+    """Borrow a Neo4j session from the shared pool for the current request.
+
+    The session is closed (its connection returned to the pool) by
+    `close_extensions` at app context teardown; the driver itself stays open.
+    """
+    if "neo4j_session" not in g:
+        g.neo4j_session = get_neo4j_driver().session()
+        neo4j_sessions.acquired()
+    return g.neo4j_session
+
+
+def shutdown_connections():
+    """Close the process-wide pools; runs once at interpreter exit"""
+    global _mongo_client, _neo4j_driver
+    with _registry_lock:
+        if _registry_pid != os.getpid():
+            return
+        if _neo4j_driver is not None:
+            try:
+                _neo4j_driver.close()
+                logger.info("Neo4j connection pool closed")
+            except Exception as ex:
+                logger.error("Error closing Neo4j connection pool: %s", ex)
+            _neo4j_driver = None
+        if _mongo_client is not None:
+            try:
+                _mongo_client.close()
+                logger.info("MongoDB connection pool closed")
+            except Exception as ex:
+                logger.error("Error closing MongoDB connection pool: %s", ex)
+            _mongo_client = None
+
+
+atexit.register(shutdown_connections)
+
+
+class _RegistryHandle:
+    """Proxy that resolves the registry handle on every access.
+
+    Blueprints bind these at import time; resolving lazily keeps them valid
+    across forks and before the registry has been configured.
+    """
+
+    def __init__(self, resolver):
+        self._resolver = resolver
+
+    def __getattr__(self, name):
+        return getattr(self._resolver(), name)
+
+    def __getitem__(self, name):
+        return self._resolver()[name]
+
+
+mongo_client = _RegistryHandle(get_mongo_client)
+mongo_db = _RegistryHandle(get_mongo_database)
+neo4j_driver = _RegistryHandle(get_neo4j_driver)
 
 
 def get_db():
     """Get MongoDB database instance"""
     if "db" not in g:
-        g.db = mongo_client["cabinet_medical"]
+        g.db = get_mongo_database()
     return g.db
 
 
+def warmup_neo4j_pool(min_idle):
+    """Open `min_idle` connections up front so first requests skip the handshake"""
+    driver = get_neo4j_driver()
+    sessions, transactions = [], []
+    try:
+        # Each open transaction pins its own connection from the pool
+        for _ in range(min_idle):
+            session = driver.session()
+            sessions.append(session)
+            tx = session.begin_transaction()
+            tx.run("RETURN 1").consume()
+            transactions.append(tx)
+    finally:
+        for tx in transactions:
+            tx.close()
+        for session in sessions:
+            session.close()
+
+
 def init_mongodb(app):
     """Initialize MongoDB connection"""
-    global mongo_client
     try:
-        # Get MongoDB URI from app config
-        uri = app.config["MONGODB_URI"]
-
         logger.info("Connecting to MongoDB Atlas...")
-        mongo_client = MongoClient(uri)
+        client = get_mongo_client()
 
-        # Simple connection test
-        mongo_client.admin.command("ping")
+        # Simple connection test (also starts the minPoolSize warmup)
+        client.admin.command("ping")
         logger.info("✅ Successfully connected to MongoDB Atlas")
         return True
 
     except ConnectionFailure as e:
-        logger.error(f"❌ Failed to connect to MongoDB Atlas: {e}")
+        logger.error("❌ Failed to connect to MongoDB Atlas: %s", e)
         return False
     except Exception as e:
-        logger.error(f"❌ Unexpected error connecting to MongoDB: {e}")
+        logger.error("❌ Unexpected error connecting to MongoDB: %s", e)
         return False
 
 
 def init_neo4j(app):
     """Initialize Neo4j connection with retry logic"""
-    global neo4j_driver
     try:
-        # Get Neo4j configuration from app config
-        NEO4J_URI = app.config["NEO4J_URI"]
-        NEO4J_USER = app.config["NEO4J_USER"]
-        NEO4J_PASSWORD = app.config["NEO4J_PASSWORD"]
-
-        logger.info(f"Connecting to Neo4j: {NEO4J_URI}")
-
-        neo4j_driver = GraphDatabase.driver(
-            NEO4J_URI,
-            auth=(NEO4J_USER, NEO4J_PASSWORD),
-            **app.config.get("NEO4J_OPTIONS", {}),
-        )
+        logger.info("Connecting to Neo4j: %s", app.config['NEO4J_URI'])
+        driver = get_neo4j_driver()
 
         # Verify connection
-        with neo4j_driver.session() as session:
+        with driver.session() as session:
             result = session.run("RETURN 1 as test")
             test_value = result.single()["test"]
-            logger.info(f"✅ Neo4j connection successful: {test_value}")
+            logger.info("✅ Neo4j connection successful: %s", test_value)
+
+        min_idle = _setting("NEO4J_MIN_IDLE_CONNECTIONS")
+        if min_idle > 1:
+            warmup_neo4j_pool(min_idle)
+            logger.info("✅ Neo4j pool warmed up with %s connections", min_idle)
         return True
     except ServiceUnavailable as e:
-        logger.error(f"❌ Failed to connect to Neo4j AuraDB: {e}")
+        logger.error("❌ Failed to connect to Neo4j AuraDB: %s", e)
         return False
     except Exception as e:
-        logger.error(f"❌ Unexpected error connecting to Neo4j: {e}")
+        logger.error("❌ Unexpected error connecting to Neo4j: %s", e)
         return False
 
 
+# Unique constraints on `id` from before nodes were keyed on `mongo_id`:
+# SyncService MERGEs on mongo_id then SETs id, which these would reject on
+# any legacy duplicate. `flask migrate-graph-keys` drops them.
+NEO4J_LEGACY_ID_LABELS = ("Doctor", "Patient")
+
+
+def legacy_id_constraints(session):
+    """Names of the legacy unique constraints on Doctor.id / Patient.id"""
+    return [
+        record["name"]
+        for record in session.run("SHOW CONSTRAINTS YIELD name, labelsOrTypes, properties")
+        if (record["labelsOrTypes"] or [None])[0] in NEO4J_LEGACY_ID_LABELS
+        and record["properties"] == ["id"]
+    ]
+
+
+# Plain indexes standing in for the key constraints until duplicates are merged
+NEO4J_FALLBACK_INDEXES = [
+    "doctor_mongo_id_index",
+    "patient_mongo_id_index",
+    "consulted_by_consultation_id_index",
+]
+
+
 def setup_neo4j_constraints():
     """Setup Neo4j constraints with error handling"""
     try:
-        with neo4j_driver.session() as session:
+        with get_neo4j_driver().session() as session:
             # Unique constraints for core entities
             constraints = [
-                "CREATE CONSTRAINT IF NOT EXISTS FOR (d:Doctor) REQUIRE d.id IS UNIQUE",
-                "CREATE CONSTRAINT IF NOT EXISTS FOR (p:Patient) REQUIRE p.id IS UNIQUE",
                 "CREATE CONSTRAINT IF NOT EXISTS FOR (c:Consultation) REQUIRE c.id IS UNIQUE",
                 "CREATE CONSTRAINT IF NOT EXISTS FOR (a:Appointment) REQUIRE a.id IS UNIQUE",
-                # Indexes for better performance
+                # Indexes for better performance (Doctor/Patient.id is the profile _id, not a key)
+                "CREATE INDEX doctor_id_index IF NOT EXISTS FOR (d:Doctor) ON (d.id)",
+                "CREATE INDEX patient_id_index IF NOT EXISTS FOR (p:Patient) ON (p.id)",
                 "CREATE INDEX IF NOT EXISTS FOR (d:Doctor) ON (d.email)",
                 "CREATE INDEX IF NOT EXISTS FOR (p:Patient) ON (p.email)",
                 "CREATE INDEX IF NOT EXISTS FOR (a:Appointment) ON (a.date)",
+                # Keyset pagination of consultation listings (ORDER BY r.date, range on r.date)
+                "CREATE INDEX consulted_by_date IF NOT EXISTS FOR ()-[r:CONSULTED_BY]-() ON (r.date)",
+            ]
+
+            # (constraint, fallback index) pairs: the index is only created when
+            # the constraint cannot be, e.g. duplicate keys still present (run
+            # `flask migrate-graph-keys`) or relationship uniqueness on a
+            # server older than Neo4j 5.7.
+            keyed_constraints = [
+                (
+                    "CREATE CONSTRAINT doctor_mongo_id IF NOT EXISTS FOR (d:Doctor) REQUIRE d.mongo_id IS UNIQUE",
+                    f"CREATE INDEX {NEO4J_FALLBACK_INDEXES[0]} IF NOT EXISTS FOR (d:Doctor) ON (d.mongo_id)",
+                ),
+                (
+                    "CREATE CONSTRAINT patient_mongo_id IF NOT EXISTS FOR (p:Patient) REQUIRE p.mongo_id IS UNIQUE",
+                    f"CREATE INDEX {NEO4J_FALLBACK_INDEXES[1]} IF NOT EXISTS FOR (p:Patient) ON (p.mongo_id)",
+                ),
+                (
+                    "CREATE CONSTRAINT consulted_by_consultation_id IF NOT EXISTS FOR ()-[r:CONSULTED_BY]-() REQUIRE r.consultation_id IS UNIQUE",
+                    f"CREATE INDEX {NEO4J_FALLBACK_INDEXES[2]} IF NOT EXISTS FOR ()-[r:CONSULTED_BY]-() ON (r.consultation_id)",
+                ),
             ]
 
             for constraint in constraints:
                 try:
-                    session.run(constraint)
+                    session.run(constraint).consume()
+                except Exception as constraint_error:
+                    logger.warning("Constraint may already exist: %s", constraint_error)
+
+            for constraint, fallback_index in keyed_constraints:
+                try:
+                    session.run(constraint).consume()
                 except Exception as constraint_error:
-                    logger.warning(f"Constraint may already exist: {constraint_error}")
+                    logger.warning(
+                        "Constraint not created, falling back to an index: %s", constraint_error
+                    )
+                    try:
+                        session.run(fallback_index).consume()
+                    except Exception as index_error:
+                        logger.warning("Index may already exist: %s", index_error)
+
+            try:
+                legacy = legacy_id_constraints(session)
+            except Exception as show_error:
+                legacy = []
+                logger.warning("Could not list Neo4j constraints: %s", show_error)
+            if legacy:
+                logger.warning(
+                    "⚠️ Legacy unique constraints on Doctor.id/Patient.id still present (%s): "
+                    "run `flask migrate-graph-keys` before syncing profiles",
+                    legacy,
+                )
 
             logger.info("✅ Successfully set up Neo4j constraints and indexes")
             return True
     except Exception as e:
-        logger.error(f"❌ Failed to set up Neo4j constraints: {e}")
+        logger.error("❌ Failed to set up Neo4j constraints: %s", e)
         return False
 
 
+def setup_mongo_indexes():
+    """Create the MongoDB indexes declared in models/indexes.py"""
+    from .data.indexes import ensure_indexes
+
+    try:
+        errors = ensure_indexes()
+    except Exception as e:
+        logger.error("❌ Failed to set up MongoDB indexes: %s", e)
+        return False
+    if errors:
+        logger.warning("⚠️ Some MongoDB indexes were not created: %s", errors)
+        return False
+    logger.info("✅ Successfully set up MongoDB indexes")
+    return True
+
+
 def init_extensions(app):
     """Initialize Flask extensions with proper error handling"""
 
@@ -118,6 +387,9 @@ def init_extensions(app):
     # Initialize JWT
     jwt.init_app(app)
 
+    # Pool settings for the shared connection registry
+    configure_connections(app)
+
     # Initialize MongoDB
     logger.info("🔄 Initializing MongoDB connection...")
     if not init_mongodb(app):
@@ -128,6 +400,10 @@ def init_extensions(app):
     if not init_neo4j(app):
         raise RuntimeError("Failed to initialize Neo4j connection")
 
+    # Declared MongoDB indexes (idempotent) - don't fail if this fails
+    if app.config.get("MONGODB_ENSURE_INDEXES", Config.MONGODB_ENSURE_INDEXES):
+        setup_mongo_indexes()
+
     # Setup Neo4j constraints - don't fail if this fails
     if not setup_neo4j_constraints():
         logger.warning("⚠️ Failed to setup Neo4j constraints, but continuing...")
@@ -136,27 +412,20 @@ def init_extensions(app):
 
 
 def close_extensions(error):
-    """Close database connections - Fixed to properly accept error parameter"""
-    db = g.pop("db", None)
+    """Release per-request handles; the pools themselves outlive the request"""
+    g.pop("db", None)
 
-    # Close Neo4j connection
-    global neo4j_driver
-    if neo4j_driver:
+    # Return the borrowed Neo4j session's connection to the pool
+    session = g.pop("neo4j_session", None)
+    if session is not None:
+        neo4j_sessions.released()
         try:
-            neo4j_driver.close()
-            logger.info("Neo4j connection closed")
+            session.close()
         except Exception as ex:
-            logger.error(f"Error closing Neo4j connection: {ex}")
+            logger.error("Error releasing Neo4j session: %s", ex)
 
 
 def get_collection(collection_name):
     """Get a specific collection - helper function"""
     db = get_db()
     return db[collection_name]
-
-
-# Add this function to get Neo4j driver for use in other modules
-def get_neo4j_driver():
-    """Get Neo4j driver instance"""
-    global neo4j_driver
-    return neo4j_driver
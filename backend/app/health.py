@@ -0,0 +1,172 @@
+"""
+Sondes de vivacité et de disponibilité pour les répartiteurs de charge.
+
+- `/api/health/live` : le processus répond (aucun appel aux bases) ;
+- `/api/health/ready` (et `/api/health`) : MongoDB (`ping`) et Neo4j
+  (`RETURN 1`) sont sondés à travers les pools partagés ; 503 si l'une des
+  bases est injoignable.
+
+Le résultat d'une sonde est conservé HEALTH_PROBE_TTL secondes et une seule
+sonde par base est en cours à un instant donné : quel que soit le nombre de
+répartiteurs, chaque worker fait au plus un appel par base et par
+intervalle. Une sonde qui dépasse HEALTH_PROBE_TIMEOUT est déclarée en
+échec sans bloquer la requête de santé.
+
+La réponse détaille l'occupation des pools, les sessions Neo4j en cours et
+les percentiles des latences des dernières sondes.
+"""
+import threading
+import time
+from collections import deque
+
+from .config import Config
+from .extensions import get_mongo_client, get_neo4j_driver, get_pool_generations, get_pool_limits
+from .utils.pool_monitor import mongo_pool_monitor, neo4j_sessions
+
+
+def _ping_mongodb():
+    get_mongo_client().admin.command("ping")
+
+
+def _ping_neo4j():
+    with get_neo4j_driver().session() as session:
+        session.run("RETURN 1").consume()
+
+
+class _Probe:
+    """Sonde mise en cache, exécutée dans un thread pour borner son attente"""
+
+    def __init__(self, name, check):
+        self.name = name
+        self.check = check
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked_at = 0.0
+        self._running = None
+        self.latencies = deque(maxlen=Config.HEALTH_LATENCY_WINDOW)
+
+    def _run(self, outcome):
+        started = time.perf_counter()
+        try:
+            self.check()
+            outcome["status"] = "up"
+        except Exception as ex:
+            outcome["status"] = "down"
+            outcome["error"] = str(ex)
+        outcome["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    def _fresh(self):
+        return self._result is not None and time.monotonic() - self._checked_at < Config.HEALTH_PROBE_TTL
+
+    def start(self):
+        """Lancer la sonde si le résultat en cache a expiré et qu'aucune n'est en cours"""
+        with self._lock:
+            if self._fresh():
+                return None
+            if self._running is None or not self._running[0].is_alive():
+                outcome = {}
+                thread = threading.Thread(
+                    target=self._run, args=(outcome,), name=f"health-{self.name}", daemon=True
+                )
+                thread.start()
+                self._running = (thread, outcome)
+            return self._running
+
+    def result(self):
+        running = self.start()
+        if running is None:
+            return self._result
+        thread, outcome = running
+
+        # Les requêtes concurrentes attendent la même sonde
+        thread.join(Config.HEALTH_PROBE_TIMEOUT)
+        with self._lock:
+            if thread.is_alive():
+                result = {"status": "down", "error": "timeout", "latency_ms": None}
+            else:
+                result = dict(outcome)
+                if self._running is not None and self._running[0] is thread:
+                    self.latencies.append(result["latency_ms"])
+                    self._running = None
+            self._result = result
+            self._checked_at = time.monotonic()
+            return result
+
+    def percentiles(self):
+        samples = sorted(self.latencies)
+        if not samples:
+            return {}
+        return {
+            f"p{p}": samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+            for p in (50, 95, 99)
+        }
+
+
+_probes = {
+    "mongodb": _Probe("mongodb", _ping_mongodb),
+    "neo4j": _Probe("neo4j", _ping_neo4j),
+}
+
+
+def _neo4j_pool():
+    """Connexions du pool Neo4j par serveur (API interne du pilote, si disponible)"""
+    pool = getattr(get_neo4j_driver(), "_pool", None)
+    try:
+        return {
+            str(address): {
+                "open": len(connections),
+                "in_use": pool.in_use_connection_count(address),
+            }
+            for address, connections in list(pool.connections.items())
+        }
+    except AttributeError:
+        return None
+
+
+def pool_stats():
+    limits = get_pool_limits()
+    servers = _neo4j_pool()
+    in_use = max((s["in_use"] for s in (servers or {}).values()), default=0)
+    return {
+        "mongodb": mongo_pool_monitor.snapshot(limits["mongodb"]),
+        "neo4j": {
+            "max_pool_size": limits["neo4j"],
+            "utilization": round(in_use / limits["neo4j"], 3)
+            if limits["neo4j"] and servers is not None
+            else None,
+            "servers": servers,
+            "sessions_in_flight": neo4j_sessions.in_flight,
+            "sessions_peak": neo4j_sessions.peak,
+        },
+        "generations": get_pool_generations(),
+    }
+
+
+def readiness():
+    """Retourne (rapport, prêt)"""
+    # Les bases sont sondées en parallèle
+    for probe in _probes.values():
+        probe.start()
+    checks = {}
+    for name, probe in _probes.items():
+        checks[name] = {**probe.result(), "latency_percentiles_ms": probe.percentiles()}
+    ready = all(check["status"] == "up" for check in checks.values())
+    return {
+        "status": "ready" if ready else "unavailable",
+        "databases": checks,
+        "pools": pool_stats(),
+    }, ready
+
+
+def register_health(app):
+    """Enregistrer les routes de santé sur l'application"""
+
+    @app.route("/api/health/live")
+    def health_live():
+        return {"status": "alive"}
+
+    @app.route("/api/health")
+    @app.route("/api/health/ready")
+    def health_ready():
+        report, ready = readiness()
+        return report, 200 if ready else 503
@@ -0,0 +1,96 @@
+"""
+Instrumentation des requêtes HTTP.
+
+Pour chaque requête : durée par endpoint (histogramme), nombre et durée des
+commandes MongoDB et requêtes Cypher exécutées pendant la requête. Les
+totaux sont renvoyés dans l'en-tête `Server-Timing` (visible dans l'onglet
+réseau des navigateurs) et toutes les métriques sont exposées au format
+Prometheus sur `/metrics`.
+
+Les métriques sont propres à chaque processus : avec plusieurs workers,
+chacun expose les siennes (Prometheus agrège par instance).
+"""
+import time
+
+from flask import Response, g, request
+
+from .config import Config
+from .extensions import get_pool_limits
+from .utils.db_instrumentation import finish_request, start_request
+from .utils.metrics import registry
+from .utils.pool_monitor import mongo_pool_monitor, neo4j_sessions
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by endpoint", ["endpoint", "method", "status"]
+)
+http_request_queries = registry.histogram(
+    "http_request_db_queries",
+    "Database calls made while handling one request",
+    ["endpoint", "db"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200),
+)
+http_request_db_duration = registry.histogram(
+    "http_request_db_duration_seconds", "Time spent in database calls per request", ["endpoint", "db"]
+)
+mongo_pool_in_use = registry.gauge(
+    "mongodb_pool_checked_out_connections", "MongoDB connections checked out", ["server"]
+)
+mongo_pool_waiting = registry.gauge(
+    "mongodb_pool_waiting_requests", "Operations waiting for a MongoDB connection", ["server"]
+)
+mongo_pool_max = registry.gauge("mongodb_pool_max_size", "Configured MongoDB pool size")
+neo4j_sessions_in_flight = registry.gauge(
+    "neo4j_sessions_in_flight", "Request-scoped Neo4j sessions currently borrowed"
+)
+
+
+def _collect_pools():
+    mongo_pool_max.set(get_pool_limits()["mongodb"])
+    for server, stats in mongo_pool_monitor.snapshot()["servers"].items():
+        mongo_pool_in_use.set(stats["checked_out"], server=server)
+        mongo_pool_waiting.set(stats["waiting"], server=server)
+    neo4j_sessions_in_flight.set(neo4j_sessions.in_flight)
+
+
+registry.add_collector(_collect_pools)
+
+# Noms courts des bases dans Server-Timing
+_TIMING_NAMES = {"mongodb": ("mongo", "command(s)"), "neo4j": ("neo4j", "query(ies)")}
+
+
+def register_instrumentation(app):
+    """Mesurer chaque requête et exposer `/metrics`"""
+    if not Config.METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        start_request()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop("request_started", None)
+        db_stats = finish_request()
+        if started is None:
+            return response
+        duration = time.perf_counter() - started
+        endpoint = request.endpoint or "unmatched"
+        http_request_duration.observe(
+            duration, endpoint=endpoint, method=request.method, status=response.status_code
+        )
+
+        timings = []
+        for db, (count, seconds) in db_stats.items():
+            http_request_queries.observe(count, endpoint=endpoint, db=db)
+            http_request_db_duration.observe(seconds, endpoint=endpoint, db=db)
+            name, unit = _TIMING_NAMES[db]
+            timings.append(f'{name};dur={seconds * 1000:.1f};desc="{count} {unit}"')
+        timings.append(f"app;dur={duration * 1000:.1f}")
+        # Pour une réponse en flux, seule la préparation est mesurée
+        response.headers.add("Server-Timing", ", ".join(timings))
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,25 @@
+"""
+Tâches de fond des workers web.
+
+Les threads ne survivent pas à un fork : ils sont démarrés au premier
+appel reçu par chaque processus, jamais à l'import ni dans les commandes CLI.
+"""
+
+
+def _workers():
+    from .data.consultation_stats import reconciler
+    from .data.mail_queue import mail_dispatcher
+    from .data.sync_outbox import outbox_worker
+
+    return [reconciler, outbox_worker, mail_dispatcher]
+
+
+def register_jobs(app):
+    """Démarrer les tâches de fond à la première requête de chaque worker"""
+    if app.config.get("TESTING"):
+        return
+
+    @app.before_request
+    def ensure_background_jobs():
+        for worker in _workers():
+            worker.ensure_started()
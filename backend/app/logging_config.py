@@ -0,0 +1,240 @@
+"""
+Journalisation structurée et non bloquante.
+
+- une ligne JSON par événement (LOG_FORMAT=text pour le développement) :
+  horodatage, niveau, logger, message, `request_id`, plus les champs passés
+  dans `extra` (ex. `query_profile`) ;
+- le thread de la requête ne fait que déposer l'événement dans une file
+  bornée (`QueueHandler`) ; un thread dédié (`QueueListener`) l'écrit sur
+  la sortie standard. File pleine : l'événement est abandonné et compté
+  au lieu de bloquer la requête ;
+- niveaux par module : LOG_LEVEL pour la racine, LOG_LEVELS pour les
+  exceptions (`app.doctor.routes=DEBUG,pymongo=WARNING`) ; un appel
+  `logger.debug("...", document)` désactivé ne formate rien ;
+- corrélation : chaque requête reçoit un identifiant (en-tête X-Request-ID
+  entrant s'il est court et composé de [A-Za-z0-9._-], sinon généré),
+  ajouté à tous ses événements et renvoyé dans la réponse ;
+- échantillonnage : LOG_SAMPLE_RATE garde une fraction des événements
+  DEBUG/INFO (les avertissements et erreurs sont toujours conservés) ;
+  LOG_ACCESS_SAMPLE_RATE fait de même pour le journal d'accès.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, request
+
+from .config import Config
+from .utils.metrics import registry
+
+access_logger = logging.getLogger("app.access")
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+dropped_records = registry.counter("log_records_dropped_total", "Log records dropped because the queue was full")
+
+# Attributs standard d'un LogRecord : tout le reste vient de `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_plain_formatter = logging.Formatter()
+
+# X-Request-ID accepté du client : recopié dans chaque ligne de journal et
+# dans la réponse, donc borné (pas de retour à la ligne ni d'en-tête géant)
+_REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,64}")
+_queue_handler = None
+_listener = None
+_listener_pid = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        event = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                event[key] = value
+        if record.exc_info:
+            event["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            event["exception"] = record.exc_text
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        return super().format(record)
+
+
+class RequestContextFilter(logging.Filter):
+    """Ajouter l'identifiant de la requête en cours"""
+
+    def filter(self, record):
+        request_id = request_id_var.get()
+        if request_id is not None and not hasattr(record, "request_id"):
+            record.request_id = request_id
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Garder une fraction `rate` des événements sous WARNING"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui abandonne l'événement quand la file est pleine"""
+
+    def prepare(self, record):
+        # Figer le message et la trace dans le thread émetteur ; les champs
+        # `extra` restent des attributs séparés pour le formateur JSON
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _plain_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records.inc()
+
+
+def parse_levels(spec):
+    """'app.doctor=DEBUG,pymongo=WARNING' -> {'app.doctor': 'DEBUG', 'pymongo': 'WARNING'}"""
+    levels = {}
+    for item in (spec or "").split(","):
+        name, _, level = item.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _start_listener(output):
+    global _listener, _listener_pid
+    _listener = logging.handlers.QueueListener(
+        _queue_handler.queue, output, respect_handler_level=True
+    )
+    _listener.start()
+    _listener_pid = os.getpid()
+
+
+def _restart_after_fork():
+    # Le thread d'écriture n'existe pas dans le processus enfant
+    if _listener is not None and _listener_pid != os.getpid():
+        _start_listener(_listener.handlers[0])
+
+
+def configure_logging():
+    """Installer la journalisation du processus (idempotent)"""
+    global _queue_handler
+    root = logging.getLogger()
+    if _queue_handler is not None and _queue_handler in root.handlers:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if Config.LOG_FORMAT == "json" else TextFormatter())
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=Config.LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(RequestContextFilter())
+    _queue_handler.addFilter(SamplingFilter(Config.LOG_SAMPLE_RATE))
+
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(Config.LOG_LEVEL.upper())
+    for name, level in parse_levels(Config.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _start_listener(output)
+    atexit.register(shutdown_logging)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def shutdown_logging():
+    """Vider la file et arrêter le thread d'écriture"""
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+
+
+def incoming_request_id(value):
+    """Identifiant fourni par le client s'il est valide, sinon un nouvel identifiant"""
+    if value and _REQUEST_ID_PATTERN.fullmatch(value):
+        return value
+    return uuid.uuid4().hex
+
+
+def register_request_logging(app):
+    """Identifiant de corrélation et journal d'accès échantillonné"""
+
+    @app.before_request
+    def bind_request_id():
+        request_id = incoming_request_id(request.headers.get("X-Request-ID"))
+        g.request_id = request_id
+        g.log_started = time.perf_counter()
+        g.log_token = request_id_var.set(request_id)
+
+    @app.after_request
+    def log_request(response):
+        request_id = g.get("request_id")
+        if request_id is None:
+            return response
+        response.headers["X-Request-ID"] = request_id
+        started = g.get("log_started")
+        if (
+            started is not None
+            and access_logger.isEnabledFor(logging.INFO)
+            and random.random() < Config.LOG_ACCESS_SAMPLE_RATE
+        ):
+            access_logger.info(
+                "%s %s %s",
+                request.method,
+                request.path,
+                response.status_code,
+                extra={
+                    "method": request.method,
+                    "path": request.path,
+                    "endpoint": request.endpoint,
+                    "status": response.status_code,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                },
+            )
+        return response
+
+    @app.teardown_request
+    def unbind_request_id(error=None):
+        token = g.pop("log_token", None)
+        if token is not None:
+            try:
+                request_id_var.reset(token)
+            except ValueError:
+                # Jeton créé dans un autre contexte (réponse en flux)
+                request_id_var.set(None)
@@ -0,0 +1,77 @@
+"""
+Index MongoDB requis par les routes, déclarés par collection.
+
+`app/data/indexes.py` les crée (au démarrage ou via `flask mongo-indexes`)
+et vérifie leur présence ; `QUERY_SHAPES` liste les requêtes représentatives
+dont le plan est contrôlé avec explain().
+"""
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+MONGO_INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="users_email_unique", unique=True),
+        # Listes admin : filtre sur le rôle, tri par date de création puis _id
+        # (départage stable) entièrement servi par l'index, sans tri en mémoire
+        IndexModel(
+            [("role", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="users_role_created_at_id",
+        ),
+    ],
+    "patients": [
+        IndexModel([("user_id", ASCENDING)], name="patients_user_id"),
+        # Unique quand renseigné (les profils créés par l'admin n'ont pas de CIN)
+        IndexModel(
+            [("cin", ASCENDING)],
+            name="patients_cin_unique",
+            unique=True,
+            partialFilterExpression={"cin": {"$type": "string"}},
+        ),
+        IndexModel([("email", ASCENDING)], name="patients_email"),
+    ],
+    "doctors": [
+        IndexModel([("user_id", ASCENDING)], name="doctors_user_id"),
+        IndexModel([("email", ASCENDING)], name="doctors_email"),
+    ],
+    "consultation_counters": [
+        IndexModel([("scope", ASCENDING), ("key", ASCENDING)], name="counters_scope_key"),
+    ],
+    "sync_outbox": [
+        IndexModel(
+            [("available_at", ASCENDING), ("enqueued_at", ASCENDING)], name="outbox_available"
+        ),
+        IndexModel([("enqueued_at", ASCENDING)], name="outbox_enqueued_at"),
+        IndexModel([("claimed_by", ASCENDING)], name="outbox_claimed_by", sparse=True),
+    ],
+    "mail_queue": [
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="mail_available"),
+        IndexModel([("status", ASCENDING), ("enqueued_at", ASCENDING)], name="mail_enqueued_at"),
+        IndexModel([("claimed_by", ASCENDING)], name="mail_claimed_by", sparse=True),
+        # Messages en échec définitif, supprimés après MAIL_FAILED_RETENTION
+        IndexModel([("expires_at", ASCENDING)], name="mail_failed_expires_at", expireAfterSeconds=0),
+    ],
+    # Seaux de limitation de débit (stockage mongodb://), supprimés après expiration
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], name="rate_limits_expires_at", expireAfterSeconds=0),
+    ],
+    "search_index": [
+        IndexModel([("entity", ASCENDING), ("terms", ASCENDING)], name="search_terms"),
+        IndexModel([("entity", ASCENDING), ("trigrams", ASCENDING)], name="search_trigrams"),
+        IndexModel([("user_id", ASCENDING)], name="search_user_id"),
+    ],
+}
+
+# (nom, collection, filtre, tri) des requêtes fréquentes des routes
+QUERY_SHAPES = [
+    ("login", "users", {"email": "someone@example.com"}, None),
+    ("users by role", "users", {"role": "patient"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("patient profile", "patients", {"user_id": "000000000000000000000000"}, None),
+    ("doctor profile", "doctors", {"user_id": "000000000000000000000000"}, None),
+    ("patient by cin", "patients", {"cin": "AB123456"}, None),
+    ("doctor counters", "consultation_counters", {"scope": "doctor", "count": {"$gt": 0}}, [("key", ASCENDING)]),
+    ("outbox oldest", "sync_outbox", {}, [("enqueued_at", ASCENDING)]),
+    ("outbox claimed", "sync_outbox", {"claimed_by": "token"}, None),
+    ("mail due", "mail_queue", {"status": "pending", "available_at": {"$lte": datetime(2024, 1, 1)}}, [("available_at", ASCENDING)]),
+    ("search prefix", "search_index", {"entity": {"$in": ["patient"]}, "terms": {"$regex": "^dup"}}, None),
+]
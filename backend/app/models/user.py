@@ -1,8 +1,11 @@
+import logging
 from datetime import datetime
 from bson import ObjectId
-from werkzeug.security import generate_password_hash, check_password_hash
+from ..auth.passwords import hash_password, verify_password
 from ..extensions import get_db
 
+logger = logging.getLogger(__name__)
+
 class User:
     collection_name = 'users'
 
@@ -10,7 +13,7 @@ class User:
                  last_name=None, created_at=None, _id=None, **kwargs):
         self._id = _id if _id else str(ObjectId())
         self.email = email.lower()
-        self.password_hash = generate_password_hash(password) if password else None
+        self.password_hash = hash_password(password) if password else None
         self.role = role
         self.first_name = first_name
         self.last_name = last_name
@@ -47,7 +50,7 @@ class User:
             user_data = db.users.find_one({'email': email.lower()})
             return user_data
         except Exception as e:
-            print(f"Erreur lors de la récupération de l'utilisateur: {e}")
+            logger.error("Erreur lors de la récupération de l'utilisateur: %s", e)
             return None
 
     @staticmethod
@@ -65,12 +68,15 @@ class User:
             user_data = db.users.find_one({'_id': user_id})
             return user_data
         except Exception as e:
-            print(f"Erreur lors de la récupération de l'utilisateur par ID: {e}")
+            logger.error("Erreur lors de la récupération de l'utilisateur par ID: %s", e)
             return None
 
     @staticmethod
-    def update_last_login_cabinet_medical(user_id):
-        """Mettre à jour la date de dernière connexion dans cabinet_medical.users"""
+    def update_last_login_cabinet_medical(user_id, password_hash=None):
+        """Mettre à jour la date de dernière connexion dans cabinet_medical.users
+
+        `password_hash` remplace le hash stocké (recalcul à la connexion).
+        """
         try:
             db = get_db()
             # Convertir l'ID string en ObjectId si nécessaire
@@ -80,13 +86,16 @@ class User:
                 except:
                     pass
             
+            fields = {'last_login': datetime.utcnow()}
+            if password_hash:
+                fields['password_hash'] = password_hash
             db.users.update_one(
                 {'_id': user_id},
-                {'$set': {'last_login': datetime.utcnow()}}
+                {'$set': fields}
             )
             return True
         except Exception as e:
-            print(f"Erreur lors de la mise à jour de last_login: {e}")
+            logger.error("Erreur lors de la mise à jour de last_login: %s", e)
             return False
 
     @staticmethod
@@ -100,7 +109,7 @@ class User:
                 user['_id'] = str(user['_id'])
             return users
         except Exception as e:
-            print(f"Erreur lors de la récupération de tous les utilisateurs: {e}")
+            logger.error("Erreur lors de la récupération de tous les utilisateurs: %s", e)
             return []
 
     @staticmethod
@@ -114,14 +123,14 @@ class User:
                 user['_id'] = str(user['_id'])
             return users
         except Exception as e:
-            print(f"Erreur lors de la récupération des utilisateurs par rôle: {e}")
+            logger.error("Erreur lors de la récupération des utilisateurs par rôle: %s", e)
             return []
 
     def check_password(self, password):
         """Vérifier le mot de passe"""
         if not self.password_hash:
             return False
-        return check_password_hash(self.password_hash, password)
+        return verify_password(password, self.password_hash)
 
     def save(self):
         """Sauvegarder ou mettre à jour l'utilisateur"""
@@ -131,6 +140,9 @@ class User:
             {'$set': user_data},
             upsert=True
         )
+        # Les routes de mise à jour passent par ici : garder l'index de recherche à jour
+        from ..data.search_index import index_documents
+        index_documents('user', [user_data])
         return self
 
     def update_last_login(self):
@@ -197,10 +209,9 @@ class User:
         # Créer l'utilisateur directement dans la collection cabinet_medical.users
         from ..extensions import get_db
         from bson import ObjectId
-        from werkzeug.security import generate_password_hash
         
-        # Utiliser le même format de hash que Werkzeug
-        password_hash = generate_password_hash(password, method='pbkdf2:sha256', salt_length=16)
+        # Algorithme et coût configurés (PASSWORD_HASH_ALGORITHM)
+        password_hash = hash_password(password)
         
         user_data = {
             '_id': ObjectId(),
@@ -220,6 +231,10 @@ class User:
         db = get_db()
         result = db.users.insert_one(user_data)
         user_data['_id'] = result.inserted_id
+
+        # Rendre l'utilisateur trouvable immédiatement
+        from ..data.search_index import index_documents
+        index_documents('user', [user_data])
         
         # Retourner un objet User
         return type('User', (), user_data)
@@ -1,105 +1,99 @@
-from functools import wraps
+import logging
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from pymongo import MongoClient
-from bson import ObjectId
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, date
-from neo4j import GraphDatabase
-from werkzeug.security import generate_password_hash
-from ..config import Config
-from ..data.sync_service import SyncService
+from ..auth.passwords import PasswordServiceBusy, hash_password
+from ..extensions import mongo_db, neo4j_driver
+from ..auth.authorization import (
+    admin_required,
+    doctor_required,
+    get_cached_user,
+    get_current_patient,
+    invalidate_profile,
+    patient_required,
+)
+from ..data.enrichment import DOCTOR_SUMMARY_FIELDS, enrich_records
+from ..data.search_index import remove_user as remove_from_search
+from ..data.listings import (
+    iter_users_with_profiles,
+    list_users_with_profiles,
+    pagination_info,
+    parse_listing_args,
+    streamed_totals,
+)
+from ..data.sync_outbox import enqueue_patient
 from ..models.user import User
+from ..utils.streaming import list_response, streaming_format
 
 patient_bp = Blueprint('patient', __name__)
-mongo_client = MongoClient(Config.MONGODB_URI)
-db = mongo_client.cabinet_medical
-neo4j_driver = GraphDatabase.driver(
-    Config.NEO4J_URI, auth=(Config.NEO4J_USER, Config.NEO4J_PASSWORD)
-)
-sync_service = SyncService()
-
-def patient_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        current_user_id = ObjectId(current_user_id)
-        user = db.users.find_one({'_id': current_user_id})
-        if not user or user['role'] != 'patient':
-            return jsonify({'error': 'Patient access required'}), 403
-        return f(*args, **kwargs)
-    return decorated_function
-
-def admin_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        claims = get_jwt()
-        if claims.get("role") != "admin":
-            return jsonify({"error": "Accès réservé aux administrateurs"}), 403
-        return f(*args, **kwargs)
-    return decorated_function
-
-def doctor_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        current_user_id = ObjectId(current_user_id)
-        user = db.users.find_one({'_id': current_user_id})
-        if not user or user['role'] != 'doctor':
-            return jsonify({'error': 'Doctor access required'}), 403
-        return f(*args, **kwargs)
-    return decorated_function
+logger = logging.getLogger(__name__)
+db = mongo_db
 
 # ======================== GESTION DES PATIENTS (ADMIN SEULEMENT) ========================
 
+PATIENT_LISTING_FIELDS = ['cin', 'nom', 'email', 'telephone', 'type', 'address']
+
+
+def _patient_info(user, patient_data):
+    patient_info = {
+        'user_id': str(user['_id']),
+        'email': user['email'],
+        'first_name': user['first_name'],
+        'last_name': user['last_name'],
+        'created_at': user['created_at'].isoformat() if user.get('created_at') else None,
+        'last_login': user['last_login'].isoformat() if user.get('last_login') else None
+    }
+
+    if patient_data:
+        patient_info.update({
+            'patient_id': str(patient_data['_id']),
+            'cin': patient_data.get('cin'),
+            'nom': patient_data.get('nom'),
+            'email': patient_data.get('email'),
+            'telephone': patient_data.get('telephone'),
+            'type': patient_data.get('type'),
+            'address': patient_data.get('address'),
+        })
+    return patient_info
+
+
 @patient_bp.route('/patients', methods=['GET'])
 @jwt_required()
 @admin_required
 def get_all_patients():
     """Récupérer tous les patients (Admin seulement)"""
     try:
-        print("📥 Début de récupération des utilisateurs patients")
-        users = list(db.users.find({'role': 'patient'}))
-        print(f"📋 {len(users)} utilisateurs avec rôle 'patient' trouvés")
-
-        patients_list = []
-
-        for user in users:
-            print(f"🔍 Traitement de l'utilisateur : {user.get('email', 'inconnu')} (ID: {user['_id']})")
-
-            # Récupérer les données du patient
-            patient_data = db.patients.find_one({'user_id': str(user['_id'])})
-            print(f"  → Données patient trouvées : {bool(patient_data)}")
-
-            patient_info = {
-                'user_id': str(user['_id']),
-                'email': user['email'],
-                'first_name': user['first_name'],
-                'last_name': user['last_name'],
-                'created_at': user['created_at'].isoformat() if user.get('created_at') else None,
-                'last_login': user['last_login'].isoformat() if user.get('last_login') else None
-            }
-
-            if patient_data:
-                patient_info.update({
-                    'patient_id': str(patient_data['_id']),
-                    'cin': patient_data.get('cin'),
-                    'nom': patient_data.get('nom'),
-                    'email': patient_data.get('email'),
-                    'telephone': patient_data.get('telephone'),
-                    'type': patient_data.get('type'),
-                    'address': patient_data.get('address'),
-                })
-
-            patients_list.append(patient_info)
-
-        print("✅ Tous les patients traités avec succès")
+        try:
+            listing = parse_listing_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        logger.debug("📥 Début de récupération des utilisateurs patients")
+        if streaming_format():
+            # Diffusion au fil du curseur (?stream=1 ou Accept: application/x-ndjson)
+            rows = iter_users_with_profiles('patient', 'patients', PATIENT_LISTING_FIELDS, **listing)
+            return list_response(
+                (_patient_info(user, patient_data) for user, patient_data in rows),
+                key='patients',
+                extra=streamed_totals('patient', listing)
+            )
+
+        # Une page : deux allers-retours ; sans pagination : curseur + profils par tranches
+        total, rows = list_users_with_profiles(
+            'patient', 'patients', PATIENT_LISTING_FIELDS, **listing
+        )
+        logger.debug("📋 %s utilisateurs avec rôle 'patient' trouvés (total: %s)", len(rows), total)
+
+        patients_list = [_patient_info(user, patient_data) for user, patient_data in rows]
+
         return jsonify({
             'patients': patients_list,
-            'total': len(patients_list)
+            'total': total,
+            **pagination_info(total, listing['page'], listing['per_page'])
         }), 200
 
     except Exception as e:
-        print(f"❌ Erreur lors de la récupération des patients : {str(e)}")
+        logger.exception("❌ Erreur lors de la récupération des patients : %s", e)
         return jsonify({'error': f'Erreur lors de la récupération des patients: {str(e)}'}), 500
 
 @patient_bp.route('/create', methods=['POST'])
@@ -108,9 +102,9 @@ def get_all_patients():
 def create_patient():
     """Créer un nouveau patient (Admin seulement)"""
     try:
-        print("🔁 Requête reçue pour création de patient")
+        logger.debug("🔁 Requête reçue pour création de patient")
         data = request.get_json()
-        print(f"📨 Données reçues : {data}")
+        logger.debug("📨 Champs reçus : %s", sorted(data or {}))
 
         # Vérifier les champs requis
         required_fields = ["email", "password", "first_name", "last_name", "cin", "phone", "type", "address"]
@@ -125,7 +119,7 @@ def create_patient():
             first_name=data["first_name"],
             last_name=data["last_name"]
         )
-        print(f"✅ Utilisateur créé : {user.email} (ID: {user._id})")
+        logger.info("✅ Utilisateur créé (ID: %s)", user._id)
 
         # Créer le document patient
         patient_data = {
@@ -141,11 +135,10 @@ def create_patient():
         result = db.patients.insert_one(patient_data)
         patient_data["_id"] = str(result.inserted_id)
 
-        print(f"📝 Patient inséré dans MongoDB avec ID : {patient_data['_id']}")
+        logger.debug("📝 Patient inséré dans MongoDB avec ID : %s", patient_data['_id'])
 
-        # Synchroniser avec Neo4j
-        sync_service.sync_patient(patient_data)
-        print("🔄 Synchronisation avec Neo4j terminée")
+        # Synchroniser avec Neo4j (en arrière-plan)
+        enqueue_patient(patient_data)
 
         return jsonify({
             "message": "Patient créé avec succès",
@@ -153,10 +146,12 @@ def create_patient():
         }), 201
 
     except ValueError as e:
-        print(f"❌ Erreur de validation : {str(e)}")
+        logger.warning("❌ Erreur de validation : %s", e)
         return jsonify({"error": str(e)}), 400
+    except PasswordServiceBusy:
+        raise
     except Exception as e:
-        print(f"💥 Erreur serveur : {str(e)}")
+        logger.exception("💥 Erreur serveur : %s", e)
         return jsonify({"error": "Une erreur est survenue lors de la création du patient"}), 500
 
 
@@ -240,13 +235,14 @@ def update_patient(user_id):
         if 'email' in data:
             user_updates['email'] = data['email'].lower()
         if 'password' in data:
-            user.password_hash = generate_password_hash(data['password'])
+            user.password_hash = hash_password(data['password'])
 
         # Appliquer les mises à jour de l'utilisateur
         for key, value in user_updates.items():
             setattr(user, key, value)
 
         user.save()
+        invalidate_profile(user_id)
 
         # Mettre à jour les données du docteur
         patient_updates = {}
@@ -272,18 +268,21 @@ def update_patient(user_id):
                 {'user_id': user_id},
                 {'$set': patient_updates}
             )
+            invalidate_profile(user_id)
 
             # Récupérer les données mises à jour pour la synchronisation
             updated_patient = db.patients.find_one({'user_id': user_id})
             if updated_patient:
                 updated_patient['_id'] = str(updated_patient['_id'])
-                sync_service.sync_patient(updated_patient)
+                enqueue_patient(updated_patient)
 
         return jsonify({
             "message": "Docteur mis à jour avec succès",
             "user": updated_patient
         }), 200
 
+    except PasswordServiceBusy:
+        raise
     except Exception as e:
         return jsonify({"error": "Une erreur est survenue lors de la mise à jour du patient"}), 500
 
@@ -310,16 +309,18 @@ def delete_patient(user_id):
 
         # Supprimer de la collection users
         db.users.delete_one({'_id': user._id})
+        invalidate_profile(user_id)
+        remove_from_search(user_id)
 
         # Optionnel: Nettoyer Neo4j
         try:
             with neo4j_driver.session() as session:
                 session.run("""
-                    MATCH (p:patient {mongo_id: $user_id})
+                    MATCH (p:Patient {mongo_id: $user_id})
                     DETACH DELETE p
                 """, user_id=user_id)
         except Exception as neo4j_error:
-            print(f"Erreur Neo4j lors de la suppression: {neo4j_error}")
+            logger.error("Erreur Neo4j lors de la suppression: %s", neo4j_error)
 
         return jsonify({"message": "Patient supprimé avec succès"}), 200
 
@@ -335,12 +336,12 @@ def get_patient_profile():
     """Récupérer le profil du docteur connecté"""
     try:
         current_user_id = get_jwt_identity()
-        user = User.get_by_id(current_user_id)
-        patient_data = db.patients.find_one({'user_id': current_user_id})
+        user = get_cached_user(current_user_id)
+        patient_data = get_current_patient()
 
         response_data = {
-            'last_login': user.last_login,
-            'created_at': user.created_at
+            'last_login': user.get('last_login'),
+            'created_at': user.get('created_at')
         }
 
         if patient_data:
@@ -362,20 +363,19 @@ def get_consultation_history():
     """Récupérer l'historique de toutes les consultations du docteur via Neo4j"""
     try:
         current_user_id = get_jwt_identity()
-        patient = db.patients.find_one({'user_id': current_user_id})
+        patient = get_current_patient()
 
         if not patient:
             return jsonify({'error': 'Docteur non trouvé'}), 404
 
         patient_mongo_id = str(patient['user_id'])
 
-        print(patient_mongo_id)
+        logger.debug("Historique du patient mongo_id: %s", patient_mongo_id)
 
         # Requête Neo4j pour récupérer toutes les relations CONSULTED_BY
         with neo4j_driver.session() as session:
             result = session.run("""
-                MATCH (p:Patient)-[r:CONSULTED_BY]->(d:Doctor)
-                WHERE p.mongo_id = $patient_mongo_id
+                MATCH (p:Patient {mongo_id: $patient_mongo_id})-[r:CONSULTED_BY]->(d:Doctor)
                 RETURN d.mongo_id as doctor_mongo_id, 
                        r.consultation_id as consultation_id,
                        r.date as date,
@@ -388,16 +388,12 @@ def get_consultation_history():
                 ORDER BY r.date DESC
             """, patient_mongo_id=patient_mongo_id)
 
-            print(result)
-
             consultations_history = []
 
-            for record in result:
-                # Récupérer les informations du patient depuis MongoDB
-                doctor = db.doctors.find_one({'user_id': record['doctor_mongo_id']})
-
-                print(doctor)
-
+            # Médecins résolus en une seule requête MongoDB
+            for record, doctor in enrich_records(
+                result, 'doctor_mongo_id', 'doctors', fields=DOCTOR_SUMMARY_FIELDS
+            ):
                 if doctor:
                     consultation_data = {
                         'consultation_id': record['consultation_id'],
@@ -434,7 +430,7 @@ def get_upcoming_consultations():
     """Récupérer les consultations à venir (date >= aujourd'hui et non annulées)"""
     try:
         current_user_id = get_jwt_identity()
-        patient = db.patients.find_one({'user_id': current_user_id})
+        patient = get_current_patient()
 
         if not patient:
             return jsonify({'error': 'Docteur non trouvé'}), 404
@@ -445,9 +441,8 @@ def get_upcoming_consultations():
         # Requête Neo4j pour les consultations à venir non annulées
         with neo4j_driver.session() as session:
             result = session.run("""
-                MATCH (p:Patient)-[r:CONSULTED_BY]->(d:Doctor)
-                WHERE p.mongo_id = $patient_mongo_id
-                AND datetime(r.date) >= datetime()
+                MATCH (p:Patient {mongo_id: $patient_mongo_id})-[r:CONSULTED_BY]->(d:Doctor)
+                WHERE datetime(r.date) >= datetime()
                 AND NOT r.status IN ['cancelled', 'completed']
                 RETURN d.mongo_id as doctor_mongo_id, 
                        r.consultation_id as consultation_id,
@@ -465,17 +460,11 @@ def get_upcoming_consultations():
 
             upcoming_consultations = []
 
-            for record in result:
-                # Récupérer les informations du patient depuis MongoDB
-
-                print(record['doctor_mongo_id'])
-
-                doctor = db.doctors.find_one({'user_id': record['doctor_mongo_id']})
-
-            print(doctor)
-
-
-            if doctor:
+            # Médecins résolus en une seule requête MongoDB
+            for record, doctor in enrich_records(
+                result, 'doctor_mongo_id', 'doctors', fields=DOCTOR_SUMMARY_FIELDS
+            ):
+                if doctor:
                     consultation_data = {
                         'consultation_id': record['consultation_id'],
                         'date': record['date'],
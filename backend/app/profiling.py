@@ -0,0 +1,307 @@
+"""
+Journal des requêtes lentes et détection des boucles N+1.
+
+Branché sur les appels mesurés par `utils/db_instrumentation` :
+
+- requête lente : toute commande MongoDB ou requête Cypher qui dépasse
+  QUERY_SLOW_MS est journalisée avec son site d'appel. Son plan est obtenu
+  en arrière-plan, sans retarder la requête HTTP : `explain` (queryPlanner,
+  rien n'est exécuté) pour MongoDB, `EXPLAIN` pour Cypher (`PROFILE` pour
+  les requêtes en lecture seule si QUERY_PROFILE_CYPHER est activé) ;
+- N+1 : dans une requête HTTP échantillonnée, une même forme de requête
+  (valeurs remplacées par `?`) exécutée au moins QUERY_N_PLUS_ONE_THRESHOLD
+  fois est signalée à la fin de la requête, avec le site du premier appel.
+
+L'échantillonnage (QUERY_PROFILER_SAMPLE_RATE pour le suivi par requête,
+QUERY_EXPLAIN_SAMPLE_RATE et QUERY_EXPLAIN_COOLDOWN pour les plans) borne
+le coût en production. Les avertissements portent les détails dans
+`extra={"query_profile": {...}}`.
+"""
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import request
+
+from .config import Config
+from .utils.db_instrumentation import query_hooks
+from .utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+slow_queries = registry.counter("db_slow_queries_total", "Queries slower than QUERY_SLOW_MS", ["db"])
+repeated_queries = registry.counter(
+    "db_repeated_query_shapes_total", "Query shapes repeated within one request (N+1)", ["endpoint", "db"]
+)
+
+# Commandes MongoDB qui correspondent à une requête applicative
+PROFILED_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "insert", "update", "delete"}
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# Champs de session/transaction refusés dans une commande explain
+_NOT_EXPLAINABLE_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+_CYPHER_WRITE = re.compile(r"\b(CREATE|MERGE|SET|DELETE|REMOVE|DETACH|FOREACH|LOAD\s+CSV|CALL)\b", re.I)
+_CYPHER_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|\b\d+(?:\.\d+)?\b")
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIPPED_FILES = {
+    os.path.join(_APP_DIR, "profiling.py"),
+    os.path.join(_APP_DIR, "utils", "db_instrumentation.py"),
+}
+
+_local = threading.local()
+_explain_lock = threading.Lock()
+_explained_at = {}
+_explainer = None
+_explainer_pid = None
+_explain_slots = None
+
+
+# --- Formes et sites d'appel ----------------------------------------------
+
+def _mask(value):
+    if isinstance(value, dict):
+        return {key: _mask(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        masked = [_mask(item) for item in value]
+        # Une liste de valeurs ($in) a la même forme quelle que soit sa taille
+        return masked[:1] if all(item == "?" for item in masked) else masked
+    return "?"
+
+
+def mongo_shape(command_name, command):
+    collection = command.get(command_name)
+    if command_name == "aggregate":
+        body = command.get("pipeline")
+    elif command_name in ("update", "delete"):
+        statements = command.get("updates") or command.get("deletes") or [{}]
+        body = statements[0].get("q")
+    else:
+        body = command.get("filter", command.get("query"))
+    return f"{command_name} {collection} {json.dumps(_mask(body), sort_keys=True, default=str)}"
+
+
+def cypher_shape(query):
+    return " ".join(_CYPHER_LITERALS.sub("?", query).split())
+
+
+def _call_site():
+    """Premier cadre de l'application hors instrumentation (fichier:ligne fonction)"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (
+            filename.startswith(_APP_DIR)
+            and filename not in _SKIPPED_FILES
+            and f"{os.sep}venv{os.sep}" not in filename
+            and "site-packages" not in filename
+        ):
+            return f"{os.path.relpath(filename, _APP_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def _describe(db, operation, details):
+    """(forme, texte à expliquer) ; forme None pour un appel non profilé"""
+    if db == "mongodb":
+        command = details.get("command")
+        if operation not in PROFILED_COMMANDS or command is None:
+            return None
+        return mongo_shape(operation, command)
+    return cypher_shape(details.get("query") or "")
+
+
+# --- Plans ----------------------------------------------------------------
+
+def _winning_plan(explain):
+    if isinstance(explain, dict):
+        if "winningPlan" in explain:
+            return explain["winningPlan"]
+        children = explain.values()
+    elif isinstance(explain, list):
+        children = explain
+    else:
+        return None
+    for child in children:
+        plan = _winning_plan(child)
+        if plan is not None:
+            return plan
+    return None
+
+
+def _explain_mongo(database, command_name, command):
+    from .data.indexes import plan_stages
+    from .extensions import get_mongo_client
+
+    command = {
+        key: value
+        for key, value in command.items()
+        if not key.startswith("$") and key not in _NOT_EXPLAINABLE_FIELDS
+    }
+    explain = get_mongo_client()[database].command("explain", command, verbosity="queryPlanner")
+    plan = _winning_plan(explain) or {}
+    stages = plan_stages(plan.get("queryPlan", plan))
+    return {"stages": stages, "collscan": "COLLSCAN" in stages, "in_memory_sort": "SORT" in stages}
+
+
+def _cypher_operators(plan):
+    operator = plan.get("operatorType", "?").split("@")[0]
+    children = [_cypher_operators(child) for child in plan.get("children", [])]
+    return [operator] + [op for child in children for op in child]
+
+
+def _db_hits(plan):
+    return plan.get("dbHits", 0) + sum(_db_hits(child) for child in plan.get("children", []))
+
+
+def _explain_cypher(query, parameters):
+    from .extensions import get_neo4j_driver
+
+    profile = Config.QUERY_PROFILE_CYPHER and not _CYPHER_WRITE.search(query)
+    with get_neo4j_driver().session() as session:
+        summary = session.run(("PROFILE " if profile else "EXPLAIN ") + query, parameters).consume()
+    plan = summary.profile if profile else summary.plan
+    plan = plan if isinstance(plan, dict) else getattr(plan, "__dict__", {})
+    report = {
+        "mode": "PROFILE" if profile else "EXPLAIN",
+        "operators": _cypher_operators(plan),
+        "estimated_rows": plan.get("args", plan.get("arguments", {})).get("EstimatedRows"),
+    }
+    if profile:
+        report["db_hits"] = _db_hits(plan)
+    return report
+
+
+def _explain(db, operation, shape, details, log_details):
+    _local.explaining = True
+    try:
+        if db == "mongodb":
+            plan = _explain_mongo(details["database"], operation, details["command"])
+        else:
+            plan = _explain_cypher(details["query"], details.get("parameters"))
+        logger.warning(
+            "🐢 Query plan for slow %s query: %s -> %s",
+            db,
+            shape,
+            plan,
+            extra={"query_profile": {**log_details, "plan": plan}},
+        )
+    except Exception as ex:
+        logger.info("Query plan unavailable for %s: %s", shape, ex)
+    finally:
+        _local.explaining = False
+
+
+def _schedule_explain(db, operation, shape, details, log_details):
+    global _explainer, _explainer_pid, _explain_slots
+    if db == "mongodb" and operation not in EXPLAINABLE_COMMANDS:
+        return
+    if random.random() >= Config.QUERY_EXPLAIN_SAMPLE_RATE:
+        return
+    now = time.monotonic()
+    with _explain_lock:
+        if now - _explained_at.get(shape, float("-inf")) < Config.QUERY_EXPLAIN_COOLDOWN:
+            return
+        _explained_at[shape] = now
+        if _explainer_pid != os.getpid():
+            _explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-explain")
+            _explain_slots = threading.BoundedSemaphore(Config.QUERY_EXPLAIN_MAX_PENDING)
+            _explainer_pid = os.getpid()
+    # File pleine : ce plan est abandonné plutôt que d'accumuler du travail
+    if not _explain_slots.acquire(blocking=False):
+        return
+    future = _explainer.submit(_explain, db, operation, shape, details, log_details)
+    future.add_done_callback(lambda _: _explain_slots.release())
+
+
+# --- Crochets --------------------------------------------------------------
+
+def _on_query(db, operation, duration, details):
+    if getattr(_local, "explaining", False):
+        return
+    tracked = getattr(_local, "shapes", None)
+    slow = duration * 1000 >= Config.QUERY_SLOW_MS
+    if tracked is None and not slow:
+        return
+    shape = _describe(db, operation, details)
+    if shape is None:
+        return
+
+    if tracked is not None:
+        entry = tracked.get((db, shape))
+        if entry is None:
+            tracked[(db, shape)] = entry = {"count": 0, "duration": 0.0, "call_site": _call_site()}
+        entry["count"] += 1
+        entry["duration"] += duration
+
+    if slow:
+        slow_queries.inc(db=db)
+        log_details = {
+            "kind": "slow_query",
+            "db": db,
+            "shape": shape,
+            "duration_ms": round(duration * 1000, 1),
+            "call_site": _call_site(),
+        }
+        logger.warning(
+            "🐢 Slow %s query (%s ms) at %s: %s",
+            db,
+            log_details["duration_ms"],
+            log_details["call_site"],
+            shape,
+            extra={"query_profile": log_details},
+        )
+        _schedule_explain(db, operation, shape, details, log_details)
+
+
+def _start_tracking():
+    sampled = random.random() < Config.QUERY_PROFILER_SAMPLE_RATE
+    _local.shapes = {} if sampled else None
+
+
+def _report_repeated_shapes(response):
+    tracked = getattr(_local, "shapes", None)
+    _local.shapes = None
+    if not tracked:
+        return response
+    endpoint = request.endpoint or "unmatched"
+    for (db, shape), entry in tracked.items():
+        if entry["count"] < Config.QUERY_N_PLUS_ONE_THRESHOLD:
+            continue
+        repeated_queries.inc(endpoint=endpoint, db=db)
+        details = {
+            "kind": "n_plus_one",
+            "endpoint": endpoint,
+            "db": db,
+            "shape": shape,
+            "count": entry["count"],
+            "duration_ms": round(entry["duration"] * 1000, 1),
+            "call_site": entry["call_site"],
+        }
+        logger.warning(
+            "🔁 %s identical %s queries in %s (%s ms) at %s: %s",
+            entry["count"],
+            db,
+            endpoint,
+            details["duration_ms"],
+            entry["call_site"],
+            shape,
+            extra={"query_profile": details},
+        )
+    return response
+
+
+def register_query_profiler(app):
+    """Activer le journal des requêtes lentes et la détection N+1"""
+    if not Config.QUERY_PROFILER_ENABLED:
+        return
+    if _on_query not in query_hooks:
+        query_hooks.append(_on_query)
+    app.before_request(_start_tracking)
+    app.after_request(_report_repeated_shapes)
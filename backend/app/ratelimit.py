@@ -0,0 +1,290 @@
+"""
+Limitation du débit par seau à jetons (token bucket).
+
+Chaque limite (`"100 per minute"`) est un seau de capacité 100 qui se
+remplit de 100 jetons par minute ; une requête consomme un jeton et reçoit
+un 429 quand le seau est vide. Les rafales sont absorbées jusqu'à la
+capacité, le débit moyen reste borné.
+
+- limite par défaut (RATELIMIT_DEFAULT) : par route et par client,
+  l'utilisateur du jeton JWT s'il est valide, sinon l'adresse IP. Derrière
+  le répartiteur de charge, l'adresse vient de X-Forwarded-For (ProxyFix,
+  PROXY_FIX_X_FOR sauts de confiance, voir `create_app`) ;
+- les limites sont lues dans `app.config` (copie de Config, surchargeable) ;
+- une requête refusée par une limite ne consomme rien dans les autres :
+  les jetons déjà pris sont rendus ;
+- limites propres à une route avec `@limit(...)` (ex. la connexion, limitée
+  par IP avec RATELIMIT_LOGIN) et routes exemptées avec `@exempt` ;
+- stockage (RATELIMIT_STORAGE_URL) : `memory://` garde les seaux dans le
+  processus (un seul worker) ; `mongo`, `mongodb://...` ou
+  `mongodb+srv://...` les partagent entre workers dans la collection
+  `rate_limits` de la base de l'application (client et pool de
+  MONGODB_URI : l'adresse de l'URL n'ouvre pas d'autre connexion) ; chaque vérification est un seul
+  `find_one_and_update` atomique (pipeline de mise à jour, MongoDB 4.2+).
+  Les seaux inactifs expirent par index TTL. Si MongoDB ne répond pas, la
+  requête est laissée passer ;
+- en-têtes X-RateLimit-Limit / -Remaining / -Reset sur chaque réponse
+  limitée, Retry-After sur les 429.
+"""
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import decode_token
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from .config import Config
+from .utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITS_COLLECTION = "rate_limits"
+
+# Routes jamais limitées (sondes et métriques)
+EXEMPT_ENDPOINTS = {"static", "health_live", "health_ready", "metrics"}
+
+rate_limited = registry.counter("rate_limited_requests_total", "Requests rejected with 429", ["endpoint"])
+
+Limit = namedtuple("Limit", ["capacity", "period", "spec"])
+Decision = namedtuple("Decision", ["allowed", "remaining", "limit", "reset", "retry_after"])
+
+_UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_LIMIT_PATTERN = re.compile(r"^\s*(\d+)\s*(?:per|/)\s*(\d+)?\s*(second|minute|hour|day)s?\s*$", re.I)
+
+
+def parse_limits(spec):
+    """'100 per minute; 1000/hour' -> [Limit(100, 60.0, ...), Limit(1000, 3600.0, ...)]"""
+    limits = []
+    for part in (spec or "").split(";"):
+        if not part.strip():
+            continue
+        match = _LIMIT_PATTERN.match(part)
+        if not match:
+            raise ValueError(f"Limite de débit invalide: {part!r}")
+        count, multiplier, unit = match.groups()
+        period = int(multiplier or 1) * _UNITS[unit.lower()]
+        limits.append(Limit(int(count), float(period), part.strip()))
+    return limits
+
+
+def _decision(limit, tokens, allowed):
+    refill_rate = limit.capacity / limit.period
+    return Decision(
+        allowed=allowed,
+        remaining=max(0, int(tokens)),
+        limit=limit.capacity,
+        reset=math.ceil((limit.capacity - tokens) / refill_rate),
+        retry_after=0 if allowed else math.ceil((1 - tokens) / refill_rate),
+    )
+
+
+class MemoryStore:
+    """Seaux du processus ; les plus anciens sont évincés au-delà de `max_keys`"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, cost=1):
+        now = time.monotonic()
+        refill_rate = limit.capacity / limit.period
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + (now - updated_at) * refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                # Coût négatif : jetons rendus, sans dépasser la capacité
+                tokens = min(limit.capacity, tokens - cost)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return _decision(limit, tokens, allowed)
+
+
+class MongoStore:
+    """Seaux partagés dans MongoDB, mis à jour atomiquement"""
+
+    def __init__(self, collection=RATE_LIMITS_COLLECTION):
+        self.collection_name = collection
+
+    def _collection(self):
+        from .data.indexes import ensure_collection_indexes
+        from .extensions import get_mongo_database
+
+        ensure_collection_indexes(self.collection_name)
+        return get_mongo_database()[self.collection_name]
+
+    def hit(self, key, limit, cost=1):
+        now = time.time()
+        refill_rate = limit.capacity / limit.period
+        elapsed = {"$max": [0, {"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}]}
+        pipeline = [
+            {
+                "$set": {
+                    "tokens": {
+                        "$min": [
+                            limit.capacity,
+                            {"$add": [{"$ifNull": ["$tokens", limit.capacity]}, {"$multiply": [elapsed, refill_rate]}]},
+                        ]
+                    },
+                    "updated_at": now,
+                }
+            },
+            {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+            {
+                "$set": {
+                    "tokens": {
+                        "$min": [limit.capacity, {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]}]
+                    },
+                    # Un seau inactif plus d'une période est plein : inutile de le garder
+                    "expires_at": datetime.utcnow() + timedelta(seconds=limit.period),
+                }
+            },
+        ]
+        collection = self._collection()
+        for attempt in range(2):
+            try:
+                bucket = collection.find_one_and_update(
+                    {"_id": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+                )
+                return _decision(limit, bucket["tokens"], bucket["allowed"])
+            except DuplicateKeyError:
+                # Deux premiers accès simultanés : le second relit le seau créé
+                if attempt:
+                    raise
+
+
+def create_store(url):
+    if url.startswith("memory://"):
+        return MemoryStore()
+    if url == "mongo" or url.startswith(("mongodb://", "mongodb+srv://")):
+        return MongoStore()
+    raise ValueError(f"RATELIMIT_STORAGE_URL non pris en charge: {url}")
+
+
+# --- Clés ------------------------------------------------------------------
+
+def key_by_ip():
+    return f"ip:{request.remote_addr or 'unknown'}"
+
+
+def key_by_user():
+    """Utilisateur du jeton JWT s'il est valide, sinon l'adresse IP"""
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        try:
+            return f"user:{decode_token(header[7:])['sub']}"
+        except Exception:
+            pass
+    return key_by_ip()
+
+
+# --- Décorateurs -----------------------------------------------------------
+
+def limit(spec, key_func=key_by_ip, scope=None):
+    """Limite propre à une route (remplace la limite par défaut).
+
+    `spec` est une chaîne ("5 per minute") ou le nom d'un réglage de Config.
+    `scope` partage un seau entre plusieurs routes.
+    """
+
+    def decorator(view):
+        view._rate_limits = getattr(view, "_rate_limits", []) + [(spec, key_func, scope)]
+        return view
+
+    return decorator
+
+
+def exempt(view):
+    view._rate_limit_exempt = True
+    return view
+
+
+# --- Application -----------------------------------------------------------
+
+_parsed = {}
+
+
+def _limits_for(spec):
+    """Limites d'une chaîne, ou du réglage `spec` de app.config"""
+    spec = current_app.config.get(spec, getattr(Config, spec, spec)) if spec.isupper() else spec
+    if spec not in _parsed:
+        _parsed[spec] = parse_limits(spec)
+    return _parsed[spec]
+
+
+def _route_limits(view, endpoint):
+    """[(clé du seau, Limit)] applicables à la requête courante"""
+    rules = getattr(view, "_rate_limits", None) or [("RATELIMIT_DEFAULT", key_by_user, None)]
+    buckets = []
+    for spec, key_func, scope in rules:
+        client = key_func()
+        for bucket_limit in _limits_for(spec):
+            buckets.append((f"{scope or endpoint}:{bucket_limit.spec}:{client}", bucket_limit))
+    return buckets
+
+
+def check_request(store):
+    """Décision la plus restrictive pour la requête courante, ou None si non limitée"""
+    endpoint = request.endpoint
+    if request.method == "OPTIONS" or endpoint is None or endpoint in EXEMPT_ENDPOINTS:
+        return None
+    view = current_app.view_functions.get(endpoint)
+    if view is None or getattr(view, "_rate_limit_exempt", False):
+        return None
+
+    decision, spent = None, []
+    try:
+        for key, bucket_limit in _route_limits(view, endpoint):
+            result = store.hit(key, bucket_limit)
+            if not result.allowed:
+                # Refusée : rendre les jetons déjà pris dans les autres seaux
+                for spent_key, spent_limit in spent:
+                    store.hit(spent_key, spent_limit, cost=-1)
+                return result
+            spent.append((key, bucket_limit))
+            if decision is None or result.remaining < decision.remaining:
+                decision = result
+    except PyMongoError as ex:
+        logger.warning("⚠️ Rate limit store unavailable, request allowed: %s", ex)
+        return None
+    return decision
+
+
+def register_rate_limiting(app):
+    """Appliquer les limites avant chaque requête"""
+    if not app.config.get("RATELIMIT_ENABLED", Config.RATELIMIT_ENABLED):
+        return
+    store = create_store(app.config.get("RATELIMIT_STORAGE_URL", Config.RATELIMIT_STORAGE_URL))
+    with app.app_context():
+        _limits_for("RATELIMIT_DEFAULT")  # configuration invalide : erreur au démarrage
+
+    @app.before_request
+    def enforce_rate_limit():
+        decision = check_request(store)
+        if decision is None:
+            return None
+        g.rate_limit = decision
+        if not decision.allowed:
+            rate_limited.inc(endpoint=request.endpoint)
+            response = jsonify({"error": "Trop de requêtes, réessayez plus tard"})
+            response.status_code = 429
+            response.headers["Retry-After"] = str(decision.retry_after)
+            return response
+        return None
+
+    @app.after_request
+    def add_rate_limit_headers(response):
+        decision = g.pop("rate_limit", None)
+        if decision is not None:
+            response.headers["X-RateLimit-Limit"] = str(decision.limit)
+            response.headers["X-RateLimit-Remaining"] = str(decision.remaining)
+            response.headers["X-RateLimit-Reset"] = str(decision.reset)
+        return response
@@ -1,12 +1,16 @@
+import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
+from ..auth.passwords import PasswordServiceBusy, verify_password
 from ..extensions import get_collection
+from ..ratelimit import limit
 from bson import ObjectId
 
 auth_bp = Blueprint('auth', __name__)
+logger = logging.getLogger(__name__)
 
 @auth_bp.route('/login', methods=['POST'])
+@limit('RATELIMIT_LOGIN', scope='login')
 def login():
     data = request.get_json()
     email = data.get('email')
@@ -18,7 +22,7 @@ def login():
     users = get_collection('users')
     user = users.find_one({'email': email})
     
-    if not user or not check_password_hash(user['password'], password):
+    if not user or not verify_password(password, user.get('password') or user.get('password_hash')):
         return jsonify({'message': 'Email ou mot de passe incorrect'}), 401
     
     access_token = create_access_token(identity=str(user['_id']))
@@ -46,7 +50,7 @@ def register():
     last_name = data.get('last_name', '')
     role = data.get('role', 'patient')
     
-    print(f"📝 Tentative d'inscription: {email} - {role}")
+    logger.debug("📝 Tentative d'inscription (rôle %s)", role)
     
     if not email or not password:
         return jsonify({'error': 'Email et mot de passe requis'}), 400
@@ -100,7 +104,7 @@ def register():
             "redirect_path": redirect_path
         }
         
-        print(f"✅ Inscription réussie pour {email}")
+        logger.info("✅ Inscription réussie pour %s", user._id)
         
         return jsonify({
             "message": "Inscription réussie",
@@ -111,10 +115,12 @@ def register():
         }), 201
         
     except ValueError as e:
-        print(f"❌ Erreur inscription: {e}")
+        logger.warning("❌ Erreur inscription: %s", e)
         return jsonify({"error": str(e)}), 400
+    except PasswordServiceBusy:
+        raise
     except Exception as e:
-        print(f"❌ Erreur interne inscription: {e}")
+        logger.exception("❌ Erreur interne inscription: %s", e)
         return jsonify({"error": "Une erreur est survenue lors de l'inscription"}), 500
 
 @auth_bp.route('/profile', methods=['GET'])
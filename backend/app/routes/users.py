@@ -2,6 +2,10 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..extensions import get_collection
 from bson import ObjectId
+from ..config import Config
+from ..data.listings import MAX_PER_PAGE
+from ..data.search_index import ENTITY_COLLECTIONS, index_documents, search
+from ..utils.streaming import list_response
 
 users_bp = Blueprint('users', __name__)
 
@@ -41,6 +45,7 @@ def update_profile():
         return jsonify({'message': 'Utilisateur non trouvé'}), 404
     
     user = users.find_one({'_id': ObjectId(current_user_id)})
+    index_documents('user', [user])
     return jsonify({
         'message': 'Profil mis à jour avec succès',
         'user': {
@@ -55,20 +60,22 @@ def update_profile():
 @jwt_required()
 def get_all_users():
     users = get_collection('users')
-    users_list = []
-    
-    for user in users.find():
-        users_list.append({
+    cursor = users.find({}, {'email': 1, 'role': 1, 'name': 1}).batch_size(Config.STREAM_BATCH_SIZE)
+    users_list = (
+        {
             '_id': str(user['_id']),
             'email': user['email'],
             'role': user['role'],
             'name': user.get('name', '')
-        })
+        }
+        for user in cursor
+    )
     
-    return jsonify({
-        'message': 'Liste des utilisateurs récupérée avec succès',
-        'users': users_list
-    })
+    return list_response(
+        users_list,
+        key='users',
+        extra={'message': 'Liste des utilisateurs récupérée avec succès'}
+    )
 
 @users_bp.route('/<user_id>', methods=['GET'])
 @jwt_required()
@@ -119,6 +126,7 @@ def update_role(user_id):
         return jsonify({'message': 'Utilisateur non trouvé'}), 404
     
     user = users.find_one({'_id': ObjectId(user_id)})
+    index_documents('user', [user])
     return jsonify({
         'message': 'Rôle mis à jour avec succès',
         'user': {
@@ -132,24 +140,24 @@ def update_role(user_id):
 @users_bp.route('/search', methods=['GET'])
 @jwt_required()
 def search_users():
+    """Recherche indexée (préfixe + approchée), classée et paginée.
+
+    Paramètres : query, entity (user, patient ou doctor ; user par défaut),
+    page, per_page.
+    """
     query = request.args.get('query', '')
-    users = get_collection('users')
-    users_list = []
-    
-    for user in users.find({
-        '$or': [
-            {'email': {'$regex': query, '$options': 'i'}},
-            {'name': {'$regex': query, '$options': 'i'}}
-        ]
-    }):
-        users_list.append({
-            '_id': str(user['_id']),
-            'email': user['email'],
-            'role': user['role'],
-            'name': user.get('name', '')
-        })
-    
+    entity = request.args.get('entity', 'user')
+    if entity not in ENTITY_COLLECTIONS:
+        return jsonify({'message': f'Entité invalide. Entités: {list(ENTITY_COLLECTIONS)}'}), 400
+    page = max(int(request.args.get('page', 1)), 1)
+    per_page = min(max(int(request.args.get('per_page', 20)), 1), MAX_PER_PAGE)
+
+    found = search(query, entities=[entity], page=page, per_page=per_page)
+
     return jsonify({
         'message': 'Recherche effectuée avec succès',
-        'users': users_list
-    }) 
\ No newline at end of file
+        'users': found['results'],
+        'total': found['total'],
+        'page': page,
+        'per_page': per_page
+    })
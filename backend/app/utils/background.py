@@ -0,0 +1,60 @@
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicWorker:
+    """Thread démon exécutant `target()` toutes les `interval` secondes.
+
+    Le thread est démarré à la demande (`ensure_started`) et relancé dans un
+    processus forké : un thread créé avant le fork (gunicorn --preload)
+    n'existe pas dans les workers.
+    """
+
+    def __init__(self, name, target, interval):
+        self.name = name
+        self.target = target
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._pid = None
+
+    def ensure_started(self):
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stopped = False
+            self._wakeup = threading.Event()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def wake(self):
+        """Déclencher la prochaine exécution sans attendre l'intervalle"""
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stopped = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped:
+                return
+            try:
+                self.target()
+            except Exception as ex:
+                logger.error("❌ %s failed: %s", self.name, ex)
@@ -0,0 +1,172 @@
+"""
+Mesure des appels MongoDB et Neo4j.
+
+- MongoDB : `MongoCommandTimer`, un `CommandListener` enregistré sur le
+  client partagé ; pymongo l'appelle dans le thread qui exécute la commande.
+- Neo4j : le pilote n'a pas d'API d'écoute ; `instrument_driver` enveloppe
+  le driver pour que les sessions et transactions qu'il ouvre mesurent
+  chaque `run` (envoi de la requête jusqu'à la réponse du serveur ; la
+  lecture des enregistrements reste comptée dans le temps du handler).
+
+Chaque appel est compté dans les métriques du processus et, pendant une
+requête HTTP (`start_request`/`finish_request`), dans les totaux de la
+requête. Les fonctions de `query_hooks` reçoivent chaque appel terminé.
+"""
+import threading
+import time
+
+from pymongo import monitoring
+
+from .metrics import registry
+
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds",
+    "Duration of MongoDB commands and Cypher queries",
+    ["db", "operation"],
+)
+db_query_errors = registry.counter(
+    "db_query_errors_total", "Failed MongoDB commands and Cypher queries", ["db", "operation"]
+)
+
+# Appelées avec (db, opération, durée en secondes, détails) après chaque appel
+query_hooks = []
+
+_local = threading.local()
+
+
+def start_request():
+    _local.stats = {"mongodb": [0, 0.0], "neo4j": [0, 0.0]}
+
+
+def finish_request():
+    """Totaux de la requête terminée : {db: (appels, secondes)}"""
+    stats = getattr(_local, "stats", None)
+    _local.stats = None
+    return {db: tuple(values) for db, values in (stats or {}).items()}
+
+
+def current_request_stats():
+    return getattr(_local, "stats", None)
+
+
+def record_query(db, operation, duration, failed=False, **details):
+    db_query_duration.observe(duration, db=db, operation=operation)
+    if failed:
+        db_query_errors.inc(db=db, operation=operation)
+    stats = getattr(_local, "stats", None)
+    if stats is not None:
+        stats[db][0] += 1
+        stats[db][1] += duration
+    for hook in query_hooks:
+        hook(db, operation, duration, details)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Durée de chaque commande MongoDB"""
+
+    def __init__(self):
+        self._started = threading.local()
+
+    def _pending(self):
+        pending = getattr(self._started, "commands", None)
+        if pending is None:
+            pending = self._started.commands = {}
+        return pending
+
+    def started(self, event):
+        if query_hooks:
+            # La commande complète n'est disponible qu'au démarrage
+            self._pending()[event.request_id] = (event.database_name, event.command)
+
+    def _finish(self, event, failed):
+        database, command = self._pending().pop(event.request_id, (event.database_name, None))
+        record_query(
+            "mongodb",
+            event.command_name,
+            event.duration_micros / 1e6,
+            failed=failed,
+            database=database,
+            command=command,
+        )
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+mongo_command_timer = MongoCommandTimer()
+
+
+def _timed_run(target, query, parameters, kwargs):
+    started = time.perf_counter()
+    failed = False
+    try:
+        return target.run(query, parameters, **kwargs)
+    except Exception:
+        failed = True
+        raise
+    finally:
+        record_query(
+            "neo4j",
+            "run",
+            time.perf_counter() - started,
+            failed=failed,
+            query=query,
+            parameters=dict(parameters or {}, **kwargs),
+        )
+
+
+class _Proxy:
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __enter__(self):
+        self._target.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._target.__exit__(*exc)
+
+
+class InstrumentedTransaction(_Proxy):
+    def run(self, query, parameters=None, **kwargs):
+        return _timed_run(self._target, query, parameters, kwargs)
+
+
+class InstrumentedSession(_Proxy):
+    def run(self, query, parameters=None, **kwargs):
+        return _timed_run(self._target, query, parameters, kwargs)
+
+    def begin_transaction(self, *args, **kwargs):
+        return InstrumentedTransaction(self._target.begin_transaction(*args, **kwargs))
+
+    def _wrap_work(self, method, work, args, kwargs):
+        return getattr(self._target, method)(
+            lambda tx, *a, **k: work(InstrumentedTransaction(tx), *a, **k), *args, **kwargs
+        )
+
+    def read_transaction(self, work, *args, **kwargs):
+        return self._wrap_work("read_transaction", work, args, kwargs)
+
+    def write_transaction(self, work, *args, **kwargs):
+        return self._wrap_work("write_transaction", work, args, kwargs)
+
+    def execute_read(self, work, *args, **kwargs):
+        return self._wrap_work("execute_read", work, args, kwargs)
+
+    def execute_write(self, work, *args, **kwargs):
+        return self._wrap_work("execute_write", work, args, kwargs)
+
+
+class InstrumentedDriver(_Proxy):
+    def session(self, *args, **kwargs):
+        return InstrumentedSession(self._target.session(*args, **kwargs))
+
+
+def instrument_driver(driver):
+    return InstrumentedDriver(driver)
@@ -1,23 +1,8 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import os
+from ..data.mail_queue import enqueue_mail
 
 class EmailService:
-    def __init__(self):
-        self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-        self.smtp_port = int(os.getenv('SMTP_PORT', 587))
-        self.smtp_username = os.getenv('SMTP_USERNAME')
-        self.smtp_password = os.getenv('SMTP_PASSWORD')
-        self.from_email = os.getenv('MAIL_FROM', 'noreply@cabinetmedical.com')
-
     def send_auth_code(self, to_email, code):
-        """Envoyer le code d'authentification par email"""
-        msg = MIMEMultipart()
-        msg['From'] = self.from_email
-        msg['To'] = to_email
-        msg['Subject'] = "Votre code d'authentification"
-
+        """Mettre en file l'envoi du code d'authentification par email"""
         body = f"""
         Bonjour,
         
@@ -32,14 +17,8 @@ class EmailService:
         L'équipe du Cabinet Médical
         """
         
-        msg.attach(MIMEText(body, 'plain'))
-
         try:
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.smtp_username, self.smtp_password)
-            server.send_message(msg)
-            server.quit()
+            enqueue_mail(to_email, "Votre code d'authentification", body, kind="auth_code")
             return True, "Code envoyé avec succès"
         except Exception as e:
             return False, f"Erreur lors de l'envoi du code: {str(e)}"
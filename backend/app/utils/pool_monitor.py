@@ -0,0 +1,105 @@
+import threading
+
+from pymongo import monitoring
+
+
+class MongoPoolMonitor(monitoring.ConnectionPoolListener):
+    """Occupation du pool MongoDB, par serveur, à partir des événements CMAP.
+
+    Enregistré sur le client partagé (`event_listeners`) : connexions
+    ouvertes, empruntées, demandes en attente d'une connexion et échecs
+    d'emprunt (pool saturé ou serveur injoignable).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._servers = {}
+
+    def _server(self, address):
+        return self._servers.setdefault(
+            "%s:%s" % address,
+            {"open": 0, "checked_out": 0, "waiting": 0, "checkout_failures": 0, "cleared": 0},
+        )
+
+    def _update(self, address, **deltas):
+        with self._lock:
+            server = self._server(address)
+            for key, delta in deltas.items():
+                server[key] = max(0, server[key] + delta)
+
+    def pool_created(self, event):
+        with self._lock:
+            self._server(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._servers.pop("%s:%s" % event.address, None)
+
+    def connection_created(self, event):
+        self._update(event.address, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._update(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, waiting=-1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, checked_out=-1)
+
+    def snapshot(self, max_pool_size=None):
+        with self._lock:
+            servers = {address: dict(stats) for address, stats in self._servers.items()}
+        in_use = max((stats["checked_out"] for stats in servers.values()), default=0)
+        return {
+            "max_pool_size": max_pool_size,
+            # Serveur le plus chargé (les écritures vont toutes au primaire)
+            "utilization": round(in_use / max_pool_size, 3) if max_pool_size else None,
+            "servers": servers,
+        }
+
+
+class SessionCounter:
+    """Sessions Neo4j empruntées et pas encore rendues"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def acquired(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def released(self):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def reset(self):
+        with self._lock:
+            self.in_flight = 0
+            self.peak = 0
+
+
+mongo_pool_monitor = MongoPoolMonitor()
+neo4j_sessions = SessionCounter()
@@ -0,0 +1,118 @@
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPPool:
+    """Connexions SMTP persistantes et réutilisées.
+
+    Une connexion (EHLO, STARTTLS, login) est ouverte à la première demande
+    puis rendue au pool après usage ; au plus `size` connexions existent.
+    Une connexion restée inactive plus de `idle_timeout` secondes est
+    vérifiée par NOOP avant réutilisation, et remplacée si le serveur l'a
+    fermée. Le pool est recréé dans un processus forké.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_tls=True,
+                 size=2, timeout=10, idle_timeout=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = None
+        self._slots = None
+        self._pid = None
+        self.stats = {"opened": 0, "reused": 0, "discarded": 0}
+
+    def _ensure_process(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._idle = queue.LifoQueue()
+                    self._slots = threading.BoundedSemaphore(self.size)
+                    self._pid = os.getpid()
+
+    def _open(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        server.ehlo()
+        if self.use_tls and server.has_extn("starttls"):
+            server.starttls()
+            server.ehlo()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        self.stats["opened"] += 1
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def _alive(self, server, last_used):
+        if time.monotonic() - last_used < self.idle_timeout:
+            return True
+        try:
+            return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    @contextmanager
+    def connection(self):
+        """Emprunter une connexion ; elle est abandonnée si l'envoi échoue"""
+        self._ensure_process()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise smtplib.SMTPException("Aucune connexion SMTP disponible")
+        server = None
+        try:
+            while server is None:
+                try:
+                    candidate, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    server = self._open()
+                    break
+                if self._alive(candidate, last_used):
+                    server = candidate
+                    self.stats["reused"] += 1
+                else:
+                    self.stats["discarded"] += 1
+                    self._close(candidate)
+            yield server
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError):
+            # État de session incertain : ne pas remettre la connexion au pool
+            if server is not None:
+                self.stats["discarded"] += 1
+                self._close(server)
+                server = None
+            raise
+        finally:
+            if server is not None:
+                self._idle.put((server, time.monotonic()))
+            self._slots.release()
+
+    def close(self):
+        """Fermer les connexions inactives"""
+        self._ensure_process()
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+    @property
+    def metrics(self):
+        self._ensure_process()
+        return {**self.stats, "idle": self._idle.qsize(), "size": self.size}
@@ -0,0 +1,155 @@
+"""
+Serveur SMTP local minimal pour les tests et le développement hors ligne.
+
+Il accepte toute authentification, ne propose pas STARTTLS et garde les
+messages reçus en mémoire (`messages`) au lieu de les livrer :
+
+    stub = SMTPStub(port=0).start()
+    smtp_pool.host, smtp_pool.port = stub.host, stub.port  # data/mail_queue.py
+    ...
+    stub.stop()
+
+Ou en ligne de commande (messages affichés sur la sortie standard) :
+
+    python -m app.utils.smtp_stub --port 1025
+
+`reject` (ensemble d'adresses) fait refuser les destinataires avec un 550,
+`fail_next` fait échouer les N prochains DATA avec un 451.
+"""
+import argparse
+import email
+import socketserver
+import threading
+from email.policy import default as default_policy
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        stub = self.server.stub
+        with stub._lock:
+            stub.sessions += 1
+        self.reply("220 smtp-stub ready")
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode("utf-8", "replace").strip().partition(" ")
+            command = command.upper()
+
+            if command == "EHLO":
+                self.reply("250-smtp-stub")
+                self.reply("250-AUTH PLAIN LOGIN")
+                self.reply("250 8BITMIME")
+            elif command == "HELO":
+                self.reply("250 smtp-stub")
+            elif command == "AUTH":
+                if argument.upper().startswith("LOGIN"):
+                    self.reply("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                self.reply("235 Authentication successful")
+            elif command == "MAIL":
+                sender, recipients = argument.split(":", 1)[1].strip(" <>"), []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                address = argument.split(":", 1)[1].strip(" <>")
+                if address in stub.reject:
+                    self.reply("550 Mailbox unavailable")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data[1:] if data.startswith(b"..") else data)
+                if stub.consume_failure():
+                    self.reply("451 Temporary failure")
+                else:
+                    stub.store(sender, recipients, b"".join(lines))
+                    self.reply("250 OK queued")
+                sender, recipients = None, []
+            elif command == "RSET":
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif command == "NOOP":
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPStub:
+    """Serveur SMTP de test dans un thread de fond"""
+
+    def __init__(self, host="127.0.0.1", port=0, on_message=None):
+        self.messages = []
+        self.sessions = 0
+        self.reject = set()
+        self.fail_next = 0
+        self.on_message = on_message
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _SMTPHandler)
+        self._server.stub = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    def store(self, sender, recipients, data):
+        message = {
+            "from": sender,
+            "to": recipients,
+            "message": email.message_from_bytes(data, policy=default_policy),
+        }
+        with self._lock:
+            self.messages.append(message)
+        if self.on_message:
+            self.on_message(message)
+
+    def consume_failure(self):
+        with self._lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return True
+            return False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur SMTP local de test")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+
+    def show(message):
+        print(f"--- {message['from']} -> {', '.join(message['to'])}")
+        print(message["message"].as_string())
+
+    stub = SMTPStub(args.host, args.port, on_message=show)
+    print(f"SMTP stub listening on {stub.host}:{stub.port}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
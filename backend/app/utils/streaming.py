@@ -0,0 +1,113 @@
+import json
+
+from flask import Response, jsonify, request, stream_with_context
+
+from ..config import Config
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def _default(value):
+    # ObjectId, datetime et types temporels Neo4j
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def ndjson_lines(rows):
+    """Sérialiser un itérable de dicts, une ligne JSON par élément"""
+    for row in rows:
+        yield json.dumps(row, default=_default, ensure_ascii=False) + "\n"
+
+
+def _dumps(value):
+    return json.dumps(value, default=_default, ensure_ascii=False)
+
+
+def _buffered(parts, size=None):
+    """Regrouper les fragments pour écrire sur la socket par blocs"""
+    size = size or Config.STREAM_CHUNK_BYTES
+    buffer, length = [], 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def ndjson_response(rows, filename=None):
+    """Réponse NDJSON diffusée au fil de l'itérable (mémoire constante)"""
+    headers = {}
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return Response(
+        stream_with_context(_buffered(ndjson_lines(rows))),
+        mimetype=NDJSON_MIMETYPE,
+        headers=headers,
+    )
+
+
+def streaming_format():
+    """Mode de diffusion demandé : "ndjson", "json" ou None (réponse classique).
+
+    `Accept: application/x-ndjson` donne une ligne par élément ; `?stream=1`
+    garde la forme JSON habituelle de la réponse, écrite au fil du curseur.
+    """
+    if any(mimetype == NDJSON_MIMETYPE for mimetype, _ in request.accept_mimetypes):
+        return "ndjson"
+    if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+        return "json"
+    return None
+
+
+def _json_document(items, key, extra):
+    count = 0
+    yield f"{{{_dumps(key)}: [" if key else "["
+    for item in items:
+        yield ("," if count else "") + _dumps(item)
+        count += 1
+    yield "]"
+    if key:
+        # Champs calculés après la liste (ex. total = nombre d'éléments émis)
+        for name, value in (extra(count) if callable(extra) else extra or {}).items():
+            yield f", {_dumps(name)}: {_dumps(value)}"
+        yield "}"
+
+
+def list_response(items, key=None, extra=None, status=200):
+    """Réponse d'une liste, diffusée si le client l'a demandé.
+
+    `items` est un itérable (idéalement un générateur sur un curseur) ;
+    `key` nomme la liste dans l'objet de réponse (sinon tableau nu) et
+    `extra` (dict, ou callable recevant le nombre d'éléments) complète
+    l'objet.
+    """
+    mode = streaming_format()
+    if mode == "ndjson":
+        return ndjson_response(items)
+    if mode == "json":
+        return Response(
+            stream_with_context(_buffered(_json_document(items, key, extra))),
+            status=status,
+            mimetype="application/json",
+        )
+
+    items = list(items)
+    if not key:
+        return jsonify(items), status
+    body = {key: items}
+    body.update(extra(len(items)) if callable(extra) else extra or {})
+    return jsonify(body), status
+
+
+def iter_ndjson(stream):
+    """Lire un corps NDJSON ligne par ligne : (numéro de ligne, objet ou exception)"""
+    for line_number, raw in enumerate(stream, start=1):
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as ex:
+            yield line_number, ex
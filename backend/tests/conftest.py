@@ -0,0 +1,112 @@
+"""
+Fixtures partagées : application créée avec TestConfig sur des pools
+MongoDB et Neo4j simulés (aucune base n'est contactée).
+"""
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app import create_app, extensions
+from app.config import TestConfig
+
+
+def _run_work(tx):
+    """read_transaction/write_transaction simulés : la fonction reçoit `tx`"""
+    return lambda work, *args, **kwargs: work(tx, *args, **kwargs)
+
+
+@pytest.fixture
+def neo4j_tx():
+    tx = mock.MagicMock(name="neo4j_tx")
+    result = tx.run.return_value
+    result.single.return_value = {"total": 0}
+    result.__iter__.side_effect = lambda: iter([])
+    return tx
+
+
+@pytest.fixture
+def neo4j_session(neo4j_tx):
+    session = mock.MagicMock(name="neo4j_session")
+    session.__enter__.return_value = session
+    session.read_transaction.side_effect = _run_work(neo4j_tx)
+    session.write_transaction.side_effect = _run_work(neo4j_tx)
+    return session
+
+
+@pytest.fixture
+def neo4j_driver(neo4j_session):
+    driver = mock.MagicMock(name="neo4j_driver")
+    driver.session.return_value = neo4j_session
+    return driver
+
+
+@pytest.fixture
+def mongo_client():
+    return mock.MagicMock(name="mongo_client")
+
+
+@pytest.fixture
+def graph_database(neo4j_driver):
+    with mock.patch.object(extensions.GraphDatabase, "driver", return_value=neo4j_driver) as factory:
+        yield factory
+
+
+@contextmanager
+def _test_app(mongo_client, config_class=TestConfig):
+    # Registre vide : les pools sont recréés (simulés) pour chaque test
+    extensions._registry_pid = None
+    with mock.patch.object(extensions, "MongoClient", return_value=mongo_client):
+        yield create_app(config_class)
+    extensions._registry_pid = None
+
+
+def _headers_factory(app):
+    def make(user_id="64b000000000000000000001", role="admin"):
+        with app.app_context():
+            token = create_access_token(identity=user_id, additional_claims={"role": role})
+        return {"Authorization": f"Bearer {token}"}
+
+    return make
+
+
+@pytest.fixture
+def app(mongo_client, graph_database):
+    with _test_app(mongo_client) as app:
+        yield app
+
+
+@pytest.fixture
+def isolated_app(mongo_client, graph_database):
+    """Application sans contexte actif pendant le test.
+
+    pytest-flask pousse un contexte de requête autour de tout test qui utilise
+    `app` : les requêtes du client réutilisent alors ce contexte et
+    `teardown_appcontext` ne s'exécute pas après chacune d'elles. Les tests
+    du cycle de vie des sessions utilisent cette fixture à la place.
+    """
+    with _test_app(mongo_client) as app:
+        yield app
+
+
+@pytest.fixture
+def app_factory(mongo_client, graph_database):
+    """create_app avec une autre configuration (dérivée de TestConfig)"""
+    with ExitStack() as stack:
+        yield lambda config_class: stack.enter_context(_test_app(mongo_client, config_class))
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(app):
+    return _headers_factory(app)
+
+
+@pytest.fixture
+def isolated_auth_headers(isolated_app):
+    return _headers_factory(isolated_app)
@@ -0,0 +1,82 @@
+"""
+Création groupée de consultations : le lot est écrit en une transaction, et
+une seule consultation invalide rejette tout le lot avec l'index de chaque
+erreur.
+"""
+from unittest import mock
+
+import pytest
+
+from app.config import Config
+from app.consultation import routes as consultation_routes
+
+PATIENT_ID = "64b0000000000000000000a1"
+DOCTOR_ID = "64b0000000000000000000d1"
+
+
+def _consultation(**overrides):
+    consultation = {
+        "patient_id": PATIENT_ID,
+        "doctor_id": DOCTOR_ID,
+        "date": "2024-05-01T10:00:00",
+        "motif": "Contrôle",
+        "diagnostic": "RAS",
+        "traitement": "Aucun",
+    }
+    consultation.update(overrides)
+    return consultation
+
+
+@pytest.fixture
+def create_consultations():
+    def create(session, rows):
+        return [row["props"]["consultation_id"] for row in rows]
+
+    with mock.patch.object(consultation_routes, "create_consultations", side_effect=create) as create_mock:
+        yield create_mock
+
+
+def test_bulk_creates_all_rows_in_one_call(client, auth_headers, create_consultations):
+    body = {"consultations": [_consultation(), _consultation(motif="Suivi")]}
+
+    response = client.post("/api/consultations/bulk", json=body, headers=auth_headers(role="doctor"))
+
+    assert response.status_code == 201
+    create_consultations.assert_called_once()
+    rows = create_consultations.call_args.args[1]
+    assert [row["props"]["motif"] for row in rows] == ["Contrôle", "Suivi"]
+    assert rows[0]["props"]["created_by"] == "64b000000000000000000001"
+    assert response.get_json()["consultation_ids"] == [row["props"]["consultation_id"] for row in rows]
+
+
+def test_bulk_reports_every_invalid_index_and_creates_nothing(client, auth_headers, create_consultations):
+    body = [
+        _consultation(),
+        _consultation(motif=42),
+        _consultation(patient_id="not-an-id"),
+        {"patient_id": PATIENT_ID},
+    ]
+
+    response = client.post("/api/consultations/bulk", json=body, headers=auth_headers())
+
+    assert response.status_code == 400
+    errors = response.get_json()["errors"]
+    assert [error["index"] for error in errors] == [1, 2, 3]
+    assert errors[0]["message"] == "Types de données invalides"
+    assert errors[2]["message"].startswith("Données manquantes ou invalides")
+    create_consultations.assert_not_called()
+
+
+def test_bulk_rejects_oversized_batches(client, auth_headers, create_consultations):
+    with mock.patch.object(Config, "CONSULTATION_BULK_MAX", 2):
+        response = client.post("/api/consultations/bulk", json=[_consultation()] * 3, headers=auth_headers())
+
+    assert response.status_code == 400
+    create_consultations.assert_not_called()
+
+
+def test_bulk_is_forbidden_to_patients(client, auth_headers, create_consultations):
+    response = client.post("/api/consultations/bulk", json=[_consultation()], headers=auth_headers(role="patient"))
+
+    assert response.status_code == 403
+    create_consultations.assert_not_called()
@@ -0,0 +1,145 @@
+"""
+Import et export NDJSON des consultations : rapport d'erreurs par numéro de
+ligne, écriture par lots de CONSULTATION_IMPORT_BATCH_SIZE (un lot en échec
+est rejeté en entier, les autres sont conservés) et export diffusé une
+consultation par ligne.
+"""
+import json
+from datetime import datetime
+from unittest import mock
+
+import pytest
+from neo4j.exceptions import Neo4jError
+
+from app.config import Config
+from app.consultation import routes as consultation_routes
+
+PATIENT_ID = "64b0000000000000000000a1"
+DOCTOR_ID = "64b0000000000000000000d1"
+
+
+class ConstraintFailed(Neo4jError):
+    message = "Constraint failed"
+
+
+def _line(**overrides):
+    consultation = {
+        "patient_id": PATIENT_ID,
+        "doctor_id": DOCTOR_ID,
+        "date": "2024-05-01T10:00:00",
+        "motif": "Contrôle",
+        "diagnostic": "RAS",
+        "traitement": "Aucun",
+    }
+    consultation.update(overrides)
+    return json.dumps(consultation)
+
+
+@pytest.fixture
+def create_consultations():
+    with mock.patch.object(consultation_routes, "create_consultations") as create_mock, \
+         mock.patch.object(Config, "CONSULTATION_IMPORT_BATCH_SIZE", 2):
+        yield create_mock
+
+
+def _import(client, auth_headers, lines):
+    return client.post(
+        "/api/consultations/import",
+        data="\n".join(lines) + "\n",
+        content_type="application/x-ndjson",
+        headers=auth_headers(),
+    )
+
+
+def test_import_flushes_full_batches_and_the_remainder(client, auth_headers, create_consultations):
+    lines = [_line(motif=f"Motif {i}") for i in range(5)]
+
+    response = _import(client, auth_headers, lines)
+
+    assert response.status_code == 201
+    assert response.get_json() == {"imported": 5, "rejected": 0, "batches": 3, "errors": []}
+    batches = [[row["props"]["motif"] for row in call.args[1]] for call in create_consultations.call_args_list]
+    assert batches == [["Motif 0", "Motif 1"], ["Motif 2", "Motif 3"], ["Motif 4"]]
+
+
+def test_import_reports_rejected_lines_by_number(client, auth_headers, create_consultations):
+    lines = [
+        _line(consultation_id="c-0001"),
+        "{pas du json",
+        "",
+        _line(motif=42),
+        _line(patient_id="not-an-id"),
+        _line(),
+    ]
+
+    response = _import(client, auth_headers, lines)
+
+    report = response.get_json()
+    assert response.status_code == 201
+    assert report["imported"] == 2 and report["rejected"] == 3
+    assert [error["line"] for error in report["errors"]] == [2, 4, 5]
+    assert report["errors"][0]["message"].startswith("JSON invalide")
+    assert report["errors"][1]["message"] == "Types de données invalides"
+    assert report["errors"][2]["message"].startswith("Données manquantes ou invalides")
+    # Un consultation_id fourni (reprise d'un export) est conservé
+    rows = create_consultations.call_args.args[1]
+    assert rows[0]["props"]["consultation_id"] == "c-0001"
+
+
+def test_failed_batch_is_rejected_whole(client, auth_headers, create_consultations):
+    create_consultations.side_effect = [None, ConstraintFailed(), None]
+
+    response = _import(client, auth_headers, [_line() for _ in range(5)])
+
+    report = response.get_json()
+    assert response.status_code == 201
+    assert report["imported"] == 3 and report["rejected"] == 2 and report["batches"] == 3
+    assert report["errors"] == [
+        {"line": 3, "message": "Lot rejeté: Constraint failed"},
+        {"line": 4, "message": "Lot rejeté: Constraint failed"},
+    ]
+
+
+def test_import_with_nothing_valid_returns_400(client, auth_headers, create_consultations):
+    response = _import(client, auth_headers, ["[1, 2", _line(date="hier")])
+
+    assert response.status_code == 400
+    assert response.get_json()["rejected"] == 2
+    create_consultations.assert_not_called()
+
+
+def test_reported_errors_are_capped(client, auth_headers, create_consultations):
+    with mock.patch.object(consultation_routes, "MAX_REPORTED_ERRORS", 3):
+        response = _import(client, auth_headers, ["{"] * 10)
+
+    report = response.get_json()
+    assert report["rejected"] == 10
+    assert [error["line"] for error in report["errors"]] == [1, 2, 3]
+
+
+def test_export_streams_one_consultation_per_line(client, auth_headers):
+    rows = [
+        {"consultation_id": f"c-{i}", "patient_id": PATIENT_ID, "doctor_id": DOCTOR_ID,
+         "date": datetime(2024, 5, i + 1, 10, 0), "motif": "Contrôle"}
+        for i in range(3)
+    ]
+    with mock.patch.object(consultation_routes, "export_consultations", return_value=iter(rows)) as export, \
+         mock.patch.object(Config, "STREAM_CHUNK_BYTES", 1):
+        response = client.get(
+            f"/api/consultations/export?patient_id={PATIENT_ID}&since=2024-01-01", headers=auth_headers()
+        )
+        body = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert 'filename="consultations.ndjson"' in response.headers["Content-Disposition"]
+    lines = body.splitlines()
+    assert [json.loads(line)["consultation_id"] for line in lines] == ["c-0", "c-1", "c-2"]
+    assert json.loads(lines[0])["date"] == "2024-05-01T10:00:00"
+    assert export.call_args.kwargs == {"patient_id": PATIENT_ID, "doctor_id": None, "since": "2024-01-01"}
+
+
+def test_export_is_admin_only(client, auth_headers):
+    response = client.get("/api/consultations/export", headers=auth_headers(role="doctor"))
+
+    assert response.status_code == 403
@@ -0,0 +1,23 @@
+"""
+Pagination par curseur des consultations : index CONSULTED_BY(date) et
+prédicat de plage sur (date, consultation_id).
+"""
+from app.consultation.routes import _encode_cursor
+
+
+def test_date_index_is_created(app, neo4j_session):
+    statements = [call.args[0] for call in neo4j_session.run.call_args_list if call.args]
+    assert any("FOR ()-[r:CONSULTED_BY]-() ON (r.date)" in statement for statement in statements)
+
+
+def test_cursor_page_is_a_date_range(client, auth_headers, neo4j_tx):
+    cursor = _encode_cursor("2024-05-01T10:00:00", "c-0042")
+
+    response = client.get(f"/api/consultations/?cursor={cursor}&per_page=20", headers=auth_headers())
+
+    assert response.status_code == 200
+    query, params = neo4j_tx.run.call_args.args
+    assert "r.date < $cursor_date" in query
+    assert "ORDER BY r.date DESC, r.consultation_id DESC" in query
+    assert params["cursor_date"] == "2024-05-01T10:00:00"
+    assert params["limit"] == 21
@@ -0,0 +1,141 @@
+"""
+Recherche d'une consultation par `consultation_id` : requêtes ancrées sur
+l'index de relation CONSULTED_BY(consultation_id).
+
+Le banc d'essai à 1M de consultations s'exécute seulement si
+NEO4J_BENCHMARK_URI désigne une base Neo4j jetable (NEO4J_BENCHMARK_USER,
+NEO4J_BENCHMARK_PASSWORD) ; il y crée puis supprime ses propres nœuds.
+"""
+import os
+import random
+import statistics
+import time
+from unittest import mock
+
+import pytest
+from neo4j import GraphDatabase
+
+from app import extensions
+from app.data.cypher import MATCH_CONSULTATION_BY_ID
+
+CONSULTATION_ID = "c-0001"
+
+
+def _queries(session):
+    return [call.args[0] for call in session.run.call_args_list if call.args]
+
+
+def test_constraint_on_consultation_id_is_created(app, neo4j_session):
+    statements = _queries(neo4j_session)
+    assert any(
+        "FOR ()-[r:CONSULTED_BY]-() REQUIRE r.consultation_id IS UNIQUE" in statement
+        for statement in statements
+    )
+
+
+@pytest.mark.parametrize(
+    "method, path, role, body",
+    [
+        ("get", f"/api/consultations/{CONSULTATION_ID}", "admin", None),
+        ("put", f"/api/consultations/{CONSULTATION_ID}", "admin", {"status": "completed"}),
+        ("delete", f"/api/consultations/{CONSULTATION_ID}", "admin", None),
+    ],
+)
+def test_lookups_use_consultation_id_anchor(client, auth_headers, neo4j_session, method, path, role, body):
+    neo4j_session.run.reset_mock()
+    neo4j_session.run.return_value.single.return_value = None
+
+    response = getattr(client, method)(path, headers=auth_headers(role=role), json=body)
+
+    assert response.status_code == 404
+    call = neo4j_session.run.call_args
+    assert call.args[0].startswith(MATCH_CONSULTATION_BY_ID)
+    assert call.kwargs["consultation_id"] == CONSULTATION_ID
+
+
+# --- Banc d'essai (base réelle) ---------------------------------------------
+
+BENCHMARK_URI = os.getenv("NEO4J_BENCHMARK_URI")
+SIZES = (10_000, 1_000_000)
+SEED_BATCH = 50_000
+PATIENTS = 1000
+SAMPLES = 200
+
+
+def _seed(session, start, stop):
+    for offset in range(start, stop, SEED_BATCH):
+        session.run(
+            """
+            MATCH (d:Doctor {mongo_id: 'bench-doctor'})
+            UNWIND range($start, $stop - 1) AS i
+            MATCH (p:Patient {mongo_id: 'bench-patient-' + toString(i % $patients)})
+            CREATE (p)-[:CONSULTED_BY {consultation_id: 'bench-' + toString(i),
+                                       date: toString(i), status: 'pending'}]->(d)
+            """,
+            start=offset,
+            stop=min(offset + SEED_BATCH, stop),
+            patients=PATIENTS,
+        ).consume()
+
+
+def _median_lookup(session, size):
+    durations = []
+    for _ in range(SAMPLES):
+        consultation_id = f"bench-{random.randrange(size)}"
+        started = time.perf_counter()
+        record = session.run(
+            MATCH_CONSULTATION_BY_ID + "RETURN r.consultation_id AS id",
+            consultation_id=consultation_id,
+        ).single()
+        durations.append(time.perf_counter() - started)
+        assert record["id"] == consultation_id
+    return statistics.median(durations)
+
+
+def _cleanup(session):
+    while session.run(
+        """
+        MATCH (n) WHERE n.mongo_id STARTS WITH 'bench-'
+        WITH n LIMIT 20 DETACH DELETE n RETURN count(*) AS deleted
+        """
+    ).single()["deleted"]:
+        pass
+
+
+@pytest.mark.skipif(not BENCHMARK_URI, reason="NEO4J_BENCHMARK_URI non défini")
+def test_lookup_time_constant_up_to_1m_consultations():
+    driver = GraphDatabase.driver(
+        BENCHMARK_URI,
+        auth=(os.getenv("NEO4J_BENCHMARK_USER", "neo4j"), os.getenv("NEO4J_BENCHMARK_PASSWORD", "")),
+    )
+    try:
+        with mock.patch.object(extensions, "get_neo4j_driver", return_value=driver):
+            assert extensions.setup_neo4j_constraints()
+        with driver.session() as session:
+            _cleanup(session)
+            session.run(
+                """
+                CREATE (:Doctor {mongo_id: 'bench-doctor'})
+                WITH 1 AS one UNWIND range(0, $patients - 1) AS i
+                CREATE (:Patient {mongo_id: 'bench-patient-' + toString(i)})
+                """,
+                patients=PATIENTS,
+            ).consume()
+
+            plan = session.run(
+                "EXPLAIN " + MATCH_CONSULTATION_BY_ID + "RETURN r", consultation_id="bench-0"
+            ).consume().plan
+            assert "IndexSeek" in str(plan)
+
+            medians, seeded = {}, 0
+            for size in SIZES:
+                _seed(session, seeded, size)
+                seeded = size
+                medians[size] = _median_lookup(session, size)
+            print(f"médiane par recherche : {medians}")
+            # 100x plus de consultations, même ordre de grandeur de latence
+            assert medians[SIZES[-1]] < 3 * medians[SIZES[0]] + 0.002
+    finally:
+        with driver.session() as session:
+            _cleanup(session)
+        driver.close()
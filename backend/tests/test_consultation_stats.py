@@ -0,0 +1,37 @@
+"""
+Statistiques des consultations : `days` est validé (entier entre 1 et
+MAX_STATS_DAYS) et une valeur invalide répond 400, jamais 500.
+"""
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+
+from app.consultation import routes as consultation_routes
+from app.consultation.routes import MAX_STATS_DAYS
+
+
+@pytest.fixture
+def counters():
+    with mock.patch.object(consultation_routes, "ensure_counters"), \
+         mock.patch.object(consultation_routes, "get_counters", return_value=[]) as get_counters, \
+         mock.patch.object(consultation_routes, "fetch_by_ids", return_value={}):
+        yield get_counters
+
+
+@pytest.mark.parametrize("days", ["abc", "1.5", "", "0", "-3", str(MAX_STATS_DAYS + 1)])
+def test_invalid_days_returns_400(client, auth_headers, counters, days):
+    response = client.get(f"/api/consultations/stats?days={days}", headers=auth_headers())
+
+    assert response.status_code == 400
+    assert "message" in response.get_json()
+    counters.assert_not_called()
+
+
+def test_days_bounds_the_daily_series(client, auth_headers, counters):
+    response = client.get("/api/consultations/stats?days=7", headers=auth_headers())
+
+    assert response.status_code == 200
+    assert response.get_json()["total_consultations"] == 0
+    since = (datetime.utcnow() - timedelta(days=7)).date().isoformat()
+    counters.assert_any_call("day", since=since)
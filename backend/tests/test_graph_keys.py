@@ -0,0 +1,37 @@
+"""
+Migration des clés du graphe : les anciennes contraintes d'unicité sur
+Doctor.id / Patient.id sont supprimées avant la consolidation sur `mongo_id`.
+"""
+from unittest import mock
+
+from app.data import migrations
+from app.extensions import legacy_id_constraints
+
+CONSTRAINTS = [
+    {"name": "constraint_doctor_id", "labelsOrTypes": ["Doctor"], "properties": ["id"]},
+    {"name": "constraint_patient_id", "labelsOrTypes": ["Patient"], "properties": ["id"]},
+    {"name": "patient_mongo_id", "labelsOrTypes": ["Patient"], "properties": ["mongo_id"]},
+    {"name": "constraint_consultation_id", "labelsOrTypes": ["Consultation"], "properties": ["id"]},
+]
+
+
+def test_only_doctor_and_patient_id_constraints_are_legacy():
+    session = mock.MagicMock()
+    session.run.return_value = CONSTRAINTS
+
+    assert legacy_id_constraints(session) == ["constraint_doctor_id", "constraint_patient_id"]
+
+
+def test_migration_drops_legacy_constraints_first(app, neo4j_session):
+    calls = []
+    neo4j_session.run.side_effect = lambda query, *a, **k: calls.append(query) or (
+        CONSTRAINTS if query.startswith("SHOW CONSTRAINTS") else mock.MagicMock()
+    )
+    with mock.patch.object(migrations, "backfill_mongo_ids", side_effect=lambda *a: calls.append("backfill") or 0), \
+         mock.patch.object(migrations, "dedup_nodes", return_value=0):
+        report = migrations.migrate_node_keys()
+
+    assert report["dropped_constraints"] == ["constraint_doctor_id", "constraint_patient_id"]
+    drops = [i for i, query in enumerate(calls) if query.startswith("DROP CONSTRAINT")]
+    assert len(drops) == 2
+    assert max(drops) < calls.index("backfill")
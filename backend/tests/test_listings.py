@@ -0,0 +1,125 @@
+"""
+Listes administrateur utilisateurs + profils : nombre d'allers-retours
+MongoDB à 10k utilisateurs, comparé à la jointure N+1 d'origine
+(1 requête `users` + 1 `find_one` par utilisateur).
+"""
+import math
+from unittest import mock
+
+import pytest
+
+from app.config import Config
+from app.data import listings
+
+USERS = 10_000
+
+
+class RoundTrips:
+    def __init__(self):
+        self.count = 0
+
+
+class FakeCursor:
+    """Curseur servi par lots : un aller-retour par lot (find puis getMore)"""
+
+    def __init__(self, documents, round_trips):
+        self.documents = documents
+        self.round_trips = round_trips
+        self.size = 101
+        self.position = 0
+
+    def sort(self, *args):
+        return self
+
+    def batch_size(self, size):
+        self.size = size
+        return self
+
+    def allow_disk_use(self, allow):
+        return self
+
+    def skip(self, count):
+        self.documents = self.documents[count:]
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.position >= len(self.documents):
+            raise StopIteration
+        if self.position % self.size == 0:
+            self.round_trips.count += 1
+        self.position += 1
+        return self.documents[self.position - 1]
+
+
+class FakeUsers:
+    def __init__(self, users, round_trips):
+        self.users = users
+        self.round_trips = round_trips
+        self.aggregate = mock.MagicMock(side_effect=self._aggregate)
+
+    def find(self, query, projection=None):
+        return FakeCursor(self.users, self.round_trips)
+
+    def _aggregate(self, pipeline):
+        self.round_trips.count += 1
+        skip = pipeline[1]["$facet"]["items"][1]["$skip"]
+        limit = pipeline[1]["$facet"]["items"][2]["$limit"]
+        return iter([{"total": [{"n": len(self.users)}], "items": self.users[skip:skip + limit]}])
+
+
+class FakeProfiles:
+    def __init__(self, profiles, round_trips):
+        self.profiles = profiles
+        self.round_trips = round_trips
+        self.largest_in = 0
+
+    def find(self, query, projection=None):
+        self.round_trips.count += 1
+        ids = query["user_id"]["$in"]
+        self.largest_in = max(self.largest_in, len(ids))
+        return [self.profiles[i] for i in ids if i in self.profiles]
+
+
+@pytest.fixture
+def database():
+    round_trips = RoundTrips()
+    users = [{"_id": f"u{i:05d}", "email": f"doc{i}@example.com"} for i in range(USERS)]
+    profiles = {user["_id"]: {"user_id": user["_id"], "name": user["email"]} for user in users}
+    db = mock.MagicMock()
+    db.users = FakeUsers(users, round_trips)
+    db.__getitem__.return_value = FakeProfiles(profiles, round_trips)
+    with mock.patch.object(listings, "mongo_db", db):
+        yield db, round_trips
+
+
+def test_full_listing_round_trips_at_10k_users(database):
+    db, round_trips = database
+    n_plus_one = 1 + USERS
+
+    total, rows = listings.list_users_with_profiles("doctor", "doctors", ["name"])
+
+    batches = math.ceil(USERS / Config.STREAM_BATCH_SIZE)
+    print(f"allers-retours : {round_trips.count} (N+1 : {n_plus_one})")
+    assert total == USERS and len(rows) == USERS
+    assert all(profile is not None for _, profile in rows)
+    # Un lot de curseur + une requête $in par tranche, jamais de $facet
+    assert round_trips.count == 2 * batches
+    db.users.aggregate.assert_not_called()
+    assert db["doctors"].largest_in <= Config.STREAM_BATCH_SIZE
+
+
+def test_paginated_listing_uses_two_round_trips(database):
+    db, round_trips = database
+
+    total, rows = listings.list_users_with_profiles("doctor", "doctors", ["name"], page=3, per_page=50)
+
+    assert total == USERS
+    assert [user["_id"] for user, _ in rows] == [f"u{i:05d}" for i in range(100, 150)]
+    assert round_trips.count == 2
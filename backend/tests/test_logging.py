@@ -0,0 +1,55 @@
+"""
+Identifiant de corrélation : un X-Request-ID client n'est repris que s'il est
+court et sans caractères spéciaux ; sinon un identifiant est généré. Les
+appels de journalisation passent leurs valeurs en arguments (`%s`), jamais
+un message déjà formaté.
+"""
+import ast
+from pathlib import Path
+
+import pytest
+
+from app.logging_config import incoming_request_id
+
+
+def test_valid_request_id_is_kept(client):
+    response = client.get("/api/health/live", headers={"X-Request-ID": "front-42.retry_1"})
+
+    assert response.headers["X-Request-ID"] == "front-42.retry_1"
+
+
+@pytest.mark.parametrize("value", ["x" * 65, "abc def", "idé", "a;b", "", None])
+def test_invalid_request_id_is_replaced(value):
+    request_id = incoming_request_id(value)
+
+    assert request_id != value
+    assert len(request_id) == 32
+
+
+def test_oversized_request_id_is_not_echoed(client):
+    response = client.get("/api/health/live", headers={"X-Request-ID": "a" * 4096})
+
+    assert len(response.headers["X-Request-ID"]) == 32
+
+
+LOG_METHODS = {"debug", "info", "warning", "error", "exception", "critical", "log"}
+
+
+def test_logger_calls_use_lazy_arguments():
+    app_dir = Path(__file__).resolve().parent.parent / "app"
+    eager = []
+    for path in app_dir.rglob("*.py"):
+        if "venv" in path.relative_to(app_dir).parts:
+            continue
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+            if (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Attribute)
+                and node.func.attr in LOG_METHODS
+                and isinstance(node.func.value, ast.Name)
+                and node.func.value.id.endswith("logger")
+                and node.args
+                and isinstance(node.args[0], (ast.JoinedStr, ast.BinOp))
+            ):
+                eager.append(f"{path.relative_to(app_dir)}:{node.lineno}")
+    assert eager == []
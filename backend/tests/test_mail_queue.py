@@ -0,0 +1,181 @@
+"""
+File d'envoi des emails : une erreur SMTP pendant un envoi ferme la connexion
+au lieu de la rendre au pool ; un échec de connexion ou d'authentification
+est reporté sans jamais marquer les messages en échec ; un message en échec
+définitif perd son corps (codes, jetons) et expire après
+MAIL_FAILED_RETENTION. Les derniers tests passent par le serveur local
+`utils/smtp_stub.py`.
+"""
+import smtplib
+import socket
+from unittest import mock
+
+import pytest
+
+from app.config import Config
+from app.data import mail_queue
+from app.utils.smtp_pool import SMTPPool
+from app.utils.smtp_stub import SMTPStub
+
+
+def _entries(count):
+    return [
+        {"_id": i, "claimed_by": "token", "from": "noreply@example.com", "to": f"patient{i}@example.com",
+         "subject": "Code", "body": f"Votre code : {i:06d}", "attempts": 0}
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def pool():
+    pool = SMTPPool("smtp.example.com", 587, size=1)
+    server = mock.MagicMock(name="smtp_server")
+    with mock.patch.object(pool, "_open", return_value=server), \
+         mock.patch.object(mail_queue, "smtp_pool", pool):
+        yield pool, server
+
+
+def test_response_error_discards_the_connection(pool):
+    pool, server = pool
+    error = smtplib.SMTPDataError(554, b"Transaction failed")
+    server.send_message.side_effect = [None, error, None]
+
+    outcomes = mail_queue._send_chunk(_entries(3))
+
+    assert [entry["_id"] for entry, _ in outcomes] == [0, 1, 2]
+    assert outcomes[0][1] is None and outcomes[1][1] is error
+    # Le message suivant n'a pas été tenté : reporté, jamais définitif
+    assert isinstance(outcomes[2][1], mail_queue.SMTPConnectionFailure)
+    assert not mail_queue._is_permanent(outcomes[2][1])
+    assert server.send_message.call_count == 2
+    assert pool.metrics["idle"] == 0
+    assert pool.metrics["discarded"] == 1
+
+
+def test_refused_recipient_keeps_the_connection(pool):
+    pool, server = pool
+    server.send_message.side_effect = [smtplib.SMTPRecipientsRefused({"x": (550, b"unknown")}), None]
+
+    outcomes = mail_queue._send_chunk(_entries(2))
+
+    assert [error is None for _, error in outcomes] == [False, True]
+    assert pool.metrics["idle"] == 1
+    assert pool.metrics["discarded"] == 0
+
+
+def test_permanent_failure_drops_the_body():
+    entry = _entries(1)[0]
+
+    operation = mail_queue._outcome_operation(entry, smtplib.SMTPDataError(554, b"rejected"))
+
+    update = operation._doc
+    assert update["$set"]["status"] == "failed"
+    assert "body" in update["$unset"]
+    retention = update["$set"]["expires_at"] - update["$set"]["failed_at"]
+    assert retention.total_seconds() == Config.MAIL_FAILED_RETENTION
+
+
+def test_temporary_failure_keeps_the_body():
+    entry = _entries(1)[0]
+
+    operation = mail_queue._outcome_operation(entry, smtplib.SMTPServerDisconnected("lost"))
+
+    assert "body" not in operation._doc["$unset"]
+    assert "expires_at" not in operation._doc["$set"]
+
+
+def test_login_failure_defers_the_whole_chunk(pool):
+    pool, _ = pool
+    pool._open.side_effect = smtplib.SMTPAuthenticationError(535, b"Authentication failed")
+
+    outcomes = mail_queue._send_chunk(_entries(3))
+
+    assert all(isinstance(error, mail_queue.SMTPConnectionFailure) for _, error in outcomes)
+    for entry, error in outcomes:
+        update = mail_queue._outcome_operation({**entry, "attempts": 4}, error)._doc
+        assert "status" not in update["$set"]
+        assert "body" not in update["$unset"]
+        # Aucune tentative consommée : MAIL_MAX_ATTEMPTS ne s'applique pas
+        assert "attempts" not in update["$set"]
+        assert update["$set"]["deferrals"] == 1
+
+
+def test_deferral_backoff_is_capped():
+    entry = {**_entries(1)[0], "deferrals": 40}
+
+    update = mail_queue._outcome_operation(entry, mail_queue.SMTPConnectionFailure("down"))._doc
+
+    assert update["$set"]["deferrals"] == 41
+    delay = update["$set"]["available_at"] - mail_queue.datetime.utcnow()
+    assert delay.total_seconds() <= Config.MAIL_RETRY_BACKOFF * 32
+
+
+@pytest.fixture
+def stub():
+    stub = SMTPStub(port=0).start()
+    pool = SMTPPool(stub.host, stub.port, use_tls=False, size=1, timeout=5)
+    with mock.patch.object(mail_queue, "smtp_pool", pool):
+        yield stub, pool
+    pool.close()
+    stub.stop()
+
+
+def _dispatch(entries):
+    """dispatch_batch sur `entries`, sans MongoDB ; retourne les opérations écrites"""
+    db = mock.MagicMock()
+    with mock.patch.object(mail_queue, "mongo_db", db), \
+         mock.patch.object(mail_queue, "ensure_collection_indexes"), \
+         mock.patch.object(mail_queue, "_claim", return_value=entries), \
+         mock.patch.object(Config, "MAIL_POOL_SIZE", 1):
+        mail_queue.dispatch_batch()
+    return db[mail_queue.MAIL_COLLECTION].bulk_write.call_args.args[0]
+
+
+def test_stub_delivers_on_one_reused_session(stub):
+    stub, pool = stub
+
+    operations = _dispatch(_entries(3))
+
+    assert [type(op).__name__ for op in operations] == ["DeleteOne"] * 3
+    assert [message["to"] for message in stub.messages] == [[f"patient{i}@example.com"] for i in range(3)]
+    assert stub.messages[0]["message"].get_content().strip() == "Votre code : 000000"
+    assert stub.sessions == 1
+    assert pool.metrics["idle"] == 1
+
+
+def test_stub_rejected_recipient_fails_only_that_message(stub):
+    stub, pool = stub
+    stub.reject.add("patient1@example.com")
+
+    operations = _dispatch(_entries(3))
+
+    assert [type(op).__name__ for op in operations] == ["DeleteOne", "UpdateOne", "DeleteOne"]
+    assert operations[1]._doc["$set"]["status"] == "failed"
+    assert stub.sessions == 1
+
+
+def test_stub_temporary_data_error_retries_and_defers_the_rest(stub):
+    stub, pool = stub
+    stub.fail_next = 1
+
+    operations = _dispatch(_entries(3))
+
+    first, second, third = (op._doc["$set"] for op in operations)
+    # 451 sur le premier message : nouvelle tentative, connexion fermée
+    assert first["attempts"] == 1 and "status" not in first
+    assert second["deferrals"] == 1 and third["deferrals"] == 1
+    assert stub.messages == []
+    assert pool.metrics["discarded"] == 1 and pool.metrics["idle"] == 0
+
+
+def test_unreachable_server_defers_instead_of_failing():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    pool = SMTPPool("127.0.0.1", port, use_tls=False, size=1, timeout=1)
+    with mock.patch.object(mail_queue, "smtp_pool", pool):
+        operations = _dispatch(_entries(2))
+
+    for operation in operations:
+        assert "status" not in operation._doc["$set"]
+        assert "body" not in operation._doc["$unset"]
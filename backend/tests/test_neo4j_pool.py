@@ -0,0 +1,24 @@
+"""
+Cycle de vie du pool Neo4j : un seul driver par processus, une session
+empruntée par requête et rendue au pool à la fin de la requête.
+"""
+from app.extensions import get_pool_generations
+from app.utils.pool_monitor import neo4j_sessions
+
+
+def test_pool_survives_sequential_requests(isolated_app, isolated_auth_headers, graph_database,
+                                           neo4j_driver, neo4j_session):
+    # Aucun contexte actif : chaque requête exécute son teardown_appcontext
+    client = isolated_app.test_client()
+    headers = isolated_auth_headers(role="admin")
+
+    for _ in range(1000):
+        response = client.get("/api/consultations/", headers=headers)
+        assert response.status_code == 200
+
+    assert get_pool_generations() == {"mongodb": 1, "neo4j": 1}
+    assert graph_database.call_count == 1
+    neo4j_driver.close.assert_not_called()
+    # Chaque requête a rendu sa session (et sa connexion) au pool
+    assert neo4j_session.close.call_count == 1000
+    assert neo4j_sessions.in_flight == 0
@@ -0,0 +1,70 @@
+"""
+Pool de hachage saturé : `PasswordServiceBusy` est levée au-delà de
+PASSWORD_HASH_MAX_PENDING demandes, et toute route qui hache ou vérifie un
+mot de passe répond alors 503 avec Retry-After (jamais 500).
+"""
+import math
+import threading
+from unittest import mock
+
+import pytest
+
+from app.admin import routes as admin_routes
+from app.auth import passwords
+from app.auth import routes as auth_routes
+from app.config import Config
+from app.models.user import User
+
+USER_ID = "64b000000000000000000003"
+
+
+@pytest.fixture
+def small_pool():
+    with mock.patch.multiple(
+        Config, PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=1, PASSWORD_HASH_QUEUE_TIMEOUT=0.05
+    ):
+        passwords._pool_pid = None
+        yield
+    passwords._pool_pid = None
+
+
+def test_run_raises_when_pending_limit_reached(small_pool):
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    worker = threading.Thread(target=passwords._run, args=(slow,))
+    worker.start()
+    started.wait(5)
+    try:
+        with pytest.raises(passwords.PasswordServiceBusy):
+            passwords._run(lambda: "refused")
+    finally:
+        release.set()
+        worker.join(5)
+    assert passwords._run(lambda: "ok") == "ok"
+
+
+def test_login_busy_returns_503(client):
+    with mock.patch.object(auth_routes.User, "get_by_email_from_cabinet_medical",
+                           return_value={"_id": USER_ID, "password_hash": "x"}), \
+         mock.patch.object(auth_routes, "verify_and_update", side_effect=passwords.PasswordServiceBusy()):
+        response = client.post("/api/auth/login", json={"email": "a@example.com", "password": "secret"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(max(1, math.ceil(Config.PASSWORD_HASH_QUEUE_TIMEOUT)))
+
+
+def test_password_update_busy_returns_503(client, auth_headers):
+    user = User("a@example.com", _id=USER_ID)
+    with mock.patch.object(admin_routes.User, "get_by_id", return_value=user), \
+         mock.patch.object(admin_routes, "hash_password", side_effect=passwords.PasswordServiceBusy()):
+        response = client.put(f"/api/admin/users/{USER_ID}", json={"password": "new-secret"},
+                              headers=auth_headers())
+
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
@@ -0,0 +1,26 @@
+"""
+Cache des profils : un handler qui modifie le document reçu ne modifie pas
+l'entrée mise en cache.
+"""
+from app.auth import authorization
+
+USER_ID = "64b000000000000000000002"
+
+
+def test_cached_profile_is_deep_copied(app, mongo_client):
+    authorization._profile_cache.clear()
+    collection = mongo_client["cabinet_medical"]["doctors"]
+    collection.find_one.return_value = {
+        "user_id": USER_ID,
+        "schedule": {"monday": ["09:00"]},
+        "specialities": ["cardiologie"],
+    }
+
+    first = authorization.get_cached_doctor(USER_ID)
+    first["schedule"]["monday"].append("10:00")
+    first["specialities"].clear()
+
+    second = authorization.get_cached_doctor(USER_ID)
+    assert second["schedule"] == {"monday": ["09:00"]}
+    assert second["specialities"] == ["cardiologie"]
+    assert collection.find_one.call_count == 1
@@ -0,0 +1,128 @@
+"""
+Limitation du débit : analyse des limites, seaux en mémoire (remplissage,
+refus), réponses 429 avec Retry-After et en-têtes X-RateLimit-*, clé par
+adresse cliente derrière le répartiteur (X-Forwarded-For) et remboursement
+des autres seaux quand une limite refuse la requête.
+"""
+from unittest import mock
+
+import pytest
+
+from app import ratelimit
+from app.auth import routes as auth_routes
+from app.config import TestConfig
+from app.ratelimit import Limit, MemoryStore, MongoStore, create_store, parse_limits
+
+
+class LimitedConfig(TestConfig):
+    RATELIMIT_ENABLED = True
+    RATELIMIT_DEFAULT = "2 per minute"
+    RATELIMIT_LOGIN = "1 per minute; 5 per hour"
+    RATELIMIT_STORAGE_URL = "memory://"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_parse_limits():
+    assert parse_limits("100 per minute; 1000/hour") == [
+        Limit(100, 60.0, "100 per minute"),
+        Limit(1000, 3600.0, "1000/hour"),
+    ]
+    assert parse_limits("10 per 5 minutes") == [Limit(10, 300.0, "10 per 5 minutes")]
+    assert parse_limits("") == []
+    with pytest.raises(ValueError):
+        parse_limits("10 every minute")
+
+
+def test_memory_store_denies_then_refills():
+    clock = Clock()
+    store = MemoryStore()
+    limit = Limit(2, 60.0, "2 per minute")
+
+    with mock.patch.object(ratelimit, "time", clock):
+        assert [store.hit("k", limit).allowed for _ in range(3)] == [True, True, False]
+        denied = store.hit("k", limit)
+        assert denied.retry_after == 30 and denied.remaining == 0
+        # Un jeton toutes les 30 secondes
+        clock.now += 30
+        assert store.hit("k", limit).allowed
+        assert not store.hit("k", limit).allowed
+        # Un remboursement ne dépasse jamais la capacité
+        clock.now += 600
+        assert store.hit("k", limit, cost=-1).remaining == 2
+
+
+def test_create_store_accepts_atlas_urls():
+    assert isinstance(create_store("memory://"), MemoryStore)
+    for url in ("mongo", "mongodb://localhost:27017", "mongodb+srv://user:pw@cluster0.example.net/db"):
+        assert isinstance(create_store(url), MongoStore)
+    with pytest.raises(ValueError):
+        create_store("redis://localhost")
+
+
+def test_429_with_retry_after_and_headers(app_factory):
+    client = app_factory(LimitedConfig).test_client()
+
+    first = client.get("/")
+    assert first.status_code == 200
+    assert first.headers["X-RateLimit-Limit"] == "2"
+    assert first.headers["X-RateLimit-Remaining"] == "1"
+    assert "X-RateLimit-Reset" in first.headers
+
+    client.get("/")
+    denied = client.get("/")
+    assert denied.status_code == 429
+    assert denied.headers["Retry-After"] == "30"
+    assert denied.headers["X-RateLimit-Remaining"] == "0"
+
+
+def test_clients_behind_the_load_balancer_get_their_own_bucket(app_factory):
+    client = app_factory(LimitedConfig).test_client()
+    balancer = {"REMOTE_ADDR": "10.0.0.1"}
+
+    for _ in range(2):
+        client.get("/", environ_base=balancer, headers={"X-Forwarded-For": "203.0.113.7"})
+    assert client.get("/", environ_base=balancer, headers={"X-Forwarded-For": "203.0.113.7"}).status_code == 429
+    assert client.get("/", environ_base=balancer, headers={"X-Forwarded-For": "198.51.100.2"}).status_code == 200
+
+
+def test_limits_are_read_from_app_config(app_factory):
+    app = app_factory(LimitedConfig)
+    app.config["RATELIMIT_DEFAULT"] = "1 per minute"
+    client = app.test_client()
+
+    assert client.get("/").status_code == 200
+    assert client.get("/").status_code == 429
+
+
+def test_denied_request_does_not_spend_other_buckets(app_factory):
+    app = app_factory(LimitedConfig)
+    store = MemoryStore()
+
+    def login():
+        with app.test_request_context("/api/auth/login", method="POST"):
+            return ratelimit.check_request(store)
+
+    assert login().allowed
+    assert not login().allowed
+    assert not login().allowed
+    hour_bucket = next(key for key in store._buckets if "hour" in key)
+    # Seule la requête acceptée a consommé un jeton horaire
+    assert int(store._buckets[hour_bucket][0]) == 4
+
+
+def test_login_limit_returns_429(app_factory):
+    client = app_factory(LimitedConfig).test_client()
+    with mock.patch.object(auth_routes.User, "get_by_email_from_cabinet_medical", return_value=None):
+        first = client.post("/api/auth/login", json={"email": "a@example.com", "password": "x"})
+        second = client.post("/api/auth/login", json={"email": "a@example.com", "password": "x"})
+
+    assert first.status_code == 401
+    assert second.status_code == 429
+    assert int(second.headers["Retry-After"]) > 0
@@ -0,0 +1,136 @@
+"""
+Recherche locale (`search_index`) : l'étape par trigrammes n'est lancée que
+si les préfixes ne remplissent pas la page, son pipeline borne le balayage
+avant le `$project`, et les mises à jour d'utilisateur réindexent `users`.
+
+Le banc d'essai de latence (p99 < 20 ms à 100k patients) s'exécute seulement
+si MONGODB_BENCHMARK_URI désigne une base MongoDB jetable ; il supprime sa
+base à la fin.
+"""
+import os
+import random
+import time
+from unittest import mock
+
+import pytest
+from pymongo import MongoClient
+
+from app.config import Config
+from app.data import search_index
+from app.data.search_index import index_entry
+from app.models.indexes import MONGO_INDEXES
+from app.models.user import User
+
+PATIENTS = 100_000
+
+
+def _entry(i, name):
+    return index_entry("patient", {"_id": f"p{i}", "user_id": f"u{i}", "name": name})
+
+
+class FakeCursor(list):
+    def limit(self, count):
+        return FakeCursor(self[:count])
+
+
+@pytest.fixture
+def collection():
+    collection = mock.MagicMock()
+    db = mock.MagicMock()
+    db.__getitem__.return_value = collection
+    with mock.patch.object(search_index, "mongo_db", db), \
+         mock.patch.object(search_index, "ensure_search_indexes"):
+        yield collection
+
+
+def test_fuzzy_stage_skipped_when_prefixes_fill_the_page(collection):
+    collection.find.return_value = FakeCursor(_entry(i, f"Dupont {i}") for i in range(30))
+
+    result = search_index.search("dup", entities=["patient"], per_page=20)
+
+    collection.aggregate.assert_not_called()
+    assert len(result["results"]) == 20
+    assert result["total"] == 30
+
+
+def test_fuzzy_pipeline_limits_before_project(collection):
+    collection.find.return_value = FakeCursor([_entry(1, "Dupont")])
+    collection.aggregate.return_value = iter([_entry(2, "Dupond")])
+
+    result = search_index.search("dupont", entities=["patient"])
+
+    pipeline = collection.aggregate.call_args.args[0]
+    stages = [next(iter(stage)) for stage in pipeline]
+    assert stages == ["$match", "$limit", "$project", "$match", "$sort", "$limit"]
+    assert pipeline[1]["$limit"] == Config.SEARCH_FUZZY_SCAN_LIMIT
+    # Les correspondances par préfixe ne sont pas recherchées une seconde fois
+    assert pipeline[0]["$match"]["_id"] == {"$nin": ["patient:p1"]}
+    assert [row["_id"] for row in result["results"]] == ["p1", "p2"]
+
+
+def test_prefix_matches_rank_before_fuzzy_ones(collection):
+    # Même avec un meilleur score, une entrée venue des trigrammes reste derrière
+    collection.find.return_value = FakeCursor([_entry(1, "Marion")])
+    collection.aggregate.return_value = iter([_entry(2, "Marie")])
+
+    result = search_index.search("mari", entities=["patient"])
+
+    assert [row["_id"] for row in result["results"]] == ["p1", "p2"]
+
+
+def test_user_save_reindexes_the_user(app):
+    user = User("Marie.Dupont@example.com", role="patient", first_name="Marie", last_name="Dupont")
+    with app.app_context(), mock.patch.object(search_index, "index_documents") as index_documents:
+        user.save()
+
+    index_documents.assert_called_once()
+    entity, documents = index_documents.call_args.args
+    assert entity == "user"
+    assert documents[0]["_id"] == user._id
+    assert documents[0]["last_name"] == "Dupont"
+
+
+@pytest.mark.skipif(not os.getenv("MONGODB_BENCHMARK_URI"), reason="MONGODB_BENCHMARK_URI non défini")
+def test_search_p99_at_100k_patients():
+    client = MongoClient(os.getenv("MONGODB_BENCHMARK_URI"))
+    db = client["search_benchmark"]
+    rng = random.Random(17)
+    first_names = ["Marie", "Jean", "Fatima", "Youssef", "Claire", "Omar", "Sophie", "Karim", "Léa", "Hassan"]
+    last_names = [f"{stem}{suffix}" for stem in ("Dupont", "Martin", "Benali", "Durand", "Alaoui",
+                                                   "Moreau", "Idrissi", "Lefebvre", "Tazi", "Bernard")
+                  for suffix in ("", "e", "i", "ard", "ier", "eau", "on", "el", "ot", "in")]
+    try:
+        db[search_index.SEARCH_COLLECTION].create_indexes(MONGO_INDEXES[search_index.SEARCH_COLLECTION])
+        with mock.patch.object(search_index, "mongo_db", db):
+            batch = []
+            for i in range(PATIENTS):
+                batch.append({
+                    "_id": f"bench{i:06d}",
+                    "user_id": f"bench-user-{i:06d}",
+                    "name": f"{rng.choice(first_names)} {rng.choice(last_names)}",
+                    "email": f"patient{i}@example.com",
+                    "cin": f"AB{i:06d}",
+                    "phone": f"06{i:08d}",
+                })
+                if len(batch) == 5000:
+                    search_index.index_documents("patient", batch)
+                    batch = []
+
+            queries = ["dup", "marie dupont", "benal", "fatima", "dupnt", "moreau claire",
+                       "alaoi", "AB0012", "0600001", "lefebv"]
+            with mock.patch.object(search_index, "ensure_search_indexes"):
+                for query in queries:
+                    search_index.search(query, entities=["patient"])
+                timings = []
+                for _ in range(50):
+                    for query in queries:
+                        started = time.perf_counter()
+                        search_index.search(query, entities=["patient"])
+                        timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p50, p99 = timings[len(timings) // 2], timings[int(len(timings) * 0.99) - 1]
+        print(f"{len(timings)} recherches sur {PATIENTS} patients : p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+        assert p99 < 20
+    finally:
+        client.drop_database("search_benchmark")
+        client.close()
@@ -0,0 +1,235 @@
+"""
+Outbox de synchronisation : fusion des mises à jour d'une même entité,
+réservation avec bail, suppression conditionnée à la `version` et mise à
+l'écart après SYNC_MAX_ATTEMPTS échecs.
+
+Les collections sont simulées en mémoire (filtres égalité, $in, $exists,
+$lte, $gt, $or ; mises à jour $set, $inc, $unset, $setOnInsert).
+"""
+import copy
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+
+from app.config import Config
+from app.data import sync_outbox
+
+
+def _matches(document, query):
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(_matches(document, branch) for branch in condition):
+                return False
+            continue
+        value = document.get(field)
+        if isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$exists" and (field in document) != operand:
+                    return False
+                if operator == "$lte" and (value is None or value > operand):
+                    return False
+                if operator == "$gt" and (value is None or value <= operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCursor(list):
+    def sort(self, field, direction):
+        return FakeCursor(sorted(self, key=lambda document: document[field], reverse=direction < 0))
+
+    def limit(self, count):
+        return FakeCursor(self[:count])
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = {}
+
+    def find(self, query=None, projection=None):
+        return FakeCursor(
+            copy.deepcopy(document) for document in self.documents.values() if _matches(document, query or {})
+        )
+
+    def count_documents(self, query):
+        return len(self.find(query))
+
+    def _apply(self, document, update, inserting=False):
+        for field, value in update.get("$set", {}).items():
+            document[field] = copy.deepcopy(value)
+        for field, value in update.get("$inc", {}).items():
+            document[field] = document.get(field, 0) + value
+        for field in update.get("$unset", {}):
+            document.pop(field, None)
+        if inserting:
+            for field, value in update.get("$setOnInsert", {}).items():
+                document[field] = value
+
+    def update_one(self, query, update, upsert=False):
+        for document in self.documents.values():
+            if _matches(document, query):
+                self._apply(document, update)
+                return
+        if upsert:
+            document = {"_id": query["_id"]}
+            self._apply(document, update, inserting=True)
+            self.documents[document["_id"]] = document
+
+    def update_many(self, query, update):
+        for document in self.documents.values():
+            if _matches(document, query):
+                self._apply(document, update)
+
+    def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            name = type(operation).__name__
+            matching = [key for key, document in self.documents.items() if _matches(document, operation._filter)]
+            if name == "DeleteOne":
+                for key in matching[:1]:
+                    del self.documents[key]
+            elif name == "UpdateOne":
+                for key in matching[:1]:
+                    self._apply(self.documents[key], operation._doc)
+            elif name == "ReplaceOne":
+                self.documents[operation._filter["_id"]] = copy.deepcopy(operation._doc)
+
+
+class Clock:
+    def __init__(self):
+        self.now = datetime(2024, 1, 1, 12, 0, 0)
+
+    def utcnow(self):
+        return self.now
+
+
+@pytest.fixture
+def outbox():
+    collections = {
+        sync_outbox.OUTBOX_COLLECTION: FakeCollection(),
+        sync_outbox.DEAD_LETTER_COLLECTION: FakeCollection(),
+    }
+    db = mock.MagicMock()
+    db.__getitem__.side_effect = collections.__getitem__
+    clock = Clock()
+    sync = mock.MagicMock(name="sync_consultations")
+    with mock.patch.object(sync_outbox, "mongo_db", db), \
+         mock.patch.object(sync_outbox, "datetime", clock), \
+         mock.patch.object(sync_outbox, "outbox_worker"), \
+         mock.patch.object(sync_outbox, "ensure_collection_indexes"), \
+         mock.patch.object(sync_outbox, "_sync_functions", return_value={"consultation": sync}):
+        yield collections, clock, sync
+
+
+def _entries(collections, name=sync_outbox.OUTBOX_COLLECTION):
+    return collections[name].documents
+
+
+def test_updates_of_one_entity_are_coalesced(outbox):
+    collections, _, _ = outbox
+
+    sync_outbox.enqueue_consultation({"_id": "c1", "status": "pending"})
+    sync_outbox.enqueue_consultation({"_id": "c1", "status": "confirmed"})
+
+    entry = _entries(collections)["consultation:c1"]
+    assert len(_entries(collections)) == 1
+    assert entry["version"] == 2
+    assert entry["payload"]["status"] == "confirmed"
+    assert entry["attempts"] == 0
+
+
+def test_claim_holds_a_lease_until_it_expires(outbox):
+    _, clock, _ = outbox
+    sync_outbox.enqueue_consultation({"_id": "c1"})
+
+    assert [entry["_id"] for entry in sync_outbox._claim(10)] == ["consultation:c1"]
+    # Réservée : un autre worker ne la reprend pas pendant le bail
+    assert sync_outbox._claim(10) == []
+    clock.now += timedelta(seconds=Config.SYNC_OUTBOX_CLAIM_TIMEOUT + 1)
+    assert [entry["_id"] for entry in sync_outbox._claim(10)] == ["consultation:c1"]
+
+
+def test_delivered_entry_is_deleted(outbox):
+    collections, _, sync = outbox
+    sync_outbox.enqueue_consultation({"_id": "c1", "status": "pending"})
+
+    assert sync_outbox.process_batch() == 1
+
+    sync.assert_called_once_with([{"_id": "c1", "status": "pending"}])
+    assert _entries(collections) == {}
+
+
+def test_entry_updated_during_delivery_is_kept(outbox):
+    collections, _, sync = outbox
+    sync_outbox.enqueue_consultation({"_id": "c1", "status": "pending"})
+    sync.side_effect = lambda documents: sync_outbox.enqueue_consultation({"_id": "c1", "status": "confirmed"})
+
+    sync_outbox.process_batch()
+
+    # La version a changé pendant l'envoi : l'entrée reste, libérée pour le lot suivant
+    entry = _entries(collections)["consultation:c1"]
+    assert entry["version"] == 2
+    assert "claimed_by" not in entry and "available_at" not in entry
+    sync.side_effect = None
+    sync_outbox.process_batch()
+    assert sync.call_args.args[0] == [{"_id": "c1", "status": "confirmed"}]
+    assert _entries(collections) == {}
+
+
+def test_failure_backs_off_then_dead_letters(outbox):
+    collections, clock, sync = outbox
+    sync.side_effect = RuntimeError("ConstraintValidationFailed")
+    sync_outbox.enqueue_consultation({"_id": "c1"})
+
+    with mock.patch.object(sync_outbox, "logger") as logger:
+        for attempt in range(1, Config.SYNC_MAX_ATTEMPTS):
+            assert sync_outbox.process_batch() == 1
+            entry = _entries(collections)["consultation:c1"]
+            assert entry["attempts"] == attempt
+            assert sync_outbox.process_batch() == 0  # pas encore disponible
+            clock.now += timedelta(seconds=Config.SYNC_OUTBOX_CLAIM_TIMEOUT)
+        sync_outbox.process_batch()
+
+    assert _entries(collections) == {}
+    dead = _entries(collections, sync_outbox.DEAD_LETTER_COLLECTION)["consultation:c1"]
+    assert dead["attempts"] == Config.SYNC_MAX_ATTEMPTS
+    assert dead["last_error"] == "ConstraintValidationFailed"
+    assert "claimed_by" not in dead
+    assert any("dead-lettered" in call.args[0] for call in logger.error.call_args_list)
+    assert sync.call_count == Config.SYNC_MAX_ATTEMPTS
+    # Plus rien à relivrer
+    clock.now += timedelta(days=1)
+    assert sync_outbox.process_batch() == 0
+
+
+def test_unknown_entity_is_not_retried_forever(outbox):
+    collections, clock, _ = outbox
+    with mock.patch.object(Config, "SYNC_MAX_ATTEMPTS", 2), mock.patch.object(sync_outbox, "logger"):
+        sync_outbox.enqueue("prescription", {"_id": "p1"})
+        sync_outbox.process_batch()
+        clock.now += timedelta(seconds=Config.SYNC_OUTBOX_CLAIM_TIMEOUT)
+        sync_outbox.process_batch()
+
+    assert _entries(collections) == {}
+    assert "prescription:p1" in _entries(collections, sync_outbox.DEAD_LETTER_COLLECTION)
+
+
+def test_changed_entry_is_not_dead_lettered_away(outbox):
+    collections, _, sync = outbox
+    sync_outbox.enqueue_consultation({"_id": "c1", "status": "pending"})
+
+    def fail_after_update(documents):
+        sync_outbox.enqueue_consultation({"_id": "c1", "status": "confirmed"})
+        raise RuntimeError("boom")
+
+    sync.side_effect = fail_after_update
+    with mock.patch.object(Config, "SYNC_MAX_ATTEMPTS", 1), mock.patch.object(sync_outbox, "logger"):
+        sync_outbox.process_batch()
+
+    # L'ancien état est écarté, le nouveau repart avec un compteur à zéro
+    entry = _entries(collections)["consultation:c1"]
+    assert entry["version"] == 2 and entry["attempts"] == 0
+    assert "claimed_by" not in entry
@@ -0,0 +1,119 @@
+"""
+Écritures par lots de `SyncService` : transactions par tranche, une seule
+couche de reprise bornée dans le temps, et banc d'essai à 50k patients.
+
+Le banc d'essai sur une vraie base s'exécute seulement si
+NEO4J_BENCHMARK_URI désigne une base Neo4j jetable (NEO4J_BENCHMARK_USER,
+NEO4J_BENCHMARK_PASSWORD) ; il supprime ses nœuds à la fin.
+"""
+import os
+from unittest import mock
+
+import pytest
+from neo4j import GraphDatabase
+from neo4j.exceptions import TransientError
+
+from app.data import sync_service
+from app.data.sync_service import SyncService
+
+PATIENTS = 50_000
+
+
+def _patients(count, prefix="p"):
+    return (
+        {"_id": f"{prefix}{i:06d}", "user_id": f"{prefix}-user-{i:06d}", "name": f"Patient {i}",
+         "email": f"patient{i}@example.com", "phone": "0600000000"}
+        for i in range(count)
+    )
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_50k_patients_one_transaction_per_batch(app, neo4j_session):
+    tx = neo4j_session.begin_transaction.return_value
+
+    report = SyncService(batch_size=1000).sync_patients(_patients(PATIENTS))
+
+    assert report["rows"] == PATIENTS
+    assert report["batches"] == 50
+    assert report["retries"] == 0
+    assert neo4j_session.begin_transaction.call_count == 50
+    assert tx.commit.call_count == 50
+    assert sum(len(call.kwargs["rows"]) for call in tx.run.call_args_list) == PATIENTS
+    # Aucune reprise cachée dans le pilote
+    neo4j_session.write_transaction.assert_not_called()
+
+
+def test_transient_error_is_retried_once(app, neo4j_session):
+    tx = mock.MagicMock()
+    neo4j_session.begin_transaction.side_effect = [TransientError("busy"), tx]
+    clock = FakeClock()
+
+    with mock.patch.object(sync_service, "time", clock):
+        service = SyncService(batch_size=10, retry_backoff=0.5)
+        report = service.sync_patients(_patients(5))
+
+    assert report["retries"] == 1
+    assert clock.slept == [0.5]
+    assert tx.commit.call_count == 1
+    assert service.metrics["failures"] == 0
+
+
+def test_retries_stay_within_the_time_budget(app, neo4j_session):
+    neo4j_session.begin_transaction.side_effect = TransientError("busy")
+    clock = FakeClock()
+
+    with mock.patch.object(sync_service, "time", clock):
+        service = SyncService(batch_size=10, max_retries=10, retry_backoff=1, retry_max_time=10)
+        with pytest.raises(TransientError):
+            service.sync_patients(_patients(5))
+
+    assert clock.slept == [1, 2, 4]
+    assert clock.now <= service.retry_max_time
+    assert service.metrics["failures"] == 1
+
+
+@pytest.mark.skipif(not os.getenv("NEO4J_BENCHMARK_URI"), reason="NEO4J_BENCHMARK_URI non défini")
+def test_sync_50k_patients_against_neo4j():
+    driver = GraphDatabase.driver(
+        os.getenv("NEO4J_BENCHMARK_URI"),
+        auth=(os.getenv("NEO4J_BENCHMARK_USER", "neo4j"), os.getenv("NEO4J_BENCHMARK_PASSWORD", "")),
+    )
+    try:
+        with driver.session() as session:
+            session.run(
+                "CREATE CONSTRAINT patient_mongo_id IF NOT EXISTS FOR (p:Patient) REQUIRE p.mongo_id IS UNIQUE"
+            ).consume()
+        with mock.patch.object(sync_service, "get_neo4j_driver", return_value=driver):
+            report = SyncService().sync_patients(_patients(PATIENTS, prefix="bench-"))
+        print(f"{report['rows']} patients en {report['seconds']:.1f}s ({report['rows_per_second']} lignes/s)")
+        assert report["rows"] == PATIENTS
+        with driver.session() as session:
+            count = session.run(
+                "MATCH (p:Patient) WHERE p.mongo_id STARTS WITH 'bench-' RETURN count(p) AS n"
+            ).single()["n"]
+        assert count == PATIENTS
+    finally:
+        with driver.session() as session:
+            while session.run(
+                """
+                MATCH (p:Patient) WHERE p.mongo_id STARTS WITH 'bench-'
+                WITH p LIMIT 10000 DETACH DELETE p RETURN count(*) AS deleted
+                """
+            ).single()["deleted"]:
+                pass
+        driver.close()